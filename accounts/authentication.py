@@ -0,0 +1,98 @@
+"""
+JWT authentication without a users query per request.
+
+The handful of user fields read by permission checks are cached per user id
+for AUTH_USER_CACHE_TIMEOUT seconds and dropped whenever the user is saved.
+With JWT_STATELESS_USER = True they are read from claims added to the token
+instead, and authentication does not touch the database or the cache at all.
+The claims are re-read from the database on every token refresh, which also
+refuses inactive users, so role changes and deactivation take effect within
+ACCESS_TOKEN_LIFETIME.
+
+Either way request.user is a User with the remaining fields deferred; the
+first access to one of them loads them all in a single query. Views that save
+the user work on writable_user(request.user) instead: saving a deferred
+instance writes only its loaded fields, which skips updated_at and would write
+back cached role flags.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .tokens import USER_CLAIMS, RefreshToken, set_user_claims
+
+User = get_user_model()
+
+# Fields restored on request.user without a query
+AUTH_USER_FIELDS = ('id', 'username', 'role', 'is_staff', 'is_superuser', 'is_active')
+
+
+def auth_user_cache_key(user_id):
+    return f'accounts:auth_user:{user_id}'
+
+
+def invalidate_auth_user(user_id):
+    cache.delete(auth_user_cache_key(user_id))
+
+
+def tokens_for_user(user):
+    """Refresh and access tokens for the user, with the claims used by stateless authentication"""
+    refresh = RefreshToken.for_user(user)
+    set_user_claims(refresh, user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+def _build_user(values):
+    """A User with the given field values loaded and every other field deferred"""
+    # from_db() expects the values in field order
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), field_names, [values[name] for name in field_names])
+
+
+def writable_user(user):
+    """The user as a fully loaded row, safe to save"""
+    if user.get_deferred_fields():
+        return User.objects.get(pk=user.pk)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that restores request.user from the cache, or from the
+    token claims in stateless mode, instead of querying the users table.
+    """
+    
+    def get_user(self, validated_token):
+        # Revocation compares the password hash, which is never cached
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+        
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        
+        if getattr(settings, 'JWT_STATELESS_USER', False) and all(claim in validated_token for claim in USER_CLAIMS):
+            # Access tokens are only issued to active users, see TokenRefreshSerializer
+            values = {'id': user_id, 'is_active': True}
+            values.update((claim, validated_token[claim]) for claim in USER_CLAIMS)
+            return _build_user(values)
+        
+        key = auth_user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            values = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values(*AUTH_USER_FIELDS).first()
+            if values is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.set(key, values, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        
+        if not values['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return _build_user(values)
@@ -0,0 +1,163 @@
+"""
+In-memory front layer for the refresh token blacklist.
+
+Each worker keeps a Bloom filter of blacklisted token ids. A token that is not
+in the filter is certainly not blacklisted and is accepted without a query;
+only possible matches are confirmed against the blacklist table, and the
+answers are kept in a small LRU. The filter is built once from the table and
+then extended with the rows added since the last sync. Blacklisting replaces
+a version token in the cache so other workers sync on their next check; with
+a cache that is not shared they catch up within TOKEN_BLACKLIST_SYNC_INTERVAL.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+BLACKLIST_VERSION_KEY = 'accounts:token_blacklist:version'
+DEFAULT_CAPACITY = 100000
+DEFAULT_SYNC_INTERVAL = 5
+DEFAULT_PURGE_CHUNK_SIZE = 1000
+LRU_SIZE = 10000
+# Ids re-read on every sync, so rows committed out of id order are not missed
+SYNC_LOOKBACK = 1000
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, sized for `capacity` items at the given false positive rate.
+    """
+    
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+    
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenBlacklistFilter:
+    """
+    Per-worker membership test for the token blacklist, see the module docstring.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Forget everything; the filter is rebuilt from the table on the next check"""
+        with self.lock:
+            self.bloom = None
+            self.last_id = 0
+            self.version = None
+            self.synced_at = 0
+            self.recent = OrderedDict()
+    
+    def _remember(self, jti, blacklisted):
+        self.recent[jti] = blacklisted
+        self.recent.move_to_end(jti)
+        if len(self.recent) > LRU_SIZE:
+            self.recent.popitem(last=False)
+    
+    def _add_rows(self, rows):
+        for row_id, jti in rows:
+            if jti not in self.bloom:
+                self.bloom.add(jti)
+            self._remember(jti, True)
+            self.last_id = max(self.last_id, row_id)
+    
+    def _rebuild(self):
+        """Load every blacklisted token that has not expired yet"""
+        rows = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            .values_list('id', 'token__jti')
+        )
+        capacity = max(getattr(settings, 'TOKEN_BLACKLIST_CAPACITY', DEFAULT_CAPACITY), 2 * len(rows))
+        self.bloom = BloomFilter(capacity)
+        self.recent.clear()
+        self.last_id = 0
+        self._add_rows(rows)
+    
+    def _sync(self):
+        version = cache.get(BLACKLIST_VERSION_KEY)
+        now = time.monotonic()
+        interval = getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL)
+        if self.bloom is None:
+            self._rebuild()
+        elif version != self.version or now - self.synced_at >= interval:
+            self._add_rows(
+                BlacklistedToken.objects.filter(id__gt=self.last_id - SYNC_LOOKBACK).values_list('id', 'token__jti')
+            )
+            if self.bloom.count > self.bloom.capacity:
+                self._rebuild()
+        else:
+            return
+        self.version = version
+        self.synced_at = now
+    
+    def contains(self, jti):
+        """Whether the token id is blacklisted"""
+        with self.lock:
+            self._sync()
+            if jti not in self.bloom:
+                return False
+            if jti in self.recent:
+                self.recent.move_to_end(jti)
+                return self.recent[jti]
+        
+        blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        with self.lock:
+            self._remember(jti, blacklisted)
+        return blacklisted
+    
+    def add(self, jti):
+        """Record a token that was just blacklisted, here and for the other workers"""
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+            self._remember(jti, True)
+        cache.set(BLACKLIST_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+token_blacklist = TokenBlacklistFilter()
+
+
+def purge_expired_tokens(chunk_size=None, now=None):
+    """
+    Delete outstanding tokens past their expiry, and their blacklist entries,
+    in chunks of primary keys. Returns the number of tokens deleted.
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or DEFAULT_PURGE_CHUNK_SIZE
+    queryset = OutstandingToken.objects.filter(expires_at__lte=now)
+    
+    deleted_count = 0
+    while True:
+        chunk = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            break
+        OutstandingToken.objects.filter(pk__in=chunk).delete()
+        deleted_count += len(chunk)
+    return deleted_count
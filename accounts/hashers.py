@@ -0,0 +1,122 @@
+"""
+Password hashers with configurable costs, run on a bounded thread pool.
+
+PASSWORD_HASHER_PROFILE picks the hasher new passwords are stored with
+(pbkdf2 or argon2) and PBKDF2_ITERATIONS / ARGON2_* set its costs. Older
+hashes still verify, and Django rehashes them with the current profile the
+next time the user logs in.
+
+The hashing itself runs on at most PASSWORD_HASHING_WORKERS threads per
+process, with up to PASSWORD_HASHING_QUEUE_SIZE more calls waiting. Beyond
+that PasswordHashingBusy (503 with Retry-After) is raised at once. A waiting
+call still holds its request thread, so as long as the two settings add up to
+less than gunicorn's --threads, a burst of logins cannot occupy every thread
+of a worker and hold up other requests.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 0
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many sign-ins are in progress, please try again shortly.')
+    default_code = 'password_hashing_busy'
+    
+    def __init__(self, detail=None, code=None, wait=1):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class HashingPool:
+    """
+    Thread pool for password hashing that refuses work once it is full.
+    """
+    
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pid = None
+    
+    def _start(self):
+        # A pool inherited through fork() has no threads, so each process starts its own
+        with self.lock:
+            if self.pid != os.getpid():
+                workers = self.workers or getattr(settings, 'PASSWORD_HASHING_WORKERS', DEFAULT_WORKERS)
+                queue_size = self.queue_size
+                if queue_size is None:
+                    queue_size = getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+                self.executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='password-hashing',
+                    initializer=self._mark_pool_thread,
+                )
+                self.slots = threading.BoundedSemaphore(workers + queue_size)
+                self.pid = os.getpid()
+    
+    def _mark_pool_thread(self):
+        self.local.in_pool = True
+    
+    def run(self, func, *args):
+        """Call func(*args) on the pool and return its result"""
+        # Hashers call each other (PBKDF2 verify() calls encode()); stay on the same thread
+        if getattr(self.local, 'in_pool', False):
+            return func(*args)
+        
+        if self.pid != os.getpid():
+            self._start()
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            self.slots.release()
+
+
+hashing_pool = HashingPool()
+
+
+class PooledHasherMixin:
+    """
+    Runs encode() and verify() of a Django password hasher on hashing_pool.
+    """
+    
+    def encode(self, password, salt, *args):
+        return hashing_pool.run(super().encode, password, salt, *args)
+    
+    def verify(self, password, encoded):
+        return hashing_pool.run(super().verify, password, encoded)
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with PBKDF2_ITERATIONS iterations"""
+    
+    @property
+    def iterations(self):
+        return getattr(settings, 'PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    """Argon2id with the ARGON2_TIME_COST, ARGON2_MEMORY_COST (KiB) and ARGON2_PARALLELISM costs"""
+    
+    @property
+    def time_cost(self):
+        return getattr(settings, 'ARGON2_TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+    
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'ARGON2_MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
+    
+    @property
+    def parallelism(self):
+        return getattr(settings, 'ARGON2_PARALLELISM', hashers.Argon2PasswordHasher.parallelism)
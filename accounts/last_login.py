@@ -0,0 +1,82 @@
+"""
+Buffered last_login updates.
+
+Logins and token refreshes record the time in a per-process buffer instead
+of writing the users row straight away. The buffer is written with one
+batched UPDATE at most LAST_LOGIN_FLUSH_INTERVAL seconds after its first
+entry, and when the worker exits, so last_login lags by no more than that.
+An interval of 0 writes every login immediately.
+"""
+import atexit
+import threading
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+User = get_user_model()
+
+DEFAULT_FLUSH_INTERVAL = 5
+FLUSH_BATCH_SIZE = 500
+
+
+class LastLoginBuffer:
+    """
+    Latest login time per user id, written in batches; see the module docstring.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+    
+    def record(self, user_id, when=None):
+        """Note that the user logged in; returns the time recorded"""
+        when = when or timezone.now()
+        interval = getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        if interval <= 0:
+            User.objects.filter(pk=user_id).update(last_login=when)
+            return when
+        
+        with self.lock:
+            self.pending[user_id] = max(when, self.pending.get(user_id, when))
+            if self.timer is None:
+                self.timer = threading.Timer(interval, self._flush_in_thread)
+                self.timer.daemon = True
+                self.timer.start()
+        return when
+    
+    def flush(self):
+        """Write the buffered times; returns the number of users updated"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self._cancel_timer()
+        if not pending:
+            return 0
+        
+        # bulk_update sends no post_save signals; no receiver cares about last_login
+        users = [User(pk=user_id, last_login=when) for user_id, when in pending.items()]
+        User.objects.bulk_update(users, ['last_login'], batch_size=FLUSH_BATCH_SIZE)
+        return len(users)
+    
+    def clear(self):
+        """Drop the buffered times without writing them"""
+        with self.lock:
+            self.pending = {}
+            self._cancel_timer()
+    
+    def _cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+    
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread has its own connection; don't leave it open
+            connection.close()
+
+
+last_login_buffer = LastLoginBuffer()
+atexit.register(last_login_buffer.flush)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from accounts.blacklist import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete refresh tokens past their expiry from the outstanding and blacklisted token tables'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Number of tokens deleted per query'
+        )
+    
+    def handle(self, *args, **options):
+        deleted_count = purge_expired_tokens(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted_count} expired tokens'))
@@ -20,6 +20,9 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Set by querysets annotated with active_loans_count
+    _active_loans_count = None
+    
     class Meta:
         db_table = 'users'
         ordering = ['-created_at']
@@ -27,6 +30,16 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.email})"
     
+    def refresh_from_db(self, using=None, fields=None):
+        """
+        Loading one deferred field loads every deferred field, so a user
+        restored by CachedJWTAuthentication costs at most one more query.
+        """
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields)
+    
     @property
     def is_admin(self):
         """Check if user has admin role"""
@@ -34,5 +47,14 @@ class User(AbstractUser):
     
     @property
     def active_loans_count(self):
-        """Get count of active loans for this user"""
-        return self.loans.filter(returned_at__isnull=True).count()
+        """
+        Get count of active loans for this user.
+        Uses the precomputed value when the queryset annotated one.
+        """
+        if self._active_loans_count is None:
+            return self.loans.filter(returned_at__isnull=True).count()
+        return self._active_loans_count
+    
+    @active_loans_count.setter
+    def active_loans_count(self, value):
+        self._active_loans_count = value
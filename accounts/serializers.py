@@ -1,11 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from library_management.fastpath import ValuesSerializer
+from library_management.sparse import SparseFieldsetMixin
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     password = serializers.CharField(
         write_only=True,
@@ -58,7 +60,7 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for user profile (without sensitive data)"""
     active_loans_count = serializers.ReadOnlyField()
     
@@ -72,7 +74,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'username', 'email', 'date_joined')
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class UserListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Minimal serializer for listing users"""
     active_loans_count = serializers.ReadOnlyField()
     
@@ -82,6 +84,11 @@ class UserListSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class UserListValuesSerializer(ValuesSerializer):
+    """Renders values() rows exactly like UserListSerializer"""
+    serializer_class = UserListSerializer
+
+
 class LoginSerializer(serializers.Serializer):
     """Serializer for user login"""
     username = serializers.CharField(required=True)
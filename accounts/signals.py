@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import invalidate_auth_user
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def invalidate_auth_user_on_save(sender, instance, update_fields=None, **kwargs):
+    """Drop the cached authentication record; a last_login update does not change it"""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_auth_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_auth_user_on_delete(sender, instance, **kwargs):
+    invalidate_auth_user(instance.pk)
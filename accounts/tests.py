@@ -1,8 +1,23 @@
+import threading
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from accounts.authentication import tokens_for_user
+from accounts.blacklist import TokenBlacklistFilter, token_blacklist
+from accounts.hashers import HashingPool, PasswordHashingBusy, hashing_pool
+from accounts.last_login import last_login_buffer
+from books.models import Book
+from loans.models import Loan
 
 User = get_user_model()
 
@@ -167,6 +182,19 @@ class TestUserProfile:
         assert response.status_code == status.HTTP_200_OK
         assert response.data['first_name'] == 'Updated'
         assert response.data['last_name'] == 'Name'
+    
+    def test_get_profile_sparse_fields(self, api_client, regular_user, django_assert_num_queries):
+        """Test that pruning active_loans_count skips its query"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('accounts:user_profile')
+        with django_assert_num_queries(0):
+            response = api_client.get(url, {'fields': 'id,username,email'})
+        
+        assert response.data == {
+            'id': regular_user.id,
+            'username': regular_user.username,
+            'email': regular_user.email,
+        }
 
 
 @pytest.mark.django_db
@@ -219,6 +247,23 @@ class TestUserStats:
         assert 'active_loans' in response.data
         assert 'returned_loans' in response.data
         assert 'overdue_loans' in response.data
+    
+    def test_user_stats_from_summary(self, api_client, regular_user, django_assert_num_queries, django_capture_on_commit_callbacks):
+        """Test that user statistics are read from the loan summary row"""
+        book = Book.objects.create(
+            title='Stats Book', author='Author', isbn='9785555555555', page_count=100
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            Loan.objects.create(user=regular_user, book=book, due_date=timezone.now() + timedelta(days=14))
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('accounts:user_stats')
+        
+        with django_assert_num_queries(1):
+            response = api_client.get(url)
+        
+        assert response.data['total_loans'] == 1
+        assert response.data['active_loans'] == 1
+        assert response.data['unpaid_fines'] == Decimal('0.00')
 
 
 @pytest.mark.django_db
@@ -241,6 +286,401 @@ class TestUserList:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_list_users_sparse_fields(self, api_client, admin_user, regular_user, django_assert_num_queries):
+        """Test that ?fields= prunes the output and skips the loan count"""
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('accounts:user_list')
+        with django_assert_num_queries(2) as queries:
+            response = api_client.get(url, {'fields': 'id,username'})
+        
+        assert response.data['results'][0].keys() == {'id', 'username'}
+        page_sql = queries.captured_queries[-1]['sql']
+        assert 'loans' not in page_sql
+        assert 'password' not in page_sql
+    
+    def test_list_users_exclude(self, api_client, admin_user, regular_user):
+        """Test that ?exclude= drops fields"""
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get(reverse('accounts:user_list'), {'exclude': 'email,active_loans_count'})
+        
+        assert 'email' not in response.data['results'][0]
+        assert 'active_loans_count' not in response.data['results'][0]
+        assert 'username' in response.data['results'][0]
+
+
+@pytest.mark.django_db
+class TestCachedJWTAuthentication:
+    """Tests for JWT authentication without a users query per request"""
+    
+    def authenticate(self, api_client, user):
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_for_user(user)['access']}")
+    
+    def test_login_tokens_carry_role_claims(self, api_client, admin_user):
+        """Test that login tokens include the claims used by stateless authentication"""
+        response = api_client.post(reverse('accounts:login'), {
+            'username': 'admin', 'password': 'AdminPass123!'
+        }, format='json')
+        
+        token = AccessToken(response.data['tokens']['access'])
+        assert token['role'] == 'admin'
+        assert token['is_staff'] is True
+        assert token['is_superuser'] is False
+    
+    def test_cached_user_costs_no_query(self, api_client, regular_user, django_assert_num_queries):
+        """Test that authenticated requests reuse the cached user record"""
+        self.authenticate(api_client, regular_user)
+        url = reverse('accounts:user_stats')
+        api_client.get(url)
+        
+        # Only the loan summary is read
+        with django_assert_num_queries(1):
+            response = api_client.get(url)
+        
+        assert response.status_code == status.HTTP_200_OK
+    
+    def test_deferred_fields_load_in_one_query(self, api_client, regular_user, django_assert_num_queries):
+        """Test that reading the rest of the cached user takes a single query"""
+        self.authenticate(api_client, regular_user)
+        url = reverse('accounts:user_profile')
+        api_client.get(url)
+        
+        with django_assert_num_queries(1):
+            response = api_client.get(url, {'exclude': 'active_loans_count'})
+        
+        assert response.data['email'] == 'user@example.com'
+        assert response.data['username'] == 'user'
+    
+    def test_cache_invalidated_on_save(self, api_client, regular_user):
+        """Test that role and active status changes apply to the next request"""
+        self.authenticate(api_client, regular_user)
+        url = reverse('accounts:user_list')
+        assert api_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+        
+        regular_user.role = 'admin'
+        regular_user.save()
+        assert api_client.get(url).status_code == status.HTTP_200_OK
+        
+        regular_user.is_active = False
+        regular_user.save()
+        assert api_client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_change_password_with_cached_user(self, api_client, regular_user):
+        """Test that a cached user can change their password"""
+        self.authenticate(api_client, regular_user)
+        api_client.get(reverse('accounts:user_stats'))
+        response = api_client.post(reverse('accounts:change_password'), {
+            'old_password': 'UserPass123!',
+            'new_password': 'NewPass456!',
+            'new_password_confirm': 'NewPass456!'
+        }, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        regular_user.refresh_from_db()
+        assert regular_user.check_password('NewPass456!')
+    
+    def test_profile_update_changes_loan_etag(self, api_client, regular_user):
+        """Test that a profile update through a cached user bumps updated_at, which loan ETags include"""
+        book = Book.objects.create(title='Etag Book', author='Author', isbn='9780000000011', page_count=10)
+        loan = Loan.objects.create(user=regular_user, book=book, due_date=timezone.now() + timedelta(days=14))
+        self.authenticate(api_client, regular_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': loan.pk})
+        etag = api_client.get(url)['ETag']
+        updated_at = User.objects.get(pk=regular_user.pk).updated_at
+        
+        response = api_client.patch(reverse('accounts:user_profile'), {'first_name': 'Renamed'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert User.objects.get(pk=regular_user.pk).updated_at > updated_at
+        
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['user']['first_name'] == 'Renamed'
+    
+    def test_stateless_profile_update_keeps_current_role(self, api_client, admin_user, settings):
+        """Test that saving the profile does not write back the role claims of an older token"""
+        settings.JWT_STATELESS_USER = True
+        self.authenticate(api_client, admin_user)
+        admin_user.role = 'user'
+        admin_user.is_staff = False
+        admin_user.save()
+        
+        response = api_client.patch(reverse('accounts:user_profile'), {'first_name': 'Renamed'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        
+        admin_user.refresh_from_db()
+        assert admin_user.first_name == 'Renamed'
+        assert admin_user.role == 'user'
+        assert admin_user.is_staff is False
+    
+    def test_deleted_user_rejected(self, api_client, regular_user):
+        """Test that a deleted user's token stops working"""
+        self.authenticate(api_client, regular_user)
+        regular_user.delete()
+        
+        assert api_client.get(reverse('accounts:user_stats')).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_stateless_mode(self, api_client, admin_user, settings, django_assert_num_queries):
+        """Test that stateless mode authenticates from token claims alone"""
+        settings.JWT_STATELESS_USER = True
+        self.authenticate(api_client, admin_user)
+        
+        # Only the statistics aggregate is run
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse('loans:loan_stats'))
+        
+        assert response.status_code == status.HTTP_200_OK
+    
+    def test_stateless_refresh_reloads_claims(self, api_client, admin_user, settings):
+        """Test that a refresh picks up a demotion and refuses a deactivated user"""
+        settings.JWT_STATELESS_USER = True
+        refresh_url = reverse('accounts:token_refresh')
+        tokens = tokens_for_user(admin_user)
+        
+        admin_user.role = 'user'
+        admin_user.is_staff = False
+        admin_user.save()
+        response = api_client.post(refresh_url, {'refresh': tokens['refresh']}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        access = AccessToken(response.data['access'])
+        assert access['role'] == 'user'
+        assert access['is_staff'] is False
+        assert RefreshToken(response.data['refresh'])['role'] == 'user'
+        
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        assert api_client.get(reverse('accounts:user_list')).status_code == status.HTTP_403_FORBIDDEN
+        
+        admin_user.is_active = False
+        admin_user.save()
+        response = api_client.post(refresh_url, {'refresh': response.data['refresh']}, format='json')
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestTokenBlacklist:
+    """Tests for the refresh token blacklist"""
+    
+    def refresh(self, api_client, token):
+        return api_client.post(reverse('accounts:token_refresh'), {'refresh': token}, format='json')
+    
+    def test_logout_blacklists_refresh_token(self, api_client, regular_user):
+        """Test that a refresh token stops working after logout"""
+        tokens = tokens_for_user(regular_user)
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        response = api_client.post(reverse('accounts:logout'), {'refresh': tokens['refresh']}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert self.refresh(api_client, tokens['refresh']).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_rotation_blacklists_old_token(self, api_client, regular_user):
+        """Test that a rotated refresh token cannot be used again"""
+        token = tokens_for_user(regular_user)['refresh']
+        response = self.refresh(api_client, token)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert self.refresh(api_client, response.data['refresh']).status_code == status.HTTP_200_OK
+        assert self.refresh(api_client, token).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_unlisted_token_checked_without_query(self, regular_user, django_assert_num_queries):
+        """Test that a token missing from the Bloom filter needs no blacklist query"""
+        token_blacklist.contains('warm-up')
+        
+        with django_assert_num_queries(0):
+            assert token_blacklist.contains('not-blacklisted') is False
+    
+    def test_other_workers_sync(self, regular_user):
+        """Test that a filter built earlier picks up tokens blacklisted elsewhere"""
+        other = TokenBlacklistFilter()
+        assert other.contains('warm-up') is False
+        
+        token = OutstandingToken.objects.create(
+            user=regular_user, jti='revoked', token='token', expires_at=timezone.now() + timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=token)
+        token_blacklist.add('revoked')
+        
+        assert other.contains('revoked') is True
+    
+    def test_bloom_false_positive_confirmed_in_database(self, regular_user):
+        """Test that a Bloom filter match that is not blacklisted is accepted"""
+        token_blacklist.contains('warm-up')
+        token_blacklist.bloom.add('false-positive')
+        
+        assert token_blacklist.contains('false-positive') is False
+    
+    def test_purge_expired_tokens(self, regular_user):
+        """Test that expired tokens and their blacklist entries are purged"""
+        now = timezone.now()
+        expired = OutstandingToken.objects.create(
+            user=regular_user, jti='expired', token='token', expires_at=now - timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=expired)
+        OutstandingToken.objects.create(
+            user=regular_user, jti='current', token='token', expires_at=now + timedelta(days=1)
+        )
+        
+        call_command('purge_tokens', chunk_size=1)
+        
+        assert list(OutstandingToken.objects.values_list('jti', flat=True)) == ['current']
+        assert not BlacklistedToken.objects.exists()
+
+
+@pytest.mark.django_db
+class TestLastLogin:
+    """Tests for buffered last_login updates"""
+    
+    def login(self, api_client, username, password):
+        return api_client.post(reverse('accounts:login'), {
+            'username': username, 'password': password
+        }, format='json')
+    
+    def test_login_buffered_until_flush(self, api_client, regular_user):
+        """Test that a login is written on the next flush, not during the request"""
+        response = self.login(api_client, 'user', 'UserPass123!')
+        
+        assert response.status_code == status.HTTP_200_OK
+        regular_user.refresh_from_db()
+        assert regular_user.last_login is None
+        
+        assert last_login_buffer.flush() == 1
+        regular_user.refresh_from_db()
+        assert regular_user.last_login is not None
+    
+    def test_logins_written_in_one_query(self, api_client, regular_user, admin_user, django_assert_num_queries):
+        """Test that buffered logins of several users are flushed together"""
+        self.login(api_client, 'user', 'UserPass123!')
+        self.login(api_client, 'user', 'UserPass123!')
+        self.login(api_client, 'admin', 'AdminPass123!')
+        
+        with django_assert_num_queries(1):
+            assert last_login_buffer.flush() == 2
+        assert User.objects.filter(last_login__isnull=True).count() == 0
+    
+    def test_token_refresh_recorded(self, api_client, regular_user):
+        """Test that refreshing a token counts as a login"""
+        response = api_client.post(reverse('accounts:token_refresh'), {
+            'refresh': tokens_for_user(regular_user)['refresh']
+        }, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert regular_user.pk in last_login_buffer.pending
+    
+    def test_zero_interval_writes_immediately(self, api_client, regular_user, settings):
+        """Test that a flush interval of 0 disables buffering"""
+        settings.LAST_LOGIN_FLUSH_INTERVAL = 0
+        self.login(api_client, 'user', 'UserPass123!')
+        
+        regular_user.refresh_from_db()
+        assert regular_user.last_login is not None
+        assert not last_login_buffer.pending
+
+
+@pytest.mark.django_db
+class TestPasswordHashing:
+    """Tests for the tuned hashers and the bounded hashing pool"""
+    
+    def login(self, api_client):
+        return api_client.post(reverse('accounts:login'), {
+            'username': 'user', 'password': 'UserPass123!'
+        }, format='json')
+    
+    def test_hashing_runs_on_pool(self, regular_user, monkeypatch):
+        """Test that password checks are handed to the hashing pool"""
+        calls = []
+        run = hashing_pool.run
+        
+        def record(func, *args):
+            calls.append(func.__name__)
+            return run(func, *args)
+        monkeypatch.setattr(hashing_pool, 'run', record)
+        
+        assert regular_user.check_password('UserPass123!')
+        assert calls[0] == 'verify'
+    
+    def test_full_pool_refuses_work(self):
+        """Test that calls beyond the workers and queue are refused at once"""
+        pool = HashingPool(workers=1, queue_size=0)
+        started, release = threading.Event(), threading.Event()
+        
+        def block():
+            started.set()
+            release.wait(5)
+        
+        worker = threading.Thread(target=pool.run, args=(block,))
+        worker.start()
+        started.wait(5)
+        try:
+            with pytest.raises(PasswordHashingBusy):
+                pool.run(lambda: None)
+        finally:
+            release.set()
+            worker.join()
+        assert pool.run(lambda: 'done') == 'done'
+    
+    def test_login_burst_leaves_request_threads_free(self, monkeypatch, settings):
+        """Test that a burst of hashing as large as a gunicorn worker's threads cannot take all of them"""
+        request_threads = 4  # gunicorn --threads
+        monkeypatch.setattr('accounts.hashers.hashing_pool', HashingPool())
+        started, release = threading.Semaphore(0), threading.Event()
+        
+        def slow_encode(hasher, password, salt, *args):
+            started.release()
+            release.wait(5)
+            return 'hashed'
+        monkeypatch.setattr('django.contrib.auth.hashers.PBKDF2PasswordHasher.encode', slow_encode)
+        
+        def login():
+            try:
+                return make_password('UserPass123!')
+            except PasswordHashingBusy:
+                return 503
+        
+        with ThreadPoolExecutor(max_workers=request_threads) as worker:
+            burst = [worker.submit(login) for _ in range(request_threads)]
+            try:
+                for _ in range(settings.PASSWORD_HASHING_WORKERS):
+                    assert started.acquire(timeout=5)
+                # Another request still gets a thread while hashing is under way
+                assert worker.submit(lambda: 'served').result(timeout=5) == 'served'
+                assert not release.is_set()
+            finally:
+                release.set()
+            outcomes = [future.result() for future in burst]
+        
+        assert outcomes.count(503) == request_threads - settings.PASSWORD_HASHING_WORKERS
+        assert outcomes.count('hashed') == settings.PASSWORD_HASHING_WORKERS
+    
+    def test_busy_login_returns_503(self, api_client, regular_user, monkeypatch):
+        """Test that a saturated pool turns logins away with Retry-After"""
+        def busy(func, *args):
+            raise PasswordHashingBusy()
+        monkeypatch.setattr(hashing_pool, 'run', busy)
+        
+        response = self.login(api_client)
+        
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response['Retry-After'] == '1'
+    
+    def test_rehash_on_login(self, api_client, regular_user, settings):
+        """Test that a hash with outdated costs is replaced on the next login"""
+        settings.PBKDF2_ITERATIONS = 1000
+        
+        assert self.login(api_client).status_code == status.HTTP_200_OK
+        regular_user.refresh_from_db()
+        assert regular_user.password.startswith('pbkdf2_sha256$1000$')
+        assert regular_user.check_password('UserPass123!')
+    
+    def test_argon2_profile_costs(self, regular_user, settings):
+        """Test that the Argon2 hasher uses the configured costs"""
+        pytest.importorskip('argon2')
+        settings.PASSWORD_HASHERS = ['accounts.hashers.Argon2PasswordHasher', 'accounts.hashers.PBKDF2PasswordHasher']
+        settings.ARGON2_TIME_COST = 1
+        settings.ARGON2_MEMORY_COST = 1024
+        settings.ARGON2_PARALLELISM = 1
+        
+        regular_user.set_password('NewPass456!')
+        
+        assert regular_user.password.startswith('argon2$argon2id$v=19$m=1024,t=1,p=1$')
+        assert regular_user.check_password('NewPass456!')
 
 
 @pytest.mark.django_db
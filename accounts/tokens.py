@@ -0,0 +1,72 @@
+"""
+Refresh tokens checked against the in-memory blacklist filter, and the
+refresh endpoint that re-reads the user's claims on every refresh.
+"""
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from .blacklist import token_blacklist
+from .last_login import last_login_buffer
+
+User = get_user_model()
+
+# Fields carried as token claims for stateless authentication
+USER_CLAIMS = ('role', 'is_staff', 'is_superuser')
+
+
+def set_user_claims(token, user):
+    """Copy the user's USER_CLAIMS onto the token"""
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    RefreshToken whose blacklist lookups go through token_blacklist first.
+    """
+    
+    def check_blacklist(self):
+        if token_blacklist.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+    
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        token_blacklist.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    """
+    Token refresh that reloads the user's claims, refuses inactive or deleted
+    users, and records the refresh as the user's last login.
+    """
+    token_class = RefreshToken
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.only('is_active', *USER_CLAIMS).filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(_('No active account found for the given token.'), code='no_active_account')
+        
+        # Claims stamped at login would otherwise be carried forward on every rotation
+        set_user_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+        
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The blacklist app is not installed
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        
+        last_login_buffer.record(user.pk)
+        return data
@@ -2,13 +2,18 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, get_user_model
+from django.db.models import Count, Q
 from .serializers import (
     UserSerializer, UserProfileSerializer, UserListSerializer,
     LoginSerializer, ChangePasswordSerializer
 )
+from .authentication import tokens_for_user, writable_user
+from .last_login import last_login_buffer
 from .permissions import IsAdminUser, IsOwnerOrAdmin
+from .tokens import RefreshToken
+from library_management.sparse import SparseFieldsetViewMixin
+from loans import stats as loan_stats
 
 User = get_user_model()
 
@@ -27,15 +32,9 @@ class RegisterView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
-        
         return Response({
             'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            },
+            'tokens': tokens_for_user(user),
             'message': 'User registered successfully'
         }, status=status.HTTP_201_CREATED)
 
@@ -58,13 +57,10 @@ class LoginView(APIView):
         user = authenticate(username=username, password=password)
         
         if user is not None:
-            refresh = RefreshToken.for_user(user)
+            last_login_buffer.record(user.pk)
             return Response({
                 'user': UserProfileSerializer(user).data,
-                'tokens': {
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                },
+                'tokens': tokens_for_user(user),
                 'message': 'Login successful'
             }, status=status.HTTP_200_OK)
         else:
@@ -95,36 +91,51 @@ class LogoutView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(SparseFieldsetViewMixin, generics.RetrieveUpdateAPIView):
     """
     API endpoint to view and update user profile.
     Users can only view/update their own profile.
+    Pass ?fields= or ?exclude= to prune fields.
     """
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     
     def get_object(self):
-        return self.request.user
+        return writable_user(self.request.user)
 
 
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UserDetailView(SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint to retrieve, update, or delete a user.
     Only admins can access other users' details.
+    Pass ?fields= or ?exclude= to prune fields.
     """
-    queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    
+    def get_queryset(self):
+        return self.sparse_queryset(User.objects.all())
 
 
-class UserListView(generics.ListAPIView):
+class UserListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     API endpoint to list all users.
     Only admins can view the list.
+    Pass ?fields= or ?exclude= to prune fields.
     """
-    queryset = User.objects.all()
     serializer_class = UserListSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    
+    def get_queryset(self):
+        """
+        Only count active loans when the count is part of the response.
+        """
+        queryset = User.objects.order_by('-created_at')
+        if self.selects('active_loans_count'):
+            queryset = queryset.annotate(
+                active_loans_count=Count('loans', filter=Q(loans__returned_at__isnull=True))
+            )
+        return self.sparse_queryset(queryset)
 
 
 class ChangePasswordView(APIView):
@@ -137,7 +148,7 @@ class ChangePasswordView(APIView):
         serializer = ChangePasswordSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        user = request.user
+        user = writable_user(request.user)
         
         # Check old password
         if not user.check_password(serializer.validated_data['old_password']):
@@ -160,15 +171,4 @@ def user_stats(request):
     """
     Get statistics for the authenticated user.
     """
-    user = request.user
-    
-    stats = {
-        'total_loans': user.loans.count(),
-        'active_loans': user.loans.filter(returned_at__isnull=True).count(),
-        'returned_loans': user.loans.filter(returned_at__isnull=False, status='returned').count(),
-        'overdue_loans': user.loans.filter(status='overdue').count(),
-        'total_fines': sum(loan.fine_amount for loan in user.loans.filter(fine_amount__gt=0)),
-        'unpaid_fines': sum(loan.fine_amount for loan in user.loans.filter(fine_paid=False, fine_amount__gt=0)),
-    }
-    
-    return Response(stats, status=status.HTTP_200_OK)
+    return Response(loan_stats.user_stats(request.user), status=status.HTTP_200_OK)
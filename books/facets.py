@@ -0,0 +1,68 @@
+"""
+Facet counts for the book list.
+
+Each facet is one GROUP BY over the filtered queryset, ordered by count and
+cut off at BOOK_FACETS_LIMIT in the database, so a nearly unique column such
+as author returns at most that many rows. Results are cached per filter
+signature until the catalog changes, so sidebars need one request instead of
+one per facet value.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, Value, When
+from .response_cache import catalog_version
+
+FACET_FIELDS = ('category', 'language', 'author', 'available')
+
+# Query parameters that do not change which books match
+IGNORED_PARAMS = ('page', 'page_size', 'cursor', 'pagination', 'ordering', 'facets')
+
+
+def requested_facets(value):
+    """Parse ?facets=: 'true' selects every facet, otherwise a comma separated list"""
+    if not value:
+        return ()
+    if value.lower() in ('true', '1', 'all'):
+        return FACET_FIELDS
+    names = [name.strip() for name in value.split(',')]
+    return tuple(name for name in FACET_FIELDS if name in names)
+
+
+def filter_signature(query_params):
+    """Stable hash of the query parameters that affect filtering"""
+    items = sorted(
+        (key, value)
+        for key in query_params
+        if key not in IGNORED_PARAMS
+        for value in query_params.getlist(key)
+    )
+    return hashlib.sha1(repr(items).encode()).hexdigest()
+
+
+def compute_facets(queryset, facets=FACET_FIELDS):
+    """Count books per facet value, with one grouped query per facet"""
+    limit = getattr(settings, 'BOOK_FACETS_LIMIT', 50)
+    queryset = queryset.order_by().annotate(available=Case(
+        When(available_copies__gt=0, then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    ))
+    
+    return {
+        facet: [
+            {'value': row[facet], 'count': row['count']}
+            for row in queryset.values(facet).annotate(count=Count('id')).order_by('-count', facet)[:limit]
+        ]
+        for facet in facets
+    }
+
+
+def get_facets(queryset, query_params, facets=FACET_FIELDS):
+    """Return facet counts for the filtered queryset, cached per filter signature and catalog version"""
+    key = f"books:facets:{catalog_version()}:{','.join(facets)}:{filter_signature(query_params)}"
+    result = cache.get(key)
+    if result is None:
+        result = compute_facets(queryset, facets)
+        cache.set(key, result, getattr(settings, 'BOOK_FACETS_CACHE_TIMEOUT', 60))
+    return result
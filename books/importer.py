@@ -0,0 +1,179 @@
+"""
+Streaming bulk import of the book catalog from CSV or JSON Lines.
+
+Rows are read one at a time, validated in batches with BookImportSerializer
+and upserted on isbn with bulk_create(update_conflicts=True). Invalid rows are
+reported and skipped without aborting the rest of their batch.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+from .models import Book
+from .response_cache import invalidate_catalog
+from .serializers import BookImportSerializer
+from .stats import invalidate_book_stats
+
+FORMATS = ('csv', 'jsonl')
+
+# Catalog fields refreshed when an ISBN already exists. Copy counts are left
+# alone so an import never disturbs books that are out on loan.
+UPDATE_FIELDS = (
+    'title', 'author', 'publisher', 'publication_date', 'page_count',
+    'language', 'description', 'cover_image', 'category', 'shelf_location',
+    'updated_at',
+)
+
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    """Raised when the import file format is unknown or unreadable"""
+
+
+class ImportRowError(Exception):
+    """Stands in for a row that could not be parsed"""
+    
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def detect_format(filename, default=None):
+    """Guess the import format from a file name"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return default
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (line_number, row) pairs from a binary stream.
+    Empty CSV cells are treated as missing values. Raises ImportFormatError
+    if the file is not UTF-8 or not valid CSV.
+    """
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unsupported import format '{fmt}', expected one of {', '.join(FORMATS)}")
+    
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    line_number = 0
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text, strict=True)
+            for row in reader:
+                line_number = reader.line_num
+                yield line_number, {key: value for key, value in row.items() if key and value != ''}
+        else:
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    row = {'non_field_errors': [f'Invalid JSON: {exc}']}
+                    yield line_number, ImportRowError(row)
+                    continue
+                yield line_number, row
+    except UnicodeDecodeError:
+        raise ImportFormatError(f'The file is not valid UTF-8 (after line {line_number})')
+    except csv.Error as exc:
+        raise ImportFormatError(f'Invalid CSV after line {line_number}: {exc}')
+
+
+class ImportResult:
+    """Running totals for an import, with a bounded list of row errors"""
+    
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+    
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+    
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def import_books(stream, fmt, batch_size=None):
+    """
+    Import books from a binary stream in the given format.
+    Memory use is bounded by the batch size, not the file size.
+    """
+    batch_size = batch_size or getattr(settings, 'BOOK_IMPORT_BATCH_SIZE', 1000)
+    result = ImportResult()
+    rows = iter_rows(stream, fmt)
+    
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            _import_batch(batch, result)
+    finally:
+        # Batches written before an unreadable part of the file stay imported
+        if result.created or result.updated:
+            invalidate_book_stats()
+    return result
+
+
+def _import_batch(batch, result):
+    result.processed += len(batch)
+    
+    # One serializer instance validates the whole batch, avoiding per-row setup
+    validator = BookImportSerializer()
+    books = {}
+    for line, row in batch:
+        if isinstance(row, ImportRowError):
+            result.add_error(line, row.errors)
+            continue
+        if not isinstance(row, dict):
+            result.add_error(line, {'non_field_errors': ['Row is not a JSON object']})
+            continue
+        try:
+            attrs = validator.run_validation(row)
+        except serializers.ValidationError as exc:
+            result.add_error(line, exc.detail)
+            continue
+        # Later rows win when the same ISBN appears twice in a batch
+        books[attrs['isbn']] = (line, Book(**attrs))
+    
+    if not books:
+        return
+    
+    isbns = list(books)
+    try:
+        with transaction.atomic():
+            existing = set(Book.objects.filter(isbn__in=isbns).values_list('isbn', flat=True))
+            Book.objects.bulk_create(
+                [book for _, book in books.values()],
+                update_conflicts=True,
+                unique_fields=['isbn'],
+                update_fields=UPDATE_FIELDS,
+            )
+            book_ids = list(Book.objects.filter(isbn__in=isbns).values_list('id', flat=True))
+    except DatabaseError as exc:
+        for line, _ in books.values():
+            result.add_error(line, {'non_field_errors': [str(exc)]})
+        return
+    
+    invalidate_catalog(book_ids)
+    result.updated += len(existing)
+    result.created += len(books) - len(existing)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from books.importer import FORMATS, ImportFormatError, detect_format, import_books
+
+
+class Command(BaseCommand):
+    help = 'Bulk import books from a CSV or JSON Lines file, upserting on ISBN'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the file to import')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format (default: guessed from the file extension)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Number of rows validated and written per batch'
+        )
+    
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        if fmt is None:
+            raise CommandError('Could not guess the file format, pass --format')
+        
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_books(stream, fmt, batch_size=options['batch_size'])
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+        
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {result.processed} rows: {result.created} created, '
+            f'{result.updated} updated, {result.failed} failed'
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.CheckConstraint(check=models.Q(('available_copies__lte', models.F('total_copies'))), name='books_available_copies_lte_total_copies'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_available_copies_lte_total_copies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField(db_index=True)),
+                ('isbn', models.CharField(max_length=13)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'deleted_books',
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at', 'id'], name='books_updated_bfc753_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedbook',
+            index=models.Index(fields=['deleted_at', 'id'], name='deleted_boo_deleted_ef47e2_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+"""
+Full-text search structures for the book catalog, maintained by the database.
+
+PostgreSQL gets a stored generated tsvector column with a GIN index, SQLite
+an FTS5 table kept in step by triggers. Either way Django never writes the
+index itself. Structures left behind by the former post_migrate install are
+dropped and rebuilt.
+"""
+from django.db import migrations
+
+SEARCH_FIELDS = ('title', 'author', 'isbn', 'description')
+
+POSTGRES_WEIGHTS = {'title': 'A', 'author': 'A', 'isbn': 'A', 'description': 'C'}
+POSTGRES_VECTOR = ' || '.join(
+    f"setweight(to_tsvector('english', coalesce({field}, '')), '{weight}')"
+    for field, weight in POSTGRES_WEIGHTS.items()
+)
+
+COLUMNS = ', '.join(SEARCH_FIELDS)
+VALUES = ', '.join(f"coalesce({field}, '')" for field in SEARCH_FIELDS)
+NEW_VALUES = ', '.join(f"coalesce(new.{field}, '')" for field in SEARCH_FIELDS)
+CHANGED = ' OR '.join(f'old.{field} IS NOT new.{field}' for field in SEARCH_FIELDS)
+
+SQL = {
+    'postgresql': (
+        [
+            'ALTER TABLE books DROP COLUMN IF EXISTS search_vector',
+            f'ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({POSTGRES_VECTOR}) STORED',
+            'CREATE INDEX books_search_vector_gin ON books USING gin (search_vector)',
+        ],
+        [
+            'DROP INDEX IF EXISTS books_search_vector_gin',
+            'ALTER TABLE books DROP COLUMN IF EXISTS search_vector',
+        ],
+    ),
+    'sqlite': (
+        [
+            'DROP TABLE IF EXISTS books_fts',
+            f'CREATE VIRTUAL TABLE books_fts USING fts5({COLUMNS})',
+            f'INSERT INTO books_fts (rowid, {COLUMNS}) SELECT id, {VALUES} FROM books',
+            f'CREATE TRIGGER books_fts_insert AFTER INSERT ON books BEGIN '
+            f'INSERT INTO books_fts (rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END',
+            f'CREATE TRIGGER books_fts_update AFTER UPDATE OF {COLUMNS} ON books WHEN {CHANGED} BEGIN '
+            f'DELETE FROM books_fts WHERE rowid = old.id; '
+            f'INSERT INTO books_fts (rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END',
+            'CREATE TRIGGER books_fts_delete AFTER DELETE ON books BEGIN '
+            'DELETE FROM books_fts WHERE rowid = old.id; END',
+        ],
+        [
+            'DROP TRIGGER IF EXISTS books_fts_insert',
+            'DROP TRIGGER IF EXISTS books_fts_update',
+            'DROP TRIGGER IF EXISTS books_fts_delete',
+            'DROP TABLE IF EXISTS books_fts',
+        ],
+    ),
+}
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL that only runs on one database vendor"""
+    
+    def __init__(self, vendor, sql, reverse_sql):
+        self.vendor = vendor
+        super().__init__(sql, reverse_sql)
+    
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, args, {'vendor': self.vendor, **kwargs}
+    
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+    
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+    
+    def describe(self):
+        return f'Raw SQL operation for {self.vendor}'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_title_id_index'),
+    ]
+
+    operations = [
+        VendorRunSQL(vendor, sql, reverse_sql)
+        for vendor, (sql, reverse_sql) in SQL.items()
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 
 class Book(models.Model):
@@ -44,14 +46,36 @@ class Book(models.Model):
         ordering = ['title']
         indexes = [
             models.Index(fields=['isbn']),
-            models.Index(fields=['title']),
+            models.Index(fields=['title', 'id']),
             models.Index(fields=['author']),
             models.Index(fields=['category']),
+            models.Index(fields=['updated_at', 'id']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(available_copies__lte=F('total_copies')),
+                name='books_available_copies_lte_total_copies',
+            ),
         ]
         
     def __str__(self):
         return f"{self.title} by {self.author}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the counts loaded from the database to detect changes on save"""
+        instance = super().from_db(db, field_names, values)
+        instance._remember_counts()
+        return instance
+    
+    def _remember_counts(self):
+        """Snapshot the fields that feed the catalog statistics"""
+        self._loaded_counts = {
+            field: self.__dict__[field]
+            for field in ('total_copies', 'available_copies', 'category')
+            if field in self.__dict__
+        }
+    
     @property
     def is_available(self):
         """Check if book is available for borrowing"""
@@ -63,23 +87,66 @@ class Book(models.Model):
         return self.total_copies - self.available_copies
     
     def borrow(self):
-        """Decrease available copies when book is borrowed"""
-        if self.available_copies > 0:
-            self.available_copies -= 1
-            self.save()
-            return True
-        return False
+        """
+        Decrease available copies when book is borrowed.
+        Uses a single conditional UPDATE so concurrent borrows cannot oversell.
+        """
+        updated = Book.objects.filter(pk=self.pk, available_copies__gt=0).update(
+            available_copies=F('available_copies') - 1,
+            updated_at=timezone.now()
+        )
+        if updated:
+            self._refresh_available_copies(delta=-1)
+        return bool(updated)
     
     def return_book(self):
-        """Increase available copies when book is returned"""
-        if self.available_copies < self.total_copies:
-            self.available_copies += 1
-            self.save()
-            return True
-        return False
+        """
+        Increase available copies when book is returned.
+        Uses a single conditional UPDATE that never exceeds total copies.
+        """
+        updated = Book.objects.filter(pk=self.pk, available_copies__lt=F('total_copies')).update(
+            available_copies=F('available_copies') + 1,
+            updated_at=timezone.now()
+        )
+        if updated:
+            self._refresh_available_copies(delta=1)
+        return bool(updated)
+    
+    def _refresh_available_copies(self, delta):
+        """Reload the counters after a conditional UPDATE and propagate the change to the caches"""
+        from .response_cache import invalidate_catalog
+        from .stats import apply_copies_change
+        self.refresh_from_db(fields=['available_copies', 'updated_at'])
+        # Inside a transaction the UPDATE keeps the row locked, so the reload sees
+        # only this change; in autocommit another one may already have landed
+        if transaction.get_connection(self._state.db).in_atomic_block:
+            apply_copies_change(self.available_copies - delta, self.available_copies)
+        else:
+            apply_copies_change(None, self.available_copies)
+        invalidate_catalog([self.pk])
+        self._remember_counts()
     
     def clean(self):
         """Validate that available_copies doesn't exceed total_copies"""
         from django.core.exceptions import ValidationError
         if self.available_copies > self.total_copies:
             raise ValidationError('Available copies cannot exceed total copies')
+
+
+class DeletedBook(models.Model):
+    """
+    Tombstone for a deleted book, so delta sync clients can drop it.
+    """
+    book_id = models.BigIntegerField(db_index=True)
+    isbn = models.CharField(max_length=13)
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'deleted_books'
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['deleted_at', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Deleted book {self.book_id} ({self.isbn})"
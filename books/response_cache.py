@@ -0,0 +1,126 @@
+"""
+Response cache for the public catalog endpoints.
+
+Cached responses are keyed by path and normalized query parameters plus a
+version token. Any write to the catalog replaces the catalog-wide token, and
+a write to one book replaces that book's token, so stale entries are simply
+never read again. Tokens are replaced once the write commits: a reader that
+fills the cache before then stores its rows under the old token. Responses
+sent with Cache-Control: no-store are not cached. Use a shared cache backend
+when running several workers, otherwise each worker only sees its own
+invalidations.
+"""
+import hashlib
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'books:version'
+
+
+def _book_version_key(book_id):
+    return f'books:version:{book_id}'
+
+
+def _version(key):
+    """Current version token; a missing token is replaced, never reset to a default"""
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def catalog_version():
+    """Token that changes whenever any book changes"""
+    return _version(CATALOG_VERSION_KEY)
+
+
+def _replace_versions(book_ids):
+    token = uuid.uuid4().hex
+    versions = {CATALOG_VERSION_KEY: token}
+    versions.update({_book_version_key(book_id): token for book_id in book_ids})
+    cache.set_many(versions, None)
+
+
+def invalidate_catalog(book_ids=()):
+    """
+    Invalidate cached catalog responses, including the details of the given
+    books, when the current transaction commits (at once outside a transaction).
+    """
+    book_ids = list(book_ids)
+    transaction.on_commit(lambda: _replace_versions(book_ids))
+
+
+def response_cache_key(request, book_id=None, kind='response'):
+    """
+    Key for a cached response, or another value derived from the request.
+    Detail responses depend only on their book; everything else on the whole catalog.
+    """
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    if book_id is None:
+        version = catalog_version()
+    else:
+        version = _version(_book_version_key(book_id))
+    # Values such as ETags differ per negotiated format
+    media_type = getattr(request, 'accepted_media_type', None)
+    signature = hashlib.sha1(
+        repr((request.scheme, request.get_host(), request.path, params, media_type)).encode()
+    ).hexdigest()
+    return f'books:{kind}:{version}:{signature}'
+
+
+def _cached(request, book_id, produce):
+    key = response_cache_key(request, book_id)
+    data = cache.get(key)
+    if data is not None:
+        return Response(data, status=status.HTTP_200_OK)
+    
+    response = produce()
+    if response.status_code == status.HTTP_200_OK and 'no-store' not in response.get('Cache-Control', ''):
+        cache.set(key, response.data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+    return response
+
+
+def cached_catalog_value(request, book_id, kind, produce):
+    """Cache produce() for the request until the catalog (or the given book) changes"""
+    key = response_cache_key(request, book_id, kind)
+    value = cache.get(key)
+    if value is None:
+        value = produce()
+        cache.set(key, value, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+    return value
+
+
+def cache_catalog_response(view_func):
+    """
+    Cache the response of a function-based catalog view.
+    Apply it below @api_view so throttling and permissions still run.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return _cached(request, None, lambda: view_func(request, *args, **kwargs))
+    return wrapper
+
+
+class CatalogCacheMixin:
+    """
+    Cache GET responses of a catalog view.
+    Views with a `pk` URL kwarg are cached per book.
+    """
+    
+    def get(self, request, *args, **kwargs):
+        return _cached(
+            request,
+            kwargs.get('pk'),
+            lambda: super(CatalogCacheMixin, self).get(request, *args, **kwargs)
+        )
@@ -0,0 +1,122 @@
+"""
+Full-text search backends for the book catalog.
+
+PostgreSQL keeps a weighted tsvector column on the books table behind a GIN
+index; SQLite keeps an FTS5 shadow table keyed by book id. Both are created by
+the books 0005_book_search migration and maintained by the database itself,
+as a generated column and by triggers respectively, so writes to books need
+no extra statements. The backend used for queries is chosen with the
+BOOK_SEARCH_BACKEND setting.
+"""
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+SEARCH_FIELDS = ('title', 'author', 'isbn', 'description')
+
+
+def search_tokens(terms):
+    """Split a search string into plain word tokens, dropping any query syntax"""
+    return re.findall(r'\w+', terms)
+
+
+class BaseSearchBackend:
+    """
+    Interface for catalog search backends.
+    `search` must filter the queryset and annotate it with `search_rank`.
+    """
+    vendor = None
+    
+    def search(self, queryset, terms):
+        raise NotImplementedError
+    
+    def _table(self):
+        from .models import Book
+        return connection.ops.quote_name(Book._meta.db_table)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted tsvector column with a GIN index"""
+    vendor = 'postgresql'
+    config = 'english'
+    
+    def search(self, queryset, terms):
+        tokens = search_tokens(terms)
+        if not tokens:
+            return queryset
+        
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        column = f'{self._table()}.search_vector'
+        query_sql = f"to_tsquery('{self.config}', %s)"
+        return queryset.filter(
+            RawSQL(f'{column} @@ {query_sql}', [tsquery], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f'ts_rank({column}, {query_sql})', [tsquery], output_field=FloatField())
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 shadow table whose rowid is the book id"""
+    vendor = 'sqlite'
+    fts_table = 'books_fts'
+    # bm25() column weights, in SEARCH_FIELDS order
+    weights = (10.0, 10.0, 10.0, 1.0)
+    
+    def search(self, queryset, terms):
+        tokens = search_tokens(terms)
+        if not tokens:
+            return queryset
+        
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        matches = f"SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s"
+        # bm25() is lower for better matches, so negate it to rank descending
+        weights = ', '.join(str(weight) for weight in self.weights)
+        rank = (f"(SELECT -bm25({self.fts_table}, {weights}) FROM {self.fts_table} "
+                f"WHERE {self.fts_table} MATCH %s AND rowid = {self._table()}.id)")
+        return queryset.filter(
+            pk__in=RawSQL(matches, [match])
+        ).annotate(
+            search_rank=RawSQL(rank, [match], output_field=FloatField())
+        )
+
+
+def get_search_backend():
+    """
+    Return the configured search backend, or None when full-text search is
+    disabled or the backend does not match the active database.
+    """
+    path = getattr(settings, 'BOOK_SEARCH_BACKEND', None)
+    if not path:
+        return None
+    backend = import_string(path)()
+    if backend.vendor != connection.vendor:
+        return None
+    return backend
+
+
+class BookSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that uses the full-text backend when one is available.
+    Without an explicit ?ordering=, results are ranked by relevance.
+    Place it after OrderingFilter so the ranking takes precedence.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        
+        terms = request.query_params.get(self.search_param, '')
+        if not search_tokens(terms):
+            return queryset
+        
+        queryset = backend.search(queryset, terms)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+            queryset = queryset.order_by('-search_rank', *ordering)
+        return queryset
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Book
+from library_management.fastpath import ValuesSerializer
+from library_management.sparse import SparseFieldsetMixin
+from .models import Book, DeletedBook
 
 
 class BookSerializer(serializers.ModelSerializer):
@@ -48,9 +50,29 @@ class BookSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class BookListSerializer(serializers.ModelSerializer):
+class BookImportSerializer(BookSerializer):
+    """
+    Validates rows for the bulk import.
+    ISBN uniqueness is not checked because existing ISBNs are updated in place.
+    """
+    
+    class Meta(BookSerializer.Meta):
+        extra_kwargs = {'isbn': {'validators': []}}
+    
+    def validate(self, attrs):
+        """New books start with every copy available unless told otherwise"""
+        attrs = super().validate(attrs)
+        if 'available_copies' not in attrs:
+            attrs['available_copies'] = attrs.get('total_copies', 1)
+        return attrs
+
+
+class BookListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Minimal serializer for listing books"""
     is_available = serializers.ReadOnlyField()
+    computed_field_sources = {
+        'is_available': ('available_copies',),
+    }
     
     class Meta:
         model = Book
@@ -61,11 +83,23 @@ class BookListSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class BookDetailSerializer(serializers.ModelSerializer):
+class BookListValuesSerializer(ValuesSerializer):
+    """Renders values() rows exactly like BookListSerializer"""
+    serializer_class = BookListSerializer
+    computed_fields = {
+        'is_available': lambda value: value('available_copies') > 0,
+    }
+
+
+class BookDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Detailed serializer for book with loan information"""
     is_available = serializers.ReadOnlyField()
     borrowed_copies = serializers.ReadOnlyField()
     active_loans_count = serializers.SerializerMethodField()
+    computed_field_sources = {
+        'is_available': ('available_copies',),
+        'borrowed_copies': ('total_copies', 'available_copies'),
+    }
     
     class Meta:
         model = Book
@@ -79,7 +113,18 @@ class BookDetailSerializer(serializers.ModelSerializer):
         read_only_fields = fields
     
     def get_active_loans_count(self, obj):
-        """Get count of active loans for this book"""
+        """Get count of active loans for this book, preferring an annotated value"""
+        active_loans_count = getattr(obj, 'active_loans_count', None)
+        if active_loans_count is not None:
+            return active_loans_count
         return obj.loans.filter(returned_at__isnull=True).count()
 
 
+class DeletedBookSerializer(serializers.ModelSerializer):
+    """Serializer for tombstones of deleted books"""
+    id = serializers.IntegerField(source='book_id', read_only=True)
+    
+    class Meta:
+        model = DeletedBook
+        fields = ('id', 'isbn', 'deleted_at')
+        read_only_fields = fields
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Book, DeletedBook
+from .response_cache import invalidate_catalog
+from .stats import invalidate_book_stats
+
+
+@receiver(post_save, sender=Book)
+def update_stats_on_save(sender, instance, created, **kwargs):
+    """
+    Drop the cached stats when a save may change them. The counts loaded with
+    the instance can be stale by the time it is saved, so they are not used
+    to patch the cached entry.
+    """
+    previous = getattr(instance, '_loaded_counts', {})
+    current = {
+        field: instance.__dict__[field]
+        for field in ('total_copies', 'available_copies', 'category')
+        if field in instance.__dict__
+    }
+    
+    if created or previous != current:
+        invalidate_book_stats()
+    
+    instance._remember_counts()
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_stats_on_delete(sender, instance, **kwargs):
+    """Deleting a book can change every statistic, including categories"""
+    invalidate_book_stats()
+
+
+@receiver(post_delete, sender=Book)
+def record_deleted_book(sender, instance, **kwargs):
+    """Leave a tombstone so delta sync clients learn about the deletion"""
+    DeletedBook.objects.create(book_id=instance.pk, isbn=instance.isbn)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    """Cached catalog responses must not outlive a write to the book"""
+    invalidate_catalog([instance.pk])
@@ -0,0 +1,107 @@
+"""
+Catalog statistics for the book_stats endpoint.
+
+Stats are computed with one conditional aggregate query and kept in the cache.
+Borrowing or returning a book applies its change to the cached entry once the
+transaction commits, so it does not force a rescan of the books table. Any
+change whose previous counts are not known for certain drops the entry instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+STATS_CACHE_KEY = 'books:stats'
+# Held while a worker patches the cached entry
+STATS_LOCK_KEY = 'books:stats:lock'
+# Set whenever the entry is dropped; a worker patching meanwhile drops its result
+STATS_DIRTY_KEY = 'books:stats:dirty'
+STATS_LOCK_TIMEOUT = 5
+
+
+def _cache_timeout():
+    return getattr(settings, 'BOOK_STATS_CACHE_TIMEOUT', 300)
+
+
+def compute_book_stats():
+    """Compute catalog statistics with a single aggregate query"""
+    from .models import Book
+
+    stats = Book.objects.aggregate(
+        total_books=Count('id'),
+        available_books=Count('id', filter=Q(available_copies__gt=0)),
+        borrowed_books=Count('id', filter=Q(available_copies=0)),
+        total_copies=Coalesce(Sum('total_copies'), 0),
+        available_copies=Coalesce(Sum('available_copies'), 0),
+        named_categories=Count('category', distinct=True),
+        uncategorized=Count('id', filter=Q(category__isnull=True)),
+    )
+
+    # A missing category counts as one distinct value, matching DISTINCT semantics
+    stats['categories'] = stats.pop('named_categories') + (1 if stats.pop('uncategorized') else 0)
+    stats['as_of'] = timezone.now().isoformat()
+    return stats
+
+
+def get_book_stats():
+    """Return cached catalog statistics, computing them on a miss"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_book_stats()
+        cache.set(STATS_CACHE_KEY, stats, _cache_timeout())
+    return stats
+
+
+def invalidate_book_stats():
+    """Drop the cached statistics once the current transaction commits"""
+    transaction.on_commit(_drop_stats)
+
+
+def _drop_stats():
+    # Flag first, so a patch that read the entry before the delete does not write it back
+    cache.set(STATS_DIRTY_KEY, True, STATS_LOCK_TIMEOUT)
+    cache.delete(STATS_CACHE_KEY)
+
+
+def apply_copies_change(old_available, new_available, total_delta=0):
+    """
+    Apply a change in a single book's copy counts to the cached statistics
+    once the current transaction commits. `old_available` must come from a
+    row the transaction had locked; pass None when it is not known for
+    certain and the statistics are dropped instead.
+    """
+    if old_available is None:
+        invalidate_book_stats()
+    else:
+        transaction.on_commit(lambda: _patch_stats(old_available, new_available, total_delta))
+
+
+def _patch_stats(old_available, new_available, total_delta):
+    # get/set is not atomic: while another worker patches, drop the entry instead
+    if not cache.add(STATS_LOCK_KEY, True, STATS_LOCK_TIMEOUT):
+        _drop_stats()
+        return
+    
+    try:
+        stats = cache.get(STATS_CACHE_KEY)
+        if stats is None:
+            return
+        
+        stats['total_copies'] += total_delta
+        stats['available_copies'] += new_available - old_available
+        
+        was_available = old_available > 0
+        is_available = new_available > 0
+        if was_available != is_available:
+            stats['available_books'] += 1 if is_available else -1
+            stats['borrowed_books'] += -1 if is_available else 1
+        
+        stats['as_of'] = timezone.now().isoformat()
+        cache.set(STATS_CACHE_KEY, stats, _cache_timeout())
+        # A change that arrived meanwhile may be missing from what was just written
+        if cache.get(STATS_DIRTY_KEY):
+            cache.delete_many([STATS_CACHE_KEY, STATS_DIRTY_KEY])
+    finally:
+        cache.delete(STATS_LOCK_KEY)
@@ -0,0 +1,111 @@
+"""
+Delta sync of the book catalog.
+
+Clients keep an opaque cursor and ask for everything that changed after it:
+books created or updated, ordered by (updated_at, id), and tombstones of
+deleted books, ordered by (deleted_at, id). Both streams are read with keyset
+conditions, so a poll with nothing new costs a few index lookups.
+
+updated_at and deleted_at are stamped before the write commits, so a row can
+become visible after rows with later timestamps. Rows are therefore only
+returned once their timestamp is BOOK_SYNC_SAFETY_WINDOW seconds old. Every
+write that commits within that window of its timestamp (plus any clock skew
+between servers) is delivered exactly once; changes reach clients that much
+later. Responses that hold back newer changes are marked as not cacheable.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from .models import Book, DeletedBook
+
+
+def encode_cursor(books_position, deleted_position):
+    payload = json.dumps({'b': books_position, 'd': deleted_position}, separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode()
+
+
+def _parse_position(position):
+    if position is None:
+        return None
+    timestamp, pk = position
+    parsed = parse_datetime(timestamp)
+    if parsed is None:
+        raise ValueError(timestamp)
+    return parsed, int(pk)
+
+
+def decode_cursor(encoded):
+    """Return the (books, deleted) positions of a cursor; each is (timestamp, id) or None"""
+    try:
+        payload = json.loads(urlsafe_b64decode(encoded.encode()))
+        return _parse_position(payload['b']), _parse_position(payload['d'])
+    except (TypeError, ValueError, KeyError):
+        raise NotFound('Invalid cursor')
+
+
+def _after(queryset, field, position):
+    if position is None:
+        return queryset
+    timestamp, pk = position
+    return queryset.filter(Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk}))
+
+
+def _page(queryset, field, position, limit):
+    """Up to `limit` rows after `position`, whether more follow, and the new position"""
+    rows = list(_after(queryset, field, position).order_by(field, 'id')[:limit + 1])
+    page = rows[:limit]
+    if page:
+        position = (getattr(page[-1], field), page[-1].id)
+    return page, len(rows) > limit, position
+
+
+def _serialize_position(position):
+    if position is None:
+        return None
+    timestamp, pk = position
+    return [timestamp.isoformat(), pk]
+
+
+DEFAULT_SAFETY_WINDOW = 10
+
+
+def get_changes(cursor=None, limit=None, now=None):
+    """
+    Return books and tombstones after the cursor, with the cursor to resume from.
+    Without a cursor every book is returned and existing tombstones are skipped.
+    `pending` tells whether newer changes were held back by the safety window.
+    """
+    if not limit or limit < 1:
+        limit = getattr(settings, 'BOOK_SYNC_PAGE_SIZE', 500)
+    limit = min(limit, getattr(settings, 'BOOK_SYNC_MAX_PAGE_SIZE', 1000))
+    window = getattr(settings, 'BOOK_SYNC_SAFETY_WINDOW', DEFAULT_SAFETY_WINDOW)
+    horizon = (now or timezone.now()) - timedelta(seconds=window)
+    settled_books = Book.objects.filter(updated_at__lte=horizon)
+    settled_deleted = DeletedBook.objects.filter(deleted_at__lte=horizon)
+    
+    if cursor:
+        books_position, deleted_position = decode_cursor(cursor)
+    else:
+        books_position = None
+        latest = settled_deleted.order_by('-deleted_at', '-id').values_list('deleted_at', 'id').first()
+        deleted_position = tuple(latest) if latest else None
+    
+    books, more_books, books_position = _page(settled_books, 'updated_at', books_position, limit)
+    deleted, more_deleted, deleted_position = _page(settled_deleted, 'deleted_at', deleted_position, limit)
+    has_more = more_books or more_deleted
+    
+    return {
+        'books': books,
+        'deleted': deleted,
+        'has_more': has_more,
+        'pending': not has_more and (
+            Book.objects.filter(updated_at__gt=horizon).exists() or
+            DeletedBook.objects.filter(deleted_at__gt=horizon).exists()
+        ),
+        'cursor': encode_cursor(_serialize_position(books_position), _serialize_position(deleted_position)),
+    }
@@ -1,9 +1,28 @@
+import io
+import json
+import uuid
+import msgpack
 import pytest
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from .models import Book
+from .serializers import BookListSerializer, BookListValuesSerializer
+from .stats import STATS_CACHE_KEY, STATS_LOCK_KEY
+from library_management.pagination import KeysetPagination
+from library_management.parsers import FastJSONParser
+from library_management.renderers import FastJSONRenderer
+from library_management.throttling import AnonRateThrottle, ThrottleStore
 
 User = get_user_model()
 
@@ -103,6 +122,49 @@ class TestBookList:
         assert len(response.data['results']) >= 1
         assert response.data['results'][0]['title'] == 'Sample Book'
     
+    def test_list_books_search_description_and_isbn(self, api_client, sample_book, book_data):
+        """Test full-text search over description and ISBN prefixes"""
+        Book.objects.create(**book_data)
+        url = reverse('books:book_list')
+        
+        response = api_client.get(url, {'search': 'description'})
+        assert [book['title'] for book in response.data['results']] == ['Test Book']
+        
+        response = api_client.get(url, {'search': '978098'})
+        assert [book['title'] for book in response.data['results']] == ['Sample Book']
+    
+    def test_list_books_search_ranked(self, api_client, sample_book, book_data):
+        """Test that title matches rank above description matches"""
+        book_data['title'] = 'Another Book'
+        book_data['description'] = 'Mentions the sample book in passing'
+        Book.objects.create(**book_data)
+        url = reverse('books:book_list')
+        response = api_client.get(url, {'search': 'sample'})
+        
+        titles = [book['title'] for book in response.data['results']]
+        assert titles == ['Sample Book', 'Another Book']
+    
+    def test_list_books_search_follows_updates_and_deletes(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test that the search index is kept in sync with book changes"""
+        url = reverse('books:book_list')
+        sample_book.title = 'Renamed Volume'
+        sample_book.save()
+        
+        assert api_client.get(url, {'search': 'Sample Book'}).data['count'] == 0
+        assert api_client.get(url, {'search': 'Renamed'}).data['count'] == 1
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.delete()
+        assert api_client.get(url, {'search': 'Renamed'}).data['count'] == 0
+    
+    def test_search_index_needs_no_extra_queries(self, api_client, sample_book, django_assert_num_queries):
+        """Test that the database keeps the search index current within the book's own UPDATE"""
+        sample_book.title = 'Renamed Volume'
+        with django_assert_num_queries(1):
+            sample_book.save()
+        
+        assert api_client.get(reverse('books:book_list'), {'search': 'Renamed'}).data['count'] == 1
+    
     def test_list_books_filter_by_category(self, api_client, sample_book):
         """Test filtering books by category"""
         url = reverse('books:book_list')
@@ -122,6 +184,207 @@ class TestBookList:
             assert book['is_available'] is True
 
 
+@pytest.mark.django_db
+class TestBookFacets:
+    """Tests for facet counts on the book list"""
+    
+    @pytest.fixture
+    def catalog(self, sample_book, unavailable_book):
+        Book.objects.create(
+            title='Another Science Book', author='Sample Author', isbn='9787777777771',
+            page_count=50, category='Science', language='German'
+        )
+    
+    def test_facets_not_included_by_default(self, api_client, catalog):
+        """Test that facets are opt-in"""
+        response = api_client.get(reverse('books:book_list'))
+        
+        assert 'facets' not in response.data
+    
+    def test_all_facets(self, api_client, catalog, django_assert_num_queries):
+        """Test facet counts come from one grouped query per facet"""
+        url = reverse('books:book_list')
+        # ETag probe, COUNT, page SELECT and one query per facet
+        with django_assert_num_queries(7):
+            response = api_client.get(url, {'facets': 'true'})
+        
+        facets = response.data['facets']
+        assert facets['category'] == [
+            {'value': 'Science', 'count': 2}, {'value': 'Fantasy', 'count': 1}
+        ]
+        assert {'value': 'English', 'count': 2} in facets['language']
+        assert {'value': 'Sample Author', 'count': 2} in facets['author']
+        assert {'value': True, 'count': 2} in facets['available']
+        assert {'value': False, 'count': 1} in facets['available']
+    
+    def test_facet_values_limited_in_database(self, api_client, catalog, settings, django_assert_num_queries):
+        """Test that only the most frequent values are fetched, by a LIMITed query"""
+        settings.BOOK_FACETS_LIMIT = 1
+        
+        with django_assert_num_queries(4) as context:
+            response = api_client.get(reverse('books:book_list'), {'facets': 'author'})
+        
+        assert response.data['facets']['author'] == [{'value': 'Sample Author', 'count': 2}]
+        assert 'LIMIT 1' in context.captured_queries[-1]['sql']
+    
+    def test_facets_follow_filters_and_search(self, api_client, catalog):
+        """Test facets are computed over the filtered queryset"""
+        url = reverse('books:book_list')
+        response = api_client.get(url, {'facets': 'language,available', 'search': 'science'})
+        
+        assert set(response.data['facets']) == {'language', 'available'}
+        assert response.data['facets']['available'] == [{'value': True, 'count': 1}]
+        
+        response = api_client.get(url, {'facets': 'category', 'category': 'Science'})
+        assert response.data['facets']['category'] == [{'value': 'Science', 'count': 2}]
+    
+    def test_facets_cached_per_filter_signature(self, api_client, catalog, django_assert_num_queries):
+        """Test repeated requests with the same filters reuse cached facets"""
+        url = reverse('books:book_list')
+        api_client.get(url, {'facets': 'true', 'category': 'Science', 'page': 1})
+        # ETag probe, COUNT and page SELECT; no facet query
+        with django_assert_num_queries(3):
+            api_client.get(url, {'category': 'Science', 'facets': 'true', 'ordering': 'author'})
+
+
+@pytest.mark.django_db
+class TestBookCursorPagination:
+    """Tests for keyset (cursor) pagination of the book list"""
+    
+    @pytest.fixture
+    def many_books(self, db):
+        """25 books with repeated titles and some missing publication dates"""
+        books = []
+        for i in range(25):
+            books.append(Book.objects.create(
+                title=f'Title {i % 4}',
+                author=f'Author {i % 3}',
+                isbn=f'97800000000{i:02d}',
+                page_count=100,
+                publication_date=None if i % 5 == 0 else date(2000 + i % 7, 1, 1),
+            ))
+        return books
+    
+    def walk(self, api_client, params):
+        """Follow next links from the first cursor page to the end"""
+        url = reverse('books:book_list')
+        response = api_client.get(url, {'pagination': 'cursor', **params})
+        ids = []
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            ids.extend(book['id'] for book in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = api_client.get(response.data['next'])
+    
+    @pytest.mark.parametrize('ordering', [
+        'title', '-title', 'author', 'publication_date', '-publication_date', '-created_at',
+    ])
+    def test_walk_every_ordering(self, api_client, many_books, ordering):
+        """Test that walking all pages returns every book once in order"""
+        ids = self.walk(api_client, {'ordering': ordering})
+        
+        assert len(ids) == len(set(ids)) == 25
+        values = list(Book.objects.filter(id__in=ids).values_list(ordering.lstrip('-'), 'id'))
+        by_id = {book_id: value for value, book_id in values}
+        keys = [by_id[book_id] for book_id in ids]
+        non_null = [key for key in keys if key is not None]
+        assert non_null == sorted(non_null, reverse=ordering.startswith('-'))
+        # Missing values are grouped at the end
+        assert all(key is None for key in keys[len(non_null):])
+    
+    def test_walk_ranked_search(self, api_client, many_books):
+        """Test that relevance-ranked search results can be walked by cursor"""
+        ids = self.walk(api_client, {'search': 'Title'})
+        
+        assert len(ids) == len(set(ids)) == 25
+    
+    def test_cursor_page_does_not_count(self, api_client, many_books, django_assert_num_queries):
+        """Test that a cursor page only runs the page SELECT besides the ETag probe"""
+        url = reverse('books:book_list')
+        with django_assert_num_queries(2):
+            response = api_client.get(url, {'pagination': 'cursor'})
+        with django_assert_num_queries(2):
+            api_client.get(response.data['next'])
+    
+    def test_invalid_cursor(self, api_client, many_books):
+        """Test that a malformed or mismatched cursor is rejected"""
+        url = reverse('books:book_list')
+        assert api_client.get(url, {'cursor': 'garbage'}).status_code == status.HTTP_404_NOT_FOUND
+        
+        next_link = api_client.get(url, {'pagination': 'cursor'}).data['next']
+        response = api_client.get(next_link + '&ordering=author')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_cursor_page_uses_index(self, many_books):
+        """Test that a title-ordered page is read from the (title, id) index without sorting"""
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        page = KeysetPagination()
+        plan = Book.objects.order_by('title', 'id').filter(
+            page._after(Book, ['title', 'id'], ['Title 1', many_books[1].pk])
+        )[:10].explain()
+        
+        assert 'books_title_06cf8a_idx' in plan
+        assert 'TEMP B-TREE' not in plan
+    
+    @pytest.mark.parametrize('position', [['x', 'abc'], ['x', ['1']], [{'a': 1}, 1], ['x', None]])
+    def test_tampered_cursor_values(self, api_client, many_books, position):
+        """Test that cursor values which don't fit their fields are rejected"""
+        from base64 import urlsafe_b64encode
+        payload = json.dumps({'o': ['title', 'id'], 'p': position}).encode()
+        response = api_client.get(reverse('books:book_list'), {'cursor': urlsafe_b64encode(payload).decode()})
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_page_number_pagination_is_default(self, api_client, many_books):
+        """Test that plain requests keep page number pagination"""
+        url = reverse('books:book_list')
+        response = api_client.get(url)
+        
+        assert response.data['count'] == 25
+
+
+@pytest.mark.django_db
+class TestBookExport:
+    """Tests for streaming catalog export"""
+    
+    def test_export_ndjson(self, api_client, sample_book, unavailable_book):
+        """Test NDJSON export streams one object per line"""
+        import json
+        url = reverse('books:book_export', kwargs={'export_format': 'ndjson'})
+        response = api_client.get(url)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        assert [row['isbn'] for row in rows] == [sample_book.isbn, unavailable_book.isbn]
+        assert rows[0]['is_available'] is True
+    
+    def test_export_csv_with_filters(self, api_client, sample_book, unavailable_book):
+        """Test CSV export applies the list view filters"""
+        import csv
+        url = reverse('books:book_export', kwargs={'export_format': 'csv'})
+        response = api_client.get(url, {'available': 'false'})
+        
+        assert response['Content-Type'] == 'text/csv'
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        assert len(rows) == 1
+        assert rows[0]['isbn'] == unavailable_book.isbn
+        assert rows[0]['publisher'] == ''
+    
+    def test_export_unknown_format(self, api_client):
+        """Test that unknown export formats return 404"""
+        url = reverse('books:book_export', kwargs={'export_format': 'xml'})
+        response = api_client.get(url)
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 @pytest.mark.django_db
 class TestBookDetail:
     """Tests for book detail view"""
@@ -191,6 +454,132 @@ class TestBookCreate:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
+@pytest.mark.django_db
+class TestBookImport:
+    """Tests for the bulk book import"""
+    
+    CSV = (
+        'title,author,isbn,page_count,total_copies,category,description\n'
+        'Imported One,Author A,9785555555551,120,4,History,\n'
+        'Bad Row,Author B,12AB,0,1,,\n'
+        'Sample Book Revised,Sample Author,9780987654321,260,9,Science,Revised edition\n'
+        'Imported Two,Author C,9785555555552,80,,,A history of imports\n'
+    )
+    
+    def upload(self, api_client, content, name):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        url = reverse('books:book_import')
+        return api_client.post(url, {'file': SimpleUploadedFile(name, content.encode())}, format='multipart')
+    
+    def test_import_csv_as_admin(self, api_client, admin_user, sample_book):
+        """Test that valid rows are upserted and invalid rows reported"""
+        sample_book.borrow()
+        api_client.force_authenticate(user=admin_user)
+        response = self.upload(api_client, self.CSV, 'books.csv')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['processed'] == 4
+        assert response.data['created'] == 2
+        assert response.data['updated'] == 1
+        assert response.data['failed'] == 1
+        assert response.data['errors'][0]['line'] == 3
+        assert set(response.data['errors'][0]['errors']) == {'isbn', 'page_count'}
+        
+        imported = Book.objects.get(isbn='9785555555551')
+        assert imported.total_copies == imported.available_copies == 4
+        assert imported.description is None
+        assert Book.objects.get(isbn='9785555555552').title == 'Imported Two'
+        
+        # Catalog fields are refreshed but circulation counts are kept
+        sample_book.refresh_from_db()
+        assert sample_book.title == 'Sample Book Revised'
+        assert sample_book.total_copies == 3
+        assert sample_book.available_copies == 2
+    
+    def test_import_updates_search_index(self, api_client, admin_user):
+        """Test that imported books are searchable"""
+        api_client.force_authenticate(user=admin_user)
+        self.upload(api_client, self.CSV, 'books.csv')
+        
+        response = api_client.get(reverse('books:book_list'), {'search': 'history'})
+        titles = {book['title'] for book in response.data['results']}
+        assert titles == {'Imported Two'}
+    
+    def test_import_jsonl(self, api_client, admin_user):
+        """Test importing JSON Lines with a malformed line"""
+        api_client.force_authenticate(user=admin_user)
+        content = (
+            '{"title": "Json Book", "author": "J", "isbn": "9786666666661", "page_count": 10}\n'
+            '{not json}\n'
+            '\n'
+            '["not", "an", "object"]\n'
+        )
+        response = self.upload(api_client, content, 'books.jsonl')
+        
+        assert response.data['created'] == 1
+        assert response.data['failed'] == 2
+        assert [error['line'] for error in response.data['errors']] == [2, 4]
+    
+    def test_import_unknown_format(self, api_client, admin_user):
+        """Test that an unknown file type is rejected"""
+        api_client.force_authenticate(user=admin_user)
+        response = self.upload(api_client, 'whatever', 'books.xml')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_import_non_utf8_file(self, api_client, admin_user):
+        """Test that a file in another encoding is rejected"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        api_client.force_authenticate(user=admin_user)
+        content = 'title,author,isbn,page_count\nCafé,A,9787777777771,10\n'.encode('latin-1')
+        response = api_client.post(
+            reverse('books:book_import'),
+            {'file': SimpleUploadedFile('books.csv', content)},
+            format='multipart',
+        )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'UTF-8' in response.data['error']
+    
+    def test_import_malformed_csv(self, api_client, admin_user):
+        """Test that an unreadable CSV is rejected"""
+        api_client.force_authenticate(user=admin_user)
+        response = self.upload(api_client, 'title,author\n"Unclosed,A\n', 'books.csv')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Invalid CSV' in response.data['error']
+    
+    def test_import_command_unreadable_file(self, tmp_path):
+        """Test that the command reports an unreadable file as an error"""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        
+        path = tmp_path / 'books.csv'
+        path.write_bytes('title,author\nCafé,A\n'.encode('latin-1'))
+        with pytest.raises(CommandError, match='UTF-8'):
+            call_command('import_books', str(path))
+    
+    def test_import_as_regular_user(self, api_client, regular_user):
+        """Test importing as regular user (should fail)"""
+        api_client.force_authenticate(user=regular_user)
+        response = self.upload(api_client, self.CSV, 'books.csv')
+        
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_import_command_in_batches(self, tmp_path):
+        """Test the import_books management command with small batches"""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        path = tmp_path / 'books.csv'
+        path.write_text(self.CSV)
+        out = StringIO()
+        call_command('import_books', str(path), '--batch-size', '2', stdout=out, stderr=StringIO())
+        
+        assert 'Processed 4 rows: 3 created, 0 updated, 1 failed' in out.getvalue()
+        assert Book.objects.count() == 3
+
+
 @pytest.mark.django_db
 class TestBookUpdate:
     """Tests for book update"""
@@ -252,6 +641,134 @@ class TestBookStats:
         assert 'available_books' in response.data
         assert 'borrowed_books' in response.data
         assert response.data['total_books'] >= 2
+    
+    def test_book_stats_values(self, api_client, sample_book, unavailable_book):
+        """Test that aggregated statistics match the catalog"""
+        url = reverse('books:book_stats')
+        response = api_client.get(url)
+        
+        assert response.data['total_books'] == 2
+        assert response.data['available_books'] == 1
+        assert response.data['borrowed_books'] == 1
+        assert response.data['total_copies'] == 5
+        assert response.data['available_copies'] == 3
+        assert response.data['categories'] == 2
+        assert 'as_of' in response.data
+    
+    def test_book_stats_single_query(self, api_client, sample_book, django_assert_num_queries):
+        """Test that stats are computed in one query and then served from cache"""
+        url = reverse('books:book_stats')
+        with django_assert_num_queries(1):
+            api_client.get(url)
+        with django_assert_num_queries(0):
+            api_client.get(url)
+    
+    def test_book_stats_updated_on_borrow_and_return(self, api_client, sample_book, django_capture_on_commit_callbacks, django_assert_num_queries):
+        """Test that cached stats follow borrow and return incrementally"""
+        url = reverse('books:book_stats')
+        api_client.get(url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+        with django_assert_num_queries(0):
+            response = api_client.get(url)
+        assert response.data['available_copies'] == 2
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+            sample_book.borrow()
+        response = api_client.get(url)
+        assert response.data['available_copies'] == 0
+        assert response.data['available_books'] == 0
+        assert response.data['borrowed_books'] == 1
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.return_book()
+        response = api_client.get(url)
+        assert response.data['available_copies'] == 1
+        assert response.data['available_books'] == 1
+        assert response.data['borrowed_books'] == 0
+    
+    def test_book_stats_unchanged_by_rolled_back_borrow(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test that a borrow rolled back with its transaction never reaches the cached stats"""
+        url = reverse('books:book_stats')
+        api_client.get(url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            with pytest.raises(RuntimeError):
+                with transaction.atomic():
+                    sample_book.borrow()
+                    raise RuntimeError
+        
+        assert api_client.get(url).data['available_copies'] == 3
+        sample_book.refresh_from_db()
+        assert sample_book.available_copies == 3
+    
+    def test_book_stats_dropped_while_another_patch_runs(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test that a patch that cannot take the lock drops the cached stats"""
+        url = reverse('books:book_stats')
+        api_client.get(url)
+        cache.add(STATS_LOCK_KEY, True)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+        
+        assert cache.get(STATS_CACHE_KEY) is None
+        assert api_client.get(url).data['available_copies'] == 2
+    
+    def test_book_stats_patch_discarded_after_invalidation(self, api_client, sample_book, book_data, django_capture_on_commit_callbacks, monkeypatch):
+        """Test that a patch holding the lock does not write back stats invalidated meanwhile"""
+        url = reverse('books:book_stats')
+        api_client.get(url)
+        with django_capture_on_commit_callbacks() as patches:
+            sample_book.borrow()
+        
+        # Another worker commits a new book between the patch's get and set
+        get = cache.get
+        
+        def get_then_create_book(key, *args, **kwargs):
+            value = get(key, *args, **kwargs)
+            if key == STATS_CACHE_KEY:
+                monkeypatch.setattr(cache, 'get', get)
+                with django_capture_on_commit_callbacks(execute=True):
+                    Book.objects.create(**book_data)
+            return value
+        
+        monkeypatch.setattr(cache, 'get', get_then_create_book)
+        patches[0]()
+        
+        assert cache.get(STATS_CACHE_KEY) is None
+        response = api_client.get(url)
+        assert response.data['total_books'] == 2
+        assert response.data['available_copies'] == 2 + book_data['available_copies']
+    
+    def test_book_stats_dropped_on_save(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test that saving changed counts drops the stats instead of patching them"""
+        url = reverse('books:book_stats')
+        api_client.get(url)
+        
+        sample_book.total_copies = 5
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.save()
+        
+        assert cache.get(STATS_CACHE_KEY) is None
+        assert api_client.get(url).data['total_copies'] == 5
+    
+    def test_book_stats_invalidated_on_create_and_delete(self, api_client, sample_book, book_data, django_capture_on_commit_callbacks):
+        """Test that creating or deleting a book refreshes the stats"""
+        url = reverse('books:book_stats')
+        api_client.get(url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            book = Book.objects.create(**book_data)
+        response = api_client.get(url)
+        assert response.data['total_books'] == 2
+        assert response.data['categories'] == 2
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            book.delete()
+        response = api_client.get(url)
+        assert response.data['total_books'] == 1
 
 
 @pytest.mark.django_db
@@ -268,6 +785,551 @@ class TestBookCategories:
         assert 'Science' in response.data['categories']
 
 
+@pytest.mark.django_db
+class TestCatalogResponseCache:
+    """Tests for the catalog response cache"""
+    
+    def test_book_list_served_from_cache(self, api_client, sample_book, django_assert_num_queries):
+        """Test that a repeated list request does not hit the database"""
+        url = reverse('books:book_list')
+        first = api_client.get(url, {'category': 'Science', 'ordering': 'title'})
+        
+        with django_assert_num_queries(0):
+            response = api_client.get(url, {'ordering': 'title', 'category': 'Science'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == first.data
+    
+    def test_book_detail_and_categories_served_from_cache(self, api_client, sample_book, django_assert_num_queries):
+        """Test that detail and category responses are cached"""
+        detail_url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        categories_url = reverse('books:book_categories')
+        api_client.get(detail_url)
+        api_client.get(categories_url)
+        
+        with django_assert_num_queries(0):
+            assert api_client.get(detail_url).data['id'] == sample_book.pk
+            assert api_client.get(categories_url).data['categories'] == ['Science']
+    
+    def test_not_found_is_not_cached(self, api_client, book_data):
+        """Test that a 404 does not hide a book created afterwards"""
+        url = reverse('books:book_detail', kwargs={'pk': 999})
+        assert api_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+        
+        Book.objects.create(id=999, **book_data)
+        assert api_client.get(url).status_code == status.HTTP_200_OK
+    
+    def test_cache_invalidated_on_save(self, api_client, admin_user, sample_book, django_capture_on_commit_callbacks):
+        """Test that updating a book refreshes list, detail and categories"""
+        list_url = reverse('books:book_list')
+        detail_url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        categories_url = reverse('books:book_categories')
+        for url in (list_url, detail_url, categories_url):
+            api_client.get(url)
+        
+        api_client.force_authenticate(user=admin_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.patch(
+                reverse('books:book_update', kwargs={'pk': sample_book.pk}),
+                {'title': 'Renamed Book', 'category': 'History'},
+                format='json'
+            )
+        api_client.force_authenticate(user=None)
+        
+        assert api_client.get(list_url).data['results'][0]['title'] == 'Renamed Book'
+        assert api_client.get(detail_url).data['title'] == 'Renamed Book'
+        assert api_client.get(categories_url).data['categories'] == ['History']
+    
+    def test_cache_invalidated_on_borrow_and_return(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test that availability is never served stale after a borrow or return"""
+        list_url = reverse('books:book_list')
+        detail_url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        api_client.get(list_url)
+        api_client.get(detail_url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+        assert api_client.get(list_url).data['results'][0]['available_copies'] == 2
+        assert api_client.get(detail_url).data['available_copies'] == 2
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.return_book()
+        assert api_client.get(detail_url).data['available_copies'] == 3
+    
+    def test_cache_invalidated_on_delete(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test that a deleted book disappears from cached responses"""
+        list_url = reverse('books:book_list')
+        detail_url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        api_client.get(list_url)
+        api_client.get(detail_url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.delete()
+        assert api_client.get(list_url).data['count'] == 0
+        assert api_client.get(detail_url).status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_invalidated_when_write_commits(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test that a reader during the write keeps seeing, and caching, the committed rows"""
+        detail_url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        api_client.get(detail_url)
+        
+        with django_capture_on_commit_callbacks() as callbacks:
+            sample_book.borrow()
+            assert api_client.get(detail_url).data['available_copies'] == 3
+        assert api_client.get(detail_url).data['available_copies'] == 3
+        
+        for callback in callbacks:
+            callback()
+        assert api_client.get(detail_url).data['available_copies'] == 2
+    
+    def test_other_book_details_stay_cached(self, api_client, sample_book, unavailable_book, django_assert_num_queries, django_capture_on_commit_callbacks):
+        """Test that a write to one book keeps other books' details cached"""
+        url = reverse('books:book_detail', kwargs={'pk': unavailable_book.pk})
+        api_client.get(url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+        with django_assert_num_queries(0):
+            assert api_client.get(url).data['id'] == unavailable_book.pk
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    """Tests for ETag / Last-Modified on the book endpoints"""
+    
+    def test_book_list_not_modified(self, api_client, sample_book):
+        """Test that a matching If-None-Match returns an empty 304"""
+        url = reverse('books:book_list')
+        response = api_client.get(url)
+        etag = response['ETag']
+        assert 'Last-Modified' in response
+        
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b''
+        assert response['ETag'] == etag
+    
+    def test_book_list_etag_depends_on_query(self, api_client, sample_book):
+        """Test that different filters get different ETags"""
+        url = reverse('books:book_list')
+        etag = api_client.get(url)['ETag']
+        
+        response = api_client.get(url, {'category': 'Science'}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+    
+    def test_book_list_etag_changes_on_borrow_and_delete(self, api_client, sample_book, unavailable_book, django_capture_on_commit_callbacks):
+        """Test that writes and deletions change the list ETag"""
+        url = reverse('books:book_list')
+        etag = api_client.get(url)['ETag']
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response['ETag']
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            unavailable_book.delete()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 1
+    
+    def test_book_list_probe_is_not_rendered(self, api_client, sample_book, django_assert_num_queries):
+        """Test that a 304 for an uncached list runs only the probe"""
+        url = reverse('books:book_list')
+        etag = api_client.get(url)['ETag']
+        cache.clear()
+        
+        with django_assert_num_queries(1):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    
+    def test_book_detail_conditional_requests(self, api_client, sample_book, django_capture_on_commit_callbacks):
+        """Test If-None-Match and If-Modified-Since on a book detail"""
+        url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        response = api_client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+        assert api_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == status.HTTP_304_NOT_MODIFIED
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['available_copies'] == 2
+    
+    def test_book_detail_single_query(self, api_client, sample_book, django_assert_num_queries):
+        """Test that a book detail loads the book and its active loan count together"""
+        url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        with django_assert_num_queries(1):
+            response = api_client.get(url)
+        assert response.data['active_loans_count'] == 0
+
+
+@pytest.mark.django_db
+class TestBookChanges:
+    """Tests for the delta sync endpoint"""
+    
+    @pytest.fixture(autouse=True)
+    def no_safety_window(self, settings):
+        """Return changes at once unless a test sets a window"""
+        settings.BOOK_SYNC_SAFETY_WINDOW = 0
+    
+    def test_full_sync_skips_old_tombstones(self, api_client, sample_book, unavailable_book, book_data):
+        """Test that a sync without a cursor returns every book and no deletions"""
+        Book.objects.create(**book_data).delete()
+        response = api_client.get(reverse('books:book_changes'))
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert {book['id'] for book in response.data['books']} == {sample_book.id, unavailable_book.id}
+        assert response.data['deleted'] == []
+        assert response.data['has_more'] is False
+    
+    def test_sync_in_batches(self, api_client, sample_book, unavailable_book, book_data):
+        """Test that following the cursor visits each book exactly once"""
+        third = Book.objects.create(**book_data)
+        url = reverse('books:book_changes')
+        
+        seen = []
+        params = {'limit': 2}
+        while True:
+            response = api_client.get(url, params)
+            seen.extend(book['id'] for book in response.data['books'])
+            params['cursor'] = response.data['cursor']
+            if not response.data['has_more']:
+                break
+        
+        assert seen == [sample_book.id, unavailable_book.id, third.id]
+    
+    def test_incremental_sync(self, api_client, admin_user, sample_book, unavailable_book, django_capture_on_commit_callbacks):
+        """Test that a poll returns only updated books and tombstones of deleted ones"""
+        url = reverse('books:book_changes')
+        cursor = api_client.get(url).data['cursor']
+        
+        response = api_client.get(url, {'cursor': cursor})
+        assert response.data['books'] == []
+        assert response.data['deleted'] == []
+        assert response.data['cursor'] == cursor
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            sample_book.borrow()
+            api_client.force_authenticate(user=admin_user)
+            api_client.delete(reverse('books:book_delete', kwargs={'pk': unavailable_book.pk}))
+            api_client.force_authenticate(user=None)
+        
+        response = api_client.get(url, {'cursor': cursor})
+        assert [book['id'] for book in response.data['books']] == [sample_book.id]
+        assert response.data['books'][0]['available_copies'] == 2
+        assert [book['id'] for book in response.data['deleted']] == [unavailable_book.id]
+        assert response.data['deleted'][0]['isbn'] == '9781111111111'
+        
+        response = api_client.get(url, {'cursor': response.data['cursor']})
+        assert response.data['books'] == []
+        assert response.data['deleted'] == []
+    
+    def test_invalid_cursor(self, api_client, sample_book):
+        """Test that a malformed cursor is rejected"""
+        response = api_client.get(reverse('books:book_changes'), {'cursor': 'garbage'})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_late_commit_not_skipped(self, settings, sample_book, unavailable_book, book_data):
+        """Test that a write stamped earlier but committed later still reaches a polling client"""
+        from books.sync import get_changes
+        settings.BOOK_SYNC_SAFETY_WINDOW = 60
+        now = timezone.now()
+        Book.objects.filter(pk=sample_book.pk).update(updated_at=now - timedelta(seconds=120))
+        # Committed first, but stamped after the write below
+        Book.objects.filter(pk=unavailable_book.pk).update(updated_at=now - timedelta(seconds=10))
+        
+        changes = get_changes(now=now)
+        assert [book.id for book in changes['books']] == [sample_book.id]
+        assert changes['pending'] is True
+        
+        late = Book.objects.create(**book_data)
+        Book.objects.filter(pk=late.pk).update(updated_at=now - timedelta(seconds=30))
+        changes = get_changes(changes['cursor'], now=now + timedelta(seconds=60))
+        assert [book.id for book in changes['books']] == [late.id, unavailable_book.id]
+        assert changes['pending'] is False
+    
+    def test_held_back_changes_not_cached(self, api_client, settings, sample_book):
+        """Test that a response holding back recent changes is neither cached nor cacheable"""
+        settings.BOOK_SYNC_SAFETY_WINDOW = 60
+        url = reverse('books:book_changes')
+        response = api_client.get(url)
+        assert response.data['books'] == []
+        assert 'no-store' in response['Cache-Control']
+        
+        Book.objects.filter(pk=sample_book.pk).update(updated_at=timezone.now() - timedelta(seconds=120))
+        response = api_client.get(url)
+        assert [book['id'] for book in response.data['books']] == [sample_book.id]
+        assert 'Cache-Control' not in response
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    """Tests for ?fields= and ?exclude= on the book endpoints"""
+    
+    def test_list_fields(self, api_client, sample_book):
+        """Test that only the requested fields are returned"""
+        response = api_client.get(reverse('books:book_list'), {'fields': 'id,title'})
+        
+        assert response.data['results'] == [{'id': sample_book.id, 'title': 'Sample Book'}]
+    
+    def test_list_exclude(self, api_client, sample_book):
+        """Test that excluded fields are dropped"""
+        response = api_client.get(reverse('books:book_list'), {'exclude': 'isbn,is_available'})
+        
+        result = response.data['results'][0]
+        assert 'isbn' not in result
+        assert 'is_available' not in result
+        assert result['available_copies'] == 3
+    
+    def test_detail_fields_skip_loan_count(self, api_client, sample_book, django_assert_num_queries):
+        """Test that a pruned detail loads only the needed columns and no loan count"""
+        url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        with django_assert_num_queries(1) as queries:
+            response = api_client.get(url, {'fields': 'id,title,is_available'})
+        
+        assert response.data == {'id': sample_book.id, 'title': 'Sample Book', 'is_available': True}
+        sql = queries.captured_queries[0]['sql']
+        assert 'COUNT' not in sql
+        assert 'description' not in sql
+    
+    def test_detail_exclude(self, api_client, sample_book):
+        """Test excluding the loan count from a book detail"""
+        url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        response = api_client.get(url, {'exclude': 'active_loans_count,description'})
+        
+        assert 'active_loans_count' not in response.data
+        assert 'description' not in response.data
+        assert response.data['borrowed_copies'] == 0
+    
+    def test_sparse_responses_have_own_etag(self, api_client, sample_book):
+        """Test that full and pruned representations do not share an ETag"""
+        url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        etag = api_client.get(url)['ETag']
+        
+        response = api_client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'id': sample_book.id}
+        
+        response = api_client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    
+    def test_export_ignores_fields(self, api_client, sample_book):
+        """Test that exports always contain every column"""
+        url = reverse('books:book_export', kwargs={'export_format': 'ndjson'})
+        response = api_client.get(url, {'fields': 'id'})
+        
+        assert b'"description"' in b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+class TestBookListValuesSerializer:
+    """Parity tests for the values() rendering path of the book list"""
+    
+    @pytest.fixture
+    def varied_books(self, sample_book, unavailable_book):
+        """Books with missing categories, unicode and sparse fields"""
+        Book.objects.create(
+            title='Ünïcödé «Title»', author='Zoë Author', isbn='9783333333333',
+            page_count=10, total_copies=4, available_copies=1, category=None
+        )
+        Book.objects.create(
+            title='', author='Anonymous', isbn='9784444444444',
+            page_count=1, category='', language='Français'
+        )
+    
+    def test_rows_render_identically(self, varied_books):
+        """Test that values() rows render to the same bytes as BookListSerializer"""
+        queryset = Book.objects.order_by('id')
+        slow = BookListSerializer(queryset, many=True).data
+        fast = BookListValuesSerializer().render(BookListValuesSerializer().values(queryset))
+        
+        assert JSONRenderer().render(fast) == JSONRenderer().render(slow)
+    
+    @pytest.mark.parametrize('params', [
+        {},
+        {'ordering': '-publication_date'},
+        {'ordering': 'author', 'page': 2},
+        {'available': 'false'},
+        {'category': 'Science'},
+        {'search': 'book'},
+        {'pagination': 'cursor', 'ordering': '-created_at'},
+        {'facets': 'true'},
+        {'fields': 'id,is_available'},
+        {'exclude': 'isbn,category', 'pagination': 'cursor'},
+    ])
+    def test_list_endpoint_parity(self, api_client, varied_books, settings, monkeypatch, params):
+        """Test that the book list returns the same bytes with and without the fast path"""
+        monkeypatch.setattr(KeysetPagination, 'page_size', 2)
+        url = reverse('books:book_list')
+        settings.USE_VALUES_SERIALIZERS = False
+        slow = api_client.get(url, params)
+        cache.clear()
+        settings.USE_VALUES_SERIALIZERS = True
+        fast = api_client.get(url, params)
+        
+        assert fast.status_code == status.HTTP_200_OK
+        assert fast.content == slow.content
+    
+    def test_cursor_walk_parity(self, api_client, varied_books, settings, monkeypatch):
+        """Test that cursor links produced by the fast path match the slow path"""
+        monkeypatch.setattr(KeysetPagination, 'page_size', 1)
+        url = reverse('books:book_list')
+        pages = {}
+        for enabled in (False, True):
+            settings.USE_VALUES_SERIALIZERS = enabled
+            cache.clear()
+            contents = []
+            response = api_client.get(url, {'pagination': 'cursor'})
+            while True:
+                contents.append(response.content)
+                if not response.data['next']:
+                    break
+                response = api_client.get(response.data['next'])
+            pages[enabled] = contents
+        
+        assert len(pages[True]) == 4
+        assert pages[True] == pages[False]
+
+
+class TestRenderers:
+    """Tests for the orjson renderer/parser and MessagePack negotiation"""
+    
+    @pytest.mark.parametrize('data', [
+        {'title': 'Ünïcödé «Title»', 'fine': Decimal('12.50'), 'nested': [1, None, True, 2.5]},
+        {'due': datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc), 'day': date(2024, 1, 2)},
+        {'naive': datetime(2024, 1, 2, 3, 4, 5), 'at': time(10, 30), 'took': timedelta(seconds=90)},
+        {'separators': 'line\u2028paragraph\u2029', 'control': 'tab\tnew\nline\x01', 1: 'int key'},
+        {'huge': 2 ** 70, 'lazy': gettext_lazy('Not found.'), 'id': uuid.UUID(int=1)},
+        [{'empty': {}, 'list': []}, 'quote " and \\ backslash'],
+    ])
+    def test_json_renderer_matches_drf(self, data):
+        """Test that FastJSONRenderer produces the same bytes as DRF's JSONRenderer"""
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+    
+    @pytest.mark.parametrize('data', [
+        {'floats': [1e16, 1e-05, 0.1, 2.5, -0.0, 1e22, 123456789012345.6, 5e-324, 1.7976931348623157e308]},
+        {'decimals': [Decimal('12.50'), Decimal('1E+16'), Decimal('0.00001'), Decimal('-0')], 'text': 'ok'},
+        [{'nested': {'deeper': [(1, 'x', 1e-7)]}}],
+        {1.5: 'float key', 1e16: 'exponent key'},
+        {
+            'utc': datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+            'offset': datetime(2024, 1, 2, 3, 4, 5, 6, tzinfo=dt_timezone(timedelta(hours=-5, minutes=-30))),
+            'naive': datetime(2024, 1, 2, 3, 4, 5, 600),
+            'day': date(1, 1, 1),
+        },
+    ])
+    def test_json_renderer_number_and_date_parity(self, data):
+        """Test that floats, Decimals and datetimes render byte for byte like DRF"""
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+    
+    @pytest.mark.parametrize('value', [float('nan'), float('inf'), float('-inf'), Decimal('NaN'), Decimal('Infinity')])
+    def test_json_renderer_rejects_non_finite(self, value):
+        """Test that non-finite numbers raise like DRF instead of becoming null"""
+        data = {'results': [{'rank': value}]}
+        with pytest.raises(ValueError) as drf_error:
+            JSONRenderer().render(data)
+        with pytest.raises(ValueError) as fast_error:
+            FastJSONRenderer().render(data)
+        
+        assert str(fast_error.value) == str(drf_error.value)
+    
+    def test_json_renderer_indent(self):
+        """Test that indented output is still supported"""
+        data = {'a': [1, 2]}
+        assert FastJSONRenderer().render(data, 'application/json; indent=2') == JSONRenderer().render(data, 'application/json; indent=2')
+    
+    @pytest.mark.parametrize('body', [
+        b'{"title": "\\u00dcn\\u00efc\\u00f6d\\u00e9", "copies": 3, "nested": [1.5, null, false]}',
+        b'{"huge": 1180591620717411303424}',
+        b'{"broken": ',
+        b'{"nan": NaN}',
+    ])
+    def test_json_parser_matches_drf(self, body):
+        """Test that FastJSONParser accepts and rejects the same documents as DRF's JSONParser"""
+        def parse(parser):
+            try:
+                return parser.parse(io.BytesIO(body))
+            except ParseError as exc:
+                return str(exc)
+        
+        assert parse(FastJSONParser()) == parse(JSONParser())
+    
+    @pytest.mark.django_db
+    def test_book_list_as_msgpack(self, api_client, sample_book):
+        """Test that the book list can be requested as MessagePack"""
+        url = reverse('books:book_list')
+        response = api_client.get(url, HTTP_ACCEPT='application/msgpack')
+        
+        assert response['Content-Type'] == 'application/msgpack'
+        data = msgpack.unpackb(response.content)
+        assert data['results'][0]['title'] == 'Sample Book'
+        assert data == json.loads(api_client.get(url).content)
+    
+    @pytest.mark.django_db
+    def test_etag_differs_per_format(self, api_client, sample_book):
+        """Test that JSON and MessagePack representations get distinct ETags"""
+        url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        json_etag = api_client.get(url)['ETag']
+        msgpack_etag = api_client.get(url, HTTP_ACCEPT='application/msgpack')['ETag']
+        
+        assert json_etag != msgpack_etag
+        response = api_client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=json_etag)
+        assert response.status_code == status.HTTP_200_OK
+    
+    @pytest.mark.django_db
+    def test_create_book_from_msgpack(self, api_client, admin_user, book_data):
+        """Test that MessagePack request bodies are parsed"""
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post(
+            reverse('books:book_create'),
+            msgpack.packb(book_data),
+            content_type='application/msgpack'
+        )
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Book.objects.filter(isbn=book_data['isbn']).exists()
+
+
+class TestSharedThrottle:
+    """Tests for the throttle counters shared between workers"""
+    
+    @pytest.mark.django_db
+    def test_anonymous_limit(self, api_client, monkeypatch):
+        """Test that anonymous clients are throttled once the rate is used up"""
+        monkeypatch.setattr(AnonRateThrottle, 'THROTTLE_RATES', {'anon': '2/hour'})
+        url = reverse('books:book_list')
+        
+        assert api_client.get(url).status_code == status.HTTP_200_OK
+        assert api_client.get(url).status_code == status.HTTP_200_OK
+        response = api_client.get(url)
+        
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert 0 < int(response['Retry-After']) <= 3600
+    
+    def test_counters_shared_between_stores(self):
+        """Test that separate stores on the same file count against one limit"""
+        first, second = ThrottleStore(), ThrottleStore()
+        
+        assert first.hit('client', 2, 60, now=120) is None
+        assert second.hit('client', 2, 60, now=130) is None
+        assert first.hit('client', 2, 60, now=140) == 40
+    
+    def test_window_resets(self):
+        """Test that denied requests are not counted and a new window starts from zero"""
+        store = ThrottleStore()
+        store.hit('client', 1, 60, now=0)
+        for _ in range(3):
+            assert store.hit('client', 1, 60, now=30) == 30
+        
+        assert store.hit('client', 1, 60, now=60) is None
+        assert store.hit('other', 1, 60, now=61) is None
+
+
 @pytest.mark.django_db
 class TestBookModel:
     """Tests for Book model"""
@@ -314,6 +1376,43 @@ class TestBookModel:
         assert result is True
         assert sample_book.available_copies == initial_available + 1
     
+    def test_borrow_stale_instance_cannot_oversell(self, db):
+        """Test that a borrow based on a stale read fails once copies run out"""
+        Book.objects.create(
+            title='Last Copy', author='Author', isbn='9783333333333',
+            page_count=100, total_copies=1, available_copies=1
+        )
+        first = Book.objects.get(isbn='9783333333333')
+        second = Book.objects.get(isbn='9783333333333')
+        
+        assert first.borrow() is True
+        assert second.borrow() is False
+        second.refresh_from_db()
+        assert second.available_copies == 0
+    
+    def test_return_book_never_exceeds_total(self, sample_book):
+        """Test that returning a book with all copies on the shelf is rejected"""
+        assert sample_book.return_book() is False
+        sample_book.refresh_from_db()
+        assert sample_book.available_copies == sample_book.total_copies
+    
+    def test_borrow_only_updates_availability(self, sample_book, django_assert_num_queries):
+        """Test that borrowing issues one conditional UPDATE plus a reload"""
+        with django_assert_num_queries(2) as captured:
+            sample_book.borrow()
+        
+        update = captured.captured_queries[0]['sql']
+        assert update.startswith('UPDATE')
+        assert '"title"' not in update
+    
+    def test_available_copies_check_constraint(self, sample_book):
+        """Test that the database rejects available copies above total copies"""
+        from django.db import IntegrityError, transaction
+        
+        sample_book.available_copies = sample_book.total_copies + 1
+        with pytest.raises(IntegrityError), transaction.atomic():
+            sample_book.save()
+    
     def test_available_copies_validation(self):
         """Test that available copies can't exceed total copies"""
         from django.core.exceptions import ValidationError
@@ -329,3 +1428,39 @@ class TestBookModel:
         
         with pytest.raises(ValidationError):
             book.clean()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentBorrow:
+    """Stress test for concurrent borrowing of the same title"""
+    
+    def test_concurrent_borrow_does_not_oversell(self):
+        """Test that many concurrent borrows take exactly the available copies"""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import OperationalError, connection, transaction
+        
+        book = Book.objects.create(
+            title='Popular Book', author='Author', isbn='9784444444444',
+            page_count=100, total_copies=5, available_copies=5
+        )
+        
+        def borrow(_):
+            try:
+                while True:
+                    try:
+                        with transaction.atomic():
+                            return Book.objects.get(pk=book.pk).borrow()
+                    except OperationalError:
+                        # The shared-cache SQLite test database reports lock
+                        # contention instead of waiting; the attempt rolled back
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(borrow, range(40)))
+        
+        book.refresh_from_db()
+        assert results.count(True) == 5
+        assert book.available_copies == 0
@@ -1,8 +1,8 @@
 from django.urls import path
 from .views import (
-    BookListView, BookDetailView, BookCreateView,
+    BookListView, BookExportView, BookDetailView, BookCreateView, BookImportView,
     BookUpdateView, BookDeleteView, BookManageView,
-    book_stats, book_categories
+    book_stats, book_categories, book_changes
 )
 
 app_name = 'books'
@@ -13,9 +13,12 @@ urlpatterns = [
     path('<int:pk>/', BookDetailView.as_view(), name='book_detail'),
     path('stats/', book_stats, name='book_stats'),
     path('categories/', book_categories, name='book_categories'),
+    path('changes/', book_changes, name='book_changes'),
+    path('export/<str:export_format>/', BookExportView.as_view(), name='book_export'),
     
     # Admin endpoints
     path('create/', BookCreateView.as_view(), name='book_create'),
+    path('import/', BookImportView.as_view(), name='book_import'),
     path('<int:pk>/update/', BookUpdateView.as_view(), name='book_update'),
     path('<int:pk>/delete/', BookDeleteView.as_view(), name='book_delete'),
     path('<int:pk>/manage/', BookManageView.as_view(), name='book_manage'),
@@ -1,22 +1,46 @@
 from rest_framework import generics, permissions, filters, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db.models import Count, Q
+from django.utils.cache import add_never_cache_headers
 from django_filters.rest_framework import DjangoFilterBackend
+from .facets import get_facets, requested_facets
+from .importer import ImportFormatError, detect_format, import_books
 from .models import Book
-from .serializers import BookSerializer, BookListSerializer, BookDetailSerializer
+from .response_cache import CatalogCacheMixin, cache_catalog_response, cached_catalog_value
+from .serializers import (
+    BookSerializer, BookListSerializer, BookListValuesSerializer, BookDetailSerializer,
+    DeletedBookSerializer
+)
+from .search import BookSearchFilter
+from .stats import get_book_stats
+from .sync import get_changes
 from accounts.permissions import IsAdminUser
+from library_management.conditional import ConditionalGetMixin
+from library_management.export import StreamingExportMixin
+from library_management.fastpath import ValuesListMixin
+from library_management.pagination import KeysetPagination
+from library_management.sparse import SparseFieldsetViewMixin
 
 
-class BookListView(generics.ListAPIView):
+class BookListView(ConditionalGetMixin, CatalogCacheMixin, SparseFieldsetViewMixin, ValuesListMixin, generics.ListAPIView):
     """
     API endpoint to list all books.
-    Supports filtering, searching, and pagination.
+    Supports filtering, full-text searching, and pagination.
+    Search results are ranked by relevance unless an ordering is given.
+    Pass ?pagination=cursor for keyset pagination and ?facets=true for facet counts,
+    and ?fields= or ?exclude= to prune fields.
+    Supports conditional requests with If-None-Match.
     Anonymous users can view.
     """
     queryset = Book.objects.all()
     serializer_class = BookListSerializer
+    values_serializer_class = BookListValuesSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, BookSearchFilter]
     filterset_fields = ['category', 'author', 'language']
     search_fields = ['title', 'author', 'isbn', 'description']
     ordering_fields = ['title', 'author', 'publication_date', 'created_at']
@@ -36,17 +60,63 @@ class BookListView(generics.ListAPIView):
             elif available.lower() == 'false':
                 queryset = queryset.filter(available_copies=0)
         
-        return queryset
+        return self.sparse_queryset(queryset)
+    
+    def get_validators(self):
+        return cached_catalog_value(self.request, None, 'validators', super().get_validators)
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Optionally add facet counts for the filtered books with
+        ?facets=true or ?facets=category,language,author,available.
+        """
+        response = super().list(request, *args, **kwargs)
+        facets = requested_facets(request.query_params.get('facets'))
+        if facets:
+            queryset = self.filter_queryset(self.get_queryset())
+            response.data['facets'] = get_facets(queryset, request.query_params, facets)
+        return response
+
+
+class BookExportView(StreamingExportMixin, BookListView):
+    """
+    API endpoint to export the whole book catalog as CSV or NDJSON.
+    Accepts the same filter, search and ordering parameters as the book list.
+    Anonymous users can export.
+    """
+    export_serializer_class = BookSerializer
+    export_filename = 'books'
 
 
-class BookDetailView(generics.RetrieveAPIView):
+class BookDetailView(ConditionalGetMixin, CatalogCacheMixin, SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """
     API endpoint to retrieve a single book's details.
+    Supports conditional requests with If-None-Match and If-Modified-Since,
+    and ?fields= or ?exclude= to prune fields.
     Anonymous users can view.
     """
-    queryset = Book.objects.all()
     serializer_class = BookDetailSerializer
     permission_classes = [permissions.AllowAny]
+    sparse_always_load = ('updated_at',)
+    
+    def get_queryset(self):
+        """
+        Only count active loans when the count is part of the response.
+        """
+        queryset = Book.objects.all()
+        if self.selects('active_loans_count'):
+            queryset = queryset.annotate(
+                active_loans_count=Count('loans', filter=Q(loans__returned_at__isnull=True))
+            )
+        return self.sparse_queryset(queryset)
+    
+    def get_conditional_fields(self):
+        if self.selects('active_loans_count'):
+            return ('updated_at', 'active_loans_count')
+        return ('updated_at',)
+    
+    def get_validators(self):
+        return cached_catalog_value(self.request, self.kwargs['pk'], 'validators', super().get_validators)
 
 
 class BookCreateView(generics.CreateAPIView):
@@ -59,6 +129,33 @@ class BookCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
 
 
+class BookImportView(APIView):
+    """
+    API endpoint to bulk import books from a CSV or JSON Lines upload.
+    Rows are upserted on ISBN; invalid rows are reported and skipped.
+    Only admins can import books.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    parser_classes = [MultiPartParser]
+    
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({
+                'error': 'No file uploaded'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        fmt = request.data.get('format') or detect_format(upload.name)
+        try:
+            result = import_books(upload, fmt)
+        except ImportFormatError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+
 class BookUpdateView(generics.UpdateAPIView):
     """
     API endpoint to update a book.
@@ -101,21 +198,16 @@ class BookManageView(generics.RetrieveUpdateDestroyAPIView):
 def book_stats(request):
     """
     Get overall statistics about books in the library.
+    Served from the stats cache; 'as_of' marks when the numbers were last refreshed.
     """
-    stats = {
-        'total_books': Book.objects.count(),
-        'available_books': Book.objects.filter(available_copies__gt=0).count(),
-        'borrowed_books': Book.objects.filter(available_copies=0).count(),
-        'total_copies': sum(book.total_copies for book in Book.objects.all()),
-        'available_copies': sum(book.available_copies for book in Book.objects.all()),
-        'categories': Book.objects.values_list('category', flat=True).distinct().count(),
-    }
+    stats = get_book_stats()
     
     return Response(stats, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cache_catalog_response
 def book_categories(request):
     """
     Get list of all book categories.
@@ -126,3 +218,34 @@ def book_categories(request):
     return Response({
         'categories': sorted(categories)
     }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@cache_catalog_response
+def book_changes(request):
+    """
+    Get books created, updated or deleted since a sync cursor.
+    Omit ?cursor= for a full sync, then pass the returned cursor on every poll
+    and keep polling while has_more is true. Apply 'deleted' before 'books'.
+    ?limit= caps the number of books and of deletions per response.
+    Changes are returned once they are BOOK_SYNC_SAFETY_WINDOW seconds old,
+    so that writes committing late are never skipped by a cursor.
+    """
+    try:
+        limit = int(request.query_params['limit'])
+    except (KeyError, ValueError):
+        limit = None
+    
+    changes = get_changes(request.query_params.get('cursor'), limit)
+    
+    response = Response({
+        'books': BookSerializer(changes['books'], many=True).data,
+        'deleted': DeletedBookSerializer(changes['deleted'], many=True).data,
+        'has_more': changes['has_more'],
+        'cursor': changes['cursor'],
+    }, status=status.HTTP_200_OK)
+    if changes['pending']:
+        # Held-back changes will show up in this response without any write
+        add_never_cache_headers(response)
+    return response
@@ -4,6 +4,7 @@ Contains fixtures and configurations available to all tests.
 """
 import pytest
 from django.conf import settings
+from django.core.cache import cache
 
 
 @pytest.fixture(scope='session')
@@ -15,7 +16,61 @@ def django_db_setup():
     }
 
 
+# Migrations whose raw SQL creates schema that models alone don't describe
+RAW_SQL_MIGRATIONS = (
+    ('books', '0005_book_search'),
+    ('loans', '0008_loans_history_view'),
+)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def raw_sql_schema(django_db_setup, django_db_blocker):
+    """Run the RAW_SQL_MIGRATIONS that --nomigrations skipped"""
+    from importlib import import_module
+    from django.db import connection
+    from django.db.migrations.recorder import MigrationRecorder
+    
+    with django_db_blocker.unblock():
+        applied = MigrationRecorder(connection).applied_migrations()
+        with connection.schema_editor() as schema_editor:
+            for app_label, name in RAW_SQL_MIGRATIONS:
+                if (app_label, name) in applied:
+                    continue
+                migration = import_module(f'{app_label}.migrations.{name}').Migration
+                for operation in migration.operations:
+                    operation.database_forwards(app_label, schema_editor, None, None)
+
+
 @pytest.fixture(autouse=True)
 def enable_db_access_for_all_tests(db):
     """Enable database access for all tests"""
     pass
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache so cached data never leaks between tests"""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_token_blacklist():
+    """Rebuild the per-process token blacklist filter from each test's database"""
+    from accounts.blacklist import token_blacklist
+    token_blacklist.reset()
+
+
+@pytest.fixture(autouse=True)
+def throttle_store(tmp_path, settings):
+    """Give every test its own, empty throttle counters"""
+    settings.THROTTLE_STORE_PATH = str(tmp_path / 'throttle.sqlite3')
+
+
+@pytest.fixture(autouse=True)
+def clear_last_login_buffer():
+    """Never carry buffered last_login times over to another test's database"""
+    from accounts.last_login import last_login_buffer
+    yield
+    last_login_buffer.clear()
@@ -0,0 +1,87 @@
+"""
+Conditional GET (ETag / Last-Modified) for list and detail views.
+
+Validators are computed from a cheap probe instead of the rendered body: a
+MAX(updated_at), COUNT aggregate over the filtered queryset for lists, and the
+loaded object's timestamps for details. A matching If-None-Match (or
+If-Modified-Since on details) returns 304 before anything is serialized.
+Details whose conditional fields include values computed from the clock,
+such as a loan's is_overdue, get no Last-Modified and ignore If-Modified-Since:
+those values change without any timestamp moving, so only the ETag can tell.
+"""
+import hashlib
+from datetime import datetime
+from operator import attrgetter
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+
+
+class ConditionalGetMixin:
+    """
+    Mixin for generic list and retrieve views that adds strong ETag and
+    Last-Modified headers and answers conditional requests with 304.
+    """
+    last_modified_field = 'updated_at'
+    # Attributes of the object that determine a detail representation
+    conditional_fields = ('updated_at',)
+    # Conditional fields that change with the time of day rather than on a write
+    clock_dependent_fields = ()
+    
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        # A deletion does not move MAX(updated_at), so lists only honour If-None-Match
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified if self.is_detail() else None,
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+    
+    def is_detail(self):
+        return (self.lookup_url_kwarg or self.lookup_field) in self.kwargs
+    
+    def get_object(self):
+        # The object loaded for the validators is reused to render the response
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+    
+    def get_conditional_fields(self):
+        return self.conditional_fields
+    
+    def get_conditional_state(self):
+        """Values that change whenever the representation changes"""
+        if self.is_detail():
+            obj = self.get_object()
+            return tuple(attrgetter(field)(obj) for field in self.get_conditional_fields())
+        probe = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            last_modified=Max(self.last_modified_field),
+            count=Count('pk'),
+        )
+        return probe['last_modified'], probe['count']
+    
+    def get_validators(self):
+        """Return (etag, last_modified timestamp) for the request"""
+        state = self.get_conditional_state()
+        request = self.request
+        params = sorted(
+            (key, value)
+            for key in request.query_params
+            for value in request.query_params.getlist(key)
+        )
+        media_type = getattr(request, 'accepted_media_type', None)
+        digest = hashlib.sha1(repr((request.path, params, media_type, state)).encode()).hexdigest()
+        
+        if self.is_detail() and set(self.get_conditional_fields()) & set(self.clock_dependent_fields):
+            return f'"{digest}"', None
+        timestamps = [value for value in state if isinstance(value, datetime)]
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        return f'"{digest}"', last_modified
@@ -0,0 +1,66 @@
+"""
+Streaming CSV / NDJSON export for list views.
+"""
+import csv
+from django.http import Http404, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+    
+    def write(self, value):
+        return value
+
+
+class StreamingExportMixin:
+    """
+    Mixin for list views that streams every filtered row as CSV or NDJSON.
+    
+    Rows are read from a server-side cursor with iterator(chunk_size=...) and
+    written as they are produced, so memory use does not grow with the number
+    of rows. The view's own filter backends are applied; pagination is not.
+    """
+    export_formats = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+    export_serializer_class = None
+    export_chunk_size = 2000
+    export_filename = 'export'
+    
+    def get_sparse_fieldset(self):
+        # Exports always contain every column of the export serializer
+        return None, None
+    
+    def get(self, request, export_format, *args, **kwargs):
+        if export_format not in self.export_formats:
+            raise Http404(f"Unknown export format '{export_format}'")
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.iter_export_rows(queryset)
+        if export_format == 'csv':
+            content = self.render_csv(rows)
+        else:
+            content = self.render_ndjson(rows)
+        
+        response = StreamingHttpResponse(content, content_type=self.export_formats[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{self.export_filename}.{export_format}"'
+        return response
+    
+    def iter_export_rows(self, queryset):
+        # A single serializer instance renders every row
+        serializer = self.export_serializer_class(context=self.get_serializer_context())
+        for obj in queryset.iterator(chunk_size=self.export_chunk_size):
+            yield serializer.to_representation(obj)
+    
+    def render_ndjson(self, rows):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        for row in rows:
+            yield encoder.encode(row) + '\n'
+    
+    def render_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.export_serializer_class.Meta.fields)
+        for row in rows:
+            yield writer.writerow(row.values())
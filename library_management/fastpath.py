@@ -0,0 +1,117 @@
+"""
+Fast read-only rendering from queryset.values() rows.
+
+A ValuesSerializer reproduces the output of an existing ModelSerializer
+without building model instances or running the serializer per row: the
+field plan is resolved once, and each row is rendered with the fields'
+own to_representation, so formatting stays identical.
+"""
+from django.conf import settings
+from rest_framework.response import Response
+
+FIELD, COMPUTED, NESTED = 'field', 'computed', 'nested'
+
+
+class ValuesSerializer:
+    """
+    Render rows of queryset.values() exactly like `serializer_class`, or like
+    a given (possibly pruned) instance of it.
+    
+    Model properties have no column and are declared in `computed_fields`
+    as callables taking a lookup function for the row's own values. Nested
+    serializers are declared in `nested_fields` with their ValuesSerializer.
+    `column_aliases` maps a dotted field path to the column that holds it,
+    e.g. an annotation on the outer queryset.
+    """
+    serializer_class = None
+    computed_fields = {}
+    nested_fields = {}
+    column_aliases = {}
+    
+    def __init__(self, serializer=None, prefix='', column_aliases=None):
+        if serializer is None:
+            serializer = self.serializer_class()
+        self.prefix = prefix
+        aliases = dict(self.column_aliases, **(column_aliases or {}))
+        computed_sources = getattr(serializer, 'computed_field_sources', {})
+        self.columns = []
+        self.plan = []
+        
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in self.nested_fields:
+                child = self.nested_fields[name](
+                    serializer=field,
+                    prefix=f"{prefix}{field.source.replace('.', '__')}__",
+                    column_aliases={
+                        path[len(name) + 1:]: column
+                        for path, column in aliases.items()
+                        if path.startswith(f'{name}.')
+                    },
+                )
+                self.columns.extend(child.columns)
+                self.plan.append((name, NESTED, None, child.to_representation))
+            elif name in self.computed_fields:
+                self.columns.extend(prefix + column for column in computed_sources.get(name, ()))
+                self.plan.append((name, COMPUTED, None, self.computed_fields[name]))
+            else:
+                column = aliases.get(name) or prefix + field.source.replace('.', '__')
+                self.columns.append(column)
+                self.plan.append((name, FIELD, column, field.to_representation))
+    
+    def values(self, queryset, *extra):
+        """The queryset as values() rows with every column the plan reads"""
+        return queryset.values(*dict.fromkeys(self.columns + list(extra)))
+    
+    def to_representation(self, row):
+        prefix = self.prefix
+        
+        def value(name):
+            return row[prefix + name]
+        
+        data = {}
+        for name, kind, column, render in self.plan:
+            if kind == FIELD:
+                attribute = row[column]
+                data[name] = None if attribute is None else render(attribute)
+            elif kind == COMPUTED:
+                data[name] = render(value)
+            else:
+                data[name] = render(row)
+        return data
+    
+    def render(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class ValuesListMixin:
+    """
+    Mixin for list views that renders pages through `values_serializer_class`.
+    Disabled globally with USE_VALUES_SERIALIZERS = False.
+    """
+    values_serializer_class = None
+    
+    def get_values_serializer(self):
+        if self.values_serializer_class is None or not getattr(settings, 'USE_VALUES_SERIALIZERS', True):
+            return None
+        return self.values_serializer_class(serializer=self.get_serializer())
+    
+    def list(self, request, *args, **kwargs):
+        values_serializer = self.get_values_serializer()
+        if values_serializer is None:
+            return super().list(request, *args, **kwargs)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        # Keep the ordering columns so keyset pagination can read the last row
+        ordering = [
+            field.lstrip('-')
+            for field in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(field, str)
+        ]
+        rows = values_serializer.values(queryset, 'id', *ordering)
+        
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.render(page))
+        return Response(values_serializer.render(rows))
@@ -0,0 +1,193 @@
+"""
+Pagination classes shared by the API views.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset (cursor) mode.
+    
+    Passing ?pagination=cursor, or a ?cursor= taken from a previous response,
+    switches to keyset pagination: pages are fetched with a WHERE clause on
+    the current ordering plus `id` as a tie-breaker, so there is no COUNT(*)
+    and no OFFSET. With an index on the ordering fields and `id` (such as
+    Book's (title, id) and Loan's (borrowed_at, id)) every page is an index
+    range scan that costs the same regardless of depth.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+    
+    def use_keyset(self, request):
+        return (
+            self.cursor_query_param in request.query_params or
+            request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        
+        self.request = request
+        ordering = self.get_keyset_ordering(queryset)
+        queryset = queryset.order_by(*[self._order_by(queryset.model, field) for field in ordering])
+        
+        position = self.decode_cursor(request, ordering, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, position))
+        
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_position = None
+        if len(rows) > page_size:
+            last = page[-1]
+            self.next_position = [self._value(last, field) for field in ordering]
+        self.ordering = ordering
+        return page
+    
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data),
+        ]))
+    
+    def get_paginated_response_schema(self, schema):
+        if not getattr(self, 'keyset', False):
+            return super().get_paginated_response_schema(schema)
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+    
+    def get_keyset_ordering(self, queryset):
+        """
+        Ordering of the filtered queryset, with `id` appended as a tie-breaker.
+        Each entry is a field or annotation name, optionally prefixed with '-'.
+        """
+        ordering = [
+            field for field in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(field, str)
+        ]
+        names = {field.lstrip('-') for field in ordering}
+        if not names & {'id', 'pk'}:
+            # Same direction as the last field, so a (field, id) index can be scanned in one direction
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return ordering
+    
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+    
+    def encode_cursor(self, position):
+        payload = json.dumps({'o': self.ordering, 'p': position}, separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode()).decode()
+    
+    def decode_cursor(self, request, ordering, model):
+        """
+        Position encoded in the cursor, with each value converted by its
+        ordering field; raises NotFound for a malformed or tampered cursor.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()))
+            position = payload['p']
+            valid = payload['o'] == ordering and len(position) == len(ordering)
+            if valid:
+                position = [
+                    self._to_python(model, field.lstrip('-'), value)
+                    for field, value in zip(ordering, position)
+                ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            valid = False
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+    
+    @staticmethod
+    def _field(model, name):
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+    
+    def _nullable(self, model, name):
+        field = self._field(model, name)
+        return field is not None and field.null
+    
+    def _to_python(self, model, name, value):
+        field = self._field(model, name)
+        if value is None:
+            if field is not None and not field.null:
+                raise ValidationError('Cursor value must not be null')
+            return None
+        if isinstance(value, (list, dict)):
+            raise ValidationError('Cursor values must be scalars')
+        if field is None:
+            # Annotations such as the search rank are compared as given
+            if not isinstance(value, (int, float, str)):
+                raise ValidationError('Unsupported cursor value')
+            return value
+        return field.to_python(value)
+    
+    def _order_by(self, model, field):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        if not self._nullable(model, name):
+            return field
+        # Put NULLs last in both directions so the keyset comparison is portable
+        return F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_last=True)
+    
+    def _after(self, model, ordering, position):
+        """Build the condition selecting rows that sort after `position`"""
+        condition = None
+        for field, value in reversed(list(zip(ordering, position))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            
+            if value is None:
+                # NULLs sort last, so only later rows within the NULL group follow
+                condition = Q(**{f'{name}__isnull': True}) & condition
+                continue
+            
+            after = Q(**{f'{name}__{lookup}': value})
+            if self._nullable(model, name):
+                after |= Q(**{f'{name}__isnull': True})
+            if condition is not None:
+                after |= Q(**{name: value}) & condition
+            condition = after
+        return condition
+    
+    @staticmethod
+    def _value(obj, field):
+        # Pages may hold model instances or values() rows
+        name = field.lstrip('-')
+        value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
@@ -0,0 +1,117 @@
+"""
+Response renderers.
+
+FastJSONRenderer produces the same JSON as DRF's JSONRenderer using orjson,
+and falls back to the stdlib encoder for anything orjson handles differently:
+floats, which orjson formats differently (1e16 instead of 1e+16) and turns
+into null when they are not finite where DRF raises, Decimals (converted to
+floats), non-string keys, integers beyond 64 bits and lone surrogates.
+MessagePackRenderer serves the same data as application/msgpack.
+"""
+from decimal import Decimal
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+# Dates, times and dataclasses go through encode_default like in DRF. Non-string
+# keys make orjson raise, leaving them (float keys included) to the stdlib encoder
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson is not None else 0
+)
+
+# DRF escapes these so the output is also valid JavaScript
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def encode_default(obj):
+    """Convert values JSON has no type for, exactly like DRF's JSONEncoder"""
+    return JSONEncoder().default(obj)
+
+
+# Types that render identically with orjson and the stdlib encoder
+PLAIN_TYPES = frozenset({str, int, bool, type(None)})
+
+
+def contains_float(data):
+    """Whether data holds a float or Decimal value at any depth"""
+    if isinstance(data, (float, Decimal)):
+        return True
+    # Iterative, and most containers are skipped after one set(map(type)) pass
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            values = obj.values()
+        elif isinstance(obj, (list, tuple)):
+            values = obj
+        else:
+            continue
+        if set(map(type, values)) <= PLAIN_TYPES:
+            continue
+        for value in values:
+            if type(value) in PLAIN_TYPES:
+                continue
+            if isinstance(value, (float, Decimal)):
+                return True
+            if isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+    return False
+
+
+def encode_default_without_floats(obj):
+    """encode_default, refusing conversions that produce floats (Decimal, numpy values)"""
+    value = encode_default(obj)
+    if contains_float(value):
+        raise TypeError(f'{type(obj).__name__} converts to a float')
+    return value
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer using orjson for compact, non-ASCII-escaped output.
+    Indented output and non-default JSON settings use the stdlib encoder.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact or
+            self.get_indent(accepted_media_type, renderer_context or {}) is not None or
+            contains_float(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        try:
+            ret = orjson.dumps(data, default=encode_default_without_floats, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. non-string keys, integers beyond 64 bits, lone surrogates or floats from encode_default
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renderer which serializes to MessagePack.
+    Values are converted like the JSON renderers, so both carry the same data.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
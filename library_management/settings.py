@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from decouple import config, Csv
 from datetime import timedelta
+from importlib.util import find_spec
+from django.core.exceptions import ImproperlyConfigured
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
     # Third-party apps
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'drf_yasg',
     'corsheaders',
     'django_filters',
@@ -130,6 +133,36 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# New passwords use PASSWORD_HASHER_PROFILE (pbkdf2 or argon2, which needs
+# argon2-cffi); hashes made with the other hashers are upgraded on login
+PASSWORD_HASHER_PROFILE = config('PASSWORD_HASHER_PROFILE', default='pbkdf2')
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'accounts.hashers.PBKDF2PasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+}
+if PASSWORD_HASHER_PROFILE not in PASSWORD_HASHER_PROFILES:
+    raise ImproperlyConfigured(f'Unknown PASSWORD_HASHER_PROFILE: {PASSWORD_HASHER_PROFILE}')
+if PASSWORD_HASHER_PROFILE == 'argon2' and find_spec('argon2') is None:
+    raise ImproperlyConfigured('PASSWORD_HASHER_PROFILE = argon2 requires the argon2-cffi package')
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE],
+    *(hasher for profile, hasher in PASSWORD_HASHER_PROFILES.items() if profile != PASSWORD_HASHER_PROFILE),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PBKDF2_ITERATIONS = config('PBKDF2_ITERATIONS', default=600000, cast=int)
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=102400, cast=int)  # KiB
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=8, cast=int)
+
+# Hashing threads per process, and calls allowed to wait for one before
+# logins are turned away with 503. Each running or waiting call holds a request
+# thread, so the two together must stay below gunicorn's --threads (4)
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=2, cast=int)
+PASSWORD_HASHING_QUEUE_SIZE = config('PASSWORD_HASHING_QUEUE_SIZE', default=0, cast=int)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -158,9 +191,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'accounts.User'
 
 # REST Framework settings
+# orjson-backed JSON by default; MessagePack when the msgpack package is installed
+API_RENDERER_CLASSES = [
+    'library_management.renderers.FastJSONRenderer',
+    'rest_framework.renderers.BrowsableAPIRenderer',
+]
+API_PARSER_CLASSES = [
+    'library_management.parsers.FastJSONParser',
+    'rest_framework.parsers.FormParser',
+    'rest_framework.parsers.MultiPartParser',
+]
+if find_spec('msgpack') is not None:
+    API_RENDERER_CLASSES.append('library_management.renderers.MessagePackRenderer')
+    API_PARSER_CLASSES.append('library_management.parsers.MessagePackParser')
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': API_RENDERER_CLASSES,
+    'DEFAULT_PARSER_CLASSES': API_PARSER_CLASSES,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -173,8 +222,8 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'library_management.throttling.AnonRateThrottle',
+        'library_management.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
@@ -182,13 +231,17 @@ REST_FRAMEWORK = {
     }
 }
 
+# SQLite file holding the throttle counters shared by the workers on a node
+THROTTLE_STORE_PATH = config('THROTTLE_STORE_PATH', default='') or None
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # Logins and refreshes go through accounts.last_login instead
+    'UPDATE_LAST_LOGIN': False,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -197,8 +250,71 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.tokens.TokenRefreshSerializer',
 }
 
+# Longest last_login may lag behind a login or token refresh (seconds, 0 = write immediately)
+LAST_LOGIN_FLUSH_INTERVAL = config('LAST_LOGIN_FLUSH_INTERVAL', default=5, cast=int)
+
+# Refresh token blacklist: tokens each worker's Bloom filter is sized for, and
+# the longest a worker goes without syncing it when the cache is not shared
+TOKEN_BLACKLIST_CAPACITY = config('TOKEN_BLACKLIST_CAPACITY', default=100000, cast=int)
+TOKEN_BLACKLIST_SYNC_INTERVAL = config('TOKEN_BLACKLIST_SYNC_INTERVAL', default=5, cast=int)
+
+# Authenticated users are restored from a cache entry kept this many seconds,
+# or, with JWT_STATELESS_USER, from claims in the token without any lookup
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+JWT_STATELESS_USER = config('JWT_STATELESS_USER', default=False, cast=bool)
+
+# Full-text search backend for the book catalog, matched to the database in use
+BOOK_SEARCH_BACKEND = (
+    'books.search.PostgresSearchBackend'
+    if config('USE_POSTGRES', default=False, cast=bool)
+    else 'books.search.SQLiteSearchBackend'
+)
+
+# Rows validated and written per batch by the bulk book import
+BOOK_IMPORT_BATCH_SIZE = config('BOOK_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+# Book list facet counts: values returned per facet and cache lifetime (seconds)
+BOOK_FACETS_LIMIT = config('BOOK_FACETS_LIMIT', default=50, cast=int)
+BOOK_FACETS_CACHE_TIMEOUT = config('BOOK_FACETS_CACHE_TIMEOUT', default=60, cast=int)
+
+# Catalog statistics cache (seconds)
+BOOK_STATS_CACHE_TIMEOUT = config('BOOK_STATS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Delta sync: books and deletions returned per response, default and maximum
+BOOK_SYNC_PAGE_SIZE = config('BOOK_SYNC_PAGE_SIZE', default=500, cast=int)
+BOOK_SYNC_MAX_PAGE_SIZE = config('BOOK_SYNC_MAX_PAGE_SIZE', default=1000, cast=int)
+# Delta sync: seconds a change waits before it is returned, longer than any write
+# transaction plus clock skew between servers, so late commits are not skipped
+BOOK_SYNC_SAFETY_WINDOW = config('BOOK_SYNC_SAFETY_WINDOW', default=10, cast=int)
+
+# Books accepted by one batch checkout request, and loans by one batch return
+LOAN_BATCH_MAX_SIZE = config('LOAN_BATCH_MAX_SIZE', default=100, cast=int)
+LOAN_BATCH_RETURN_MAX_SIZE = config('LOAN_BATCH_RETURN_MAX_SIZE', default=500, cast=int)
+
+# Returned loans older than this many days are moved to the archive table
+# by the archive_loans command, in chunks of LOAN_ARCHIVE_CHUNK_SIZE
+LOAN_ARCHIVE_AFTER_DAYS = config('LOAN_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+LOAN_ARCHIVE_CHUNK_SIZE = config('LOAN_ARCHIVE_CHUNK_SIZE', default=1000, cast=int)
+
+# Render opted-in list views from values() rows instead of model serializers
+USE_VALUES_SERIALIZERS = config('USE_VALUES_SERIALIZERS', default=True, cast=bool)
+
+# Cache backend. Local memory by default; point CACHE_BACKEND at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) when running
+# several workers so cache invalidations reach all of them.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Cached responses of the public catalog endpoints (seconds)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default=True, cast=bool)
 CORS_ALLOWED_ORIGINS = config(
@@ -0,0 +1,150 @@
+"""
+Sparse fieldsets: ?fields= and ?exclude= on read endpoints.
+
+Both take a comma separated list of field names; dotted names reach into
+nested serializers (`?fields=id,status,book.title`). Pruned fields are never
+evaluated, and views load only the columns the remaining fields read.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def parse_fieldset(value):
+    """Split a comma separated field list; None when the parameter is absent"""
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _split(names):
+    """Split dotted names into the top-level names and the names per nested field"""
+    top, nested = [], {}
+    for name in names:
+        head, _, rest = name.partition('.')
+        if rest:
+            nested.setdefault(head, []).append(rest)
+        else:
+            top.append(head)
+    return top, nested
+
+
+def _nested_serializer(field):
+    field = getattr(field, 'child', field)
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def prune_fields(serializer, fields=None, exclude=None):
+    """Drop the fields not selected by `fields` and those listed in `exclude`"""
+    if fields is not None:
+        top, nested = _split(fields)
+        keep = set(top) | set(nested)
+        for name in list(serializer.fields):
+            if name not in keep:
+                serializer.fields.pop(name)
+        for name, names in nested.items():
+            child = _nested_serializer(serializer.fields.get(name))
+            # A bare name selects the whole nested object
+            if child is not None and name not in top:
+                prune_fields(child, fields=names)
+    
+    if exclude:
+        top, nested = _split(exclude)
+        for name in top:
+            serializer.fields.pop(name, None)
+        for name, names in nested.items():
+            child = _nested_serializer(serializer.fields.get(name))
+            if child is not None:
+                prune_fields(child, exclude=names)
+
+
+def selected_columns(serializer, prefix=''):
+    """
+    Model columns read by the serializer's remaining fields, as only() paths.
+    Computed fields declare the columns they read in `computed_field_sources`.
+    """
+    model = serializer.Meta.model
+    computed = getattr(serializer, 'computed_field_sources', {})
+    columns = [prefix + model._meta.pk.name]
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        source = field.source.replace('.', '__')
+        child = _nested_serializer(field)
+        if child is not None:
+            columns.append(prefix + source)
+            columns.extend(selected_columns(child, f'{prefix}{source}__'))
+        elif name in computed:
+            columns.extend(prefix + column for column in computed[name])
+        else:
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete:
+                columns.append(prefix + source)
+    return list(dict.fromkeys(columns))
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin accepting `fields` and `exclude` keyword arguments.
+    """
+    # Model columns read by fields that are not model fields themselves
+    computed_field_sources = {}
+    
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None or exclude:
+            prune_fields(self, fields, exclude)
+
+
+class SparseFieldsetViewMixin:
+    """
+    View mixin that applies ?fields= and ?exclude= to GET responses.
+    Use sparse_queryset() to load only the columns the response needs.
+    """
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+    # Columns loaded even when not rendered, e.g. for ETags
+    sparse_always_load = ()
+    
+    def get_sparse_fieldset(self):
+        """Return (fields, exclude) from the query string; (None, None) if not sparse"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None, None
+        return (
+            parse_fieldset(request.query_params.get(self.fields_query_param)),
+            parse_fieldset(request.query_params.get(self.exclude_query_param)),
+        )
+    
+    def is_sparse(self):
+        fields, exclude = self.get_sparse_fieldset()
+        return fields is not None or bool(exclude)
+    
+    def selects(self, name):
+        """Whether the top-level field `name` is part of the response"""
+        fields, exclude = self.get_sparse_fieldset()
+        if exclude and name in exclude:
+            return False
+        if fields is None:
+            return True
+        return any(field == name or field.startswith(f'{name}.') for field in fields)
+    
+    def get_serializer(self, *args, **kwargs):
+        fields, exclude = self.get_sparse_fieldset()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if exclude:
+            kwargs.setdefault('exclude', exclude)
+        return super().get_serializer(*args, **kwargs)
+    
+    def sparse_queryset(self, queryset):
+        """Restrict the queryset to the columns read by the pruned serializer"""
+        if not self.is_sparse():
+            return queryset
+        columns = selected_columns(self.get_serializer())
+        return queryset.only(*columns, *self.get_sparse_always_load())
+    
+    def get_sparse_always_load(self):
+        return self.sparse_always_load
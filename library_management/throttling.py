@@ -0,0 +1,121 @@
+"""
+Request throttles with counters shared by every worker on the node.
+
+DRF's throttles keep a pickled list of request times per client in the
+default cache, which is private to each worker with LocMemCache. These keep
+one fixed-window counter per client in a small SQLite file instead
+(THROTTLE_STORE_PATH), so all workers on the node count against the same
+limit. Each request is a single upsert on the counter's primary key; denied
+requests are not counted, like in DRF. Windows are aligned to multiples of
+the rate's duration, so a daily limit resets at midnight UTC.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from django.conf import settings
+from rest_framework import throttling
+
+DEFAULT_STORE_PATH = os.path.join(tempfile.gettempdir(), 'library_management_throttle.sqlite3')
+# Seconds between sweeps of expired counters, per process
+PURGE_INTERVAL = 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS throttle_counters (
+    key TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (key, window)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS throttle_counters_expires_at ON throttle_counters (expires_at);
+'''
+
+# Counts the request only while the window is below the limit
+INCREMENT = '''
+INSERT INTO throttle_counters (key, window, count, expires_at) VALUES (?, ?, 1, ?)
+ON CONFLICT (key, window) DO UPDATE SET count = count + 1 WHERE count < ?
+'''
+
+
+class ThrottleStore:
+    """
+    Fixed-window counters in a SQLite file, with one connection per thread
+    and process.
+    """
+    
+    def __init__(self):
+        self.local = threading.local()
+        self.purged_at = 0
+    
+    @property
+    def path(self):
+        return getattr(settings, 'THROTTLE_STORE_PATH', None) or DEFAULT_STORE_PATH
+    
+    def _connection(self):
+        path = self.path
+        key = (os.getpid(), path)
+        if getattr(self.local, 'key', None) != key:
+            # autocommit; counters lost in a crash are harmless, so skip fsyncs
+            connection = sqlite3.connect(path, timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+            self.local.key = key
+        return self.local.connection
+    
+    def hit(self, key, limit, duration, now=None):
+        """
+        Count a request against the key's current window.
+        Returns the seconds left in the window if the limit is already reached, else None.
+        """
+        now = time.time() if now is None else now
+        window = int(now // duration)
+        window_end = (window + 1) * duration
+        connection = self._connection()
+        cursor = connection.execute(INCREMENT, (key, window, window_end, limit))
+        if now - self.purged_at >= PURGE_INTERVAL:
+            self.purged_at = now
+            connection.execute('DELETE FROM throttle_counters WHERE expires_at <= ?', (now,))
+        return None if cursor.rowcount else window_end - now
+    
+    def clear(self):
+        self._connection().execute('DELETE FROM throttle_counters')
+
+
+throttle_store = ThrottleStore()
+
+
+class SharedRateThrottleMixin:
+    """
+    Counts requests in throttle_store instead of a history list in the cache.
+    Goes with a SimpleRateThrottle subclass.
+    """
+    
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        
+        try:
+            self.remaining = throttle_store.hit(self.key, self.num_requests, self.duration)
+        except sqlite3.Error:
+            # An unavailable store must not take the API down with it
+            return True
+        return self.remaining is None
+    
+    def wait(self):
+        return self.remaining
+
+
+class AnonRateThrottle(SharedRateThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SharedRateThrottleMixin, throttling.UserRateThrottle):
+    pass
@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 from .models import Loan
+from .stats import summaries_follow
 
 
 @admin.register(Loan)
@@ -55,6 +58,8 @@ class LoanAdmin(admin.ModelAdmin):
     
     def mark_fines_paid(self, request, queryset):
         """Mark fines as paid for selected loans"""
-        count = queryset.update(fine_paid=True)
+        loan_ids = list(queryset.values_list('pk', flat=True))
+        with transaction.atomic(), summaries_follow(loan_ids):
+            count = Loan.objects.filter(pk__in=loan_ids).update(fine_paid=True, updated_at=timezone.now())
         self.message_user(request, f'Marked {count} fine(s) as paid.')
     mark_fines_paid.short_description = "Mark fines as paid"
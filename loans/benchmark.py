@@ -0,0 +1,134 @@
+"""
+Benchmark of the partial indexes on open loans.
+
+seed_loans() fills the tables with a loan history in which most loans have
+been returned, as in a library that has been lending for years. The
+benchmark_loan_indexes command times OPEN_LOAN_QUERIES on such data with and
+without the partial indexes, inside a transaction that it rolls back.
+"""
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from books.models import Book
+from .fines import overdue_loans
+from .models import Loan
+
+User = get_user_model()
+
+SEED_BATCH_SIZE = 5000
+LOANS_PER_USER = 50
+LOANS_PER_BOOK = 20
+
+OPEN_LOAN_INDEXES = ('loans_open_user_book_idx', 'loans_open_book_idx', 'loans_open_due_date_idx')
+
+# name: (queryset for a user id and book id, how it is evaluated, index it should use)
+OPEN_LOAN_QUERIES = {
+    'duplicate check': (
+        lambda user_id, book_id: Loan.objects.filter(user_id=user_id, book_id=book_id, returned_at__isnull=True),
+        'exists',
+        'loans_open_user_book_idx',
+    ),
+    'user active count': (
+        lambda user_id, book_id: Loan.objects.active().filter(user_id=user_id),
+        'count',
+        'loans_open_user_book_idx',
+    ),
+    'book active count': (
+        lambda user_id, book_id: Loan.objects.filter(book_id=book_id, returned_at__isnull=True),
+        'count',
+        'loans_open_book_idx',
+    ),
+    # The first chunk of calculate_overdue_fines
+    'overdue loan scan': (
+        lambda user_id, book_id: overdue_loans().order_by('pk').values_list('pk', flat=True)[:1000],
+        'list',
+        'loans_open_due_date_idx',
+    ),
+}
+
+
+def seed_loans(count, returned_ratio=0.95, seed=0):
+    """
+    Create `count` loans, with users and books to match; a `returned_ratio`
+    share of them returned, the open ones due within 60 days either side of now.
+    Returns the ids of the users and books created.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    run = uuid.uuid4().hex[:8]
+    
+    users = User.objects.bulk_create(
+        [
+            User(username=f'bench-{run}-{i}', email=f'bench-{run}-{i}@example.com', password='!')
+            for i in range(max(1, count // LOANS_PER_USER))
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    isbn_prefix = f'{int(run, 16) % 1000000:06d}'
+    books = Book.objects.bulk_create(
+        [
+            Book(title=f'Benchmark {i}', author=f'Author {i % 500}', isbn=f'{isbn_prefix}{i:07d}', page_count=100)
+            for i in range(max(1, count // LOANS_PER_BOOK))
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    user_ids = [user.pk for user in users]
+    book_ids = [book.pk for book in books]
+    
+    for start in range(0, count, SEED_BATCH_SIZE):
+        loans = []
+        for _ in range(min(SEED_BATCH_SIZE, count - start)):
+            due_date = now + timedelta(days=rng.randint(-60, 60))
+            returned = rng.random() < returned_ratio
+            if returned:
+                status = 'returned'
+            else:
+                status = 'overdue' if due_date < now else 'active'
+            loans.append(Loan(
+                user_id=rng.choice(user_ids),
+                book_id=rng.choice(book_ids),
+                due_date=due_date,
+                returned_at=due_date - timedelta(days=rng.randint(0, 14)) if returned else None,
+                status=status,
+            ))
+        # bulk_create sends no signals, so loan summaries are not maintained for these
+        Loan.objects.bulk_create(loans)
+    return user_ids, book_ids
+
+
+def analyze():
+    """Refresh the planner statistics; SQLite and PostgreSQL both take a bare ANALYZE"""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def drop_open_loan_indexes():
+    with connection.cursor() as cursor:
+        for name in OPEN_LOAN_INDEXES:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+
+
+def evaluate(queryset, method):
+    if method == 'list':
+        return list(queryset)
+    return getattr(queryset, method)()
+
+
+def time_queries(user_ids, book_ids, repeat=20, seed=0):
+    """Median time in seconds of each of OPEN_LOAN_QUERIES, over random users and books"""
+    rng = random.Random(seed)
+    timings = {}
+    for name, (build, method, index) in OPEN_LOAN_QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            queryset = build(rng.choice(user_ids), rng.choice(book_ids))
+            started = time.perf_counter()
+            evaluate(queryset, method)
+            samples.append(time.perf_counter() - started)
+        timings[name] = statistics.median(samples)
+    return timings
@@ -0,0 +1,210 @@
+"""
+Batch circulation: borrowing and returning many books in one request.
+
+Rows are locked in primary key order, so concurrent batches cannot deadlock,
+and every check runs once for the whole batch. Checkouts take the copies with
+a single UPDATE and write the loans with one bulk INSERT; returns close the
+loans and give the copies back with a few grouped UPDATEs.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+from books.models import Book
+from books.response_cache import invalidate_catalog
+from books.stats import apply_copies_change
+from .fines import DEFAULT_DAILY_RATE, DaysOverdue
+from .models import Loan
+from .stats import SummaryChanges, loan_state
+
+DEFAULT_LOAN_DAYS = 14
+
+
+def _failed(book_id, error):
+    return {'book': book_id, 'status': 'failed', 'loan': None, 'error': error}
+
+
+def _return_failed(loan_id, error):
+    return {'id': loan_id, 'status': 'failed', 'loan': None, 'fine': None, 'error': error}
+
+
+def checkout_books(user, book_ids, due_date=None, notes=None):
+    """
+    Borrow each of the books for the user.
+    Returns one outcome per requested id, in request order, with the created
+    loan or the reason the book could not be borrowed.
+    """
+    now = timezone.now()
+    due_date = due_date or now + timedelta(days=DEFAULT_LOAN_DAYS)
+    
+    with transaction.atomic():
+        books = {
+            book.pk: book
+            for book in Book.objects.select_for_update().filter(pk__in=set(book_ids)).order_by('pk')
+        }
+        on_loan = set(
+            Loan.objects.active()
+            .filter(user=user, book_id__in=list(books))
+            .values_list('book_id', flat=True)
+        )
+        
+        outcomes = []
+        seen = set()
+        for book_id in book_ids:
+            book = books.get(book_id)
+            if book is None:
+                outcomes.append(_failed(book_id, 'Book not found'))
+            elif book_id in seen:
+                outcomes.append(_failed(book_id, 'This book is listed more than once'))
+            elif book_id in on_loan:
+                outcomes.append(_failed(book_id, 'You already have this book on loan'))
+            elif not book.is_available:
+                outcomes.append(_failed(book_id, 'This book is not available for borrowing'))
+            else:
+                outcomes.append({
+                    'book': book_id,
+                    'status': 'borrowed',
+                    'loan': Loan(user=user, book=book, due_date=due_date, notes=notes),
+                    'error': None,
+                })
+            seen.add(book_id)
+        
+        loans = [outcome['loan'] for outcome in outcomes if outcome['loan'] is not None]
+        if not loans:
+            return outcomes
+        
+        borrowed_ids = [loan.book_id for loan in loans]
+        # The rows are locked and each book is borrowed at most once, so every row is updated
+        Book.objects.filter(pk__in=borrowed_ids).update(
+            available_copies=F('available_copies') - 1,
+            updated_at=now,
+        )
+        Loan.objects.bulk_create(loans)
+        changes = SummaryChanges()
+        changes.add_new_loans(user.pk, len(loans))
+        changes.commit()
+    
+    for loan in loans:
+        book = loan.book
+        book.available_copies -= 1
+        book.updated_at = now
+        apply_copies_change(book.available_copies + 1, book.available_copies)
+        book._remember_counts()
+    # bulk_create sends no post_save signals
+    invalidate_catalog(borrowed_ids)
+    return outcomes
+
+
+def return_loans(loan_ids, notes=None, daily_rate=DEFAULT_DAILY_RATE):
+    """
+    Return each of the loans, charging the daily rate for every full day overdue.
+    Returns one outcome per requested id, in request order, with the returned
+    loan and its fine or the reason it could not be returned.
+    """
+    now = timezone.now()
+    daily_rate = Decimal(str(daily_rate))
+    
+    with transaction.atomic():
+        loans = {
+            loan.pk: loan
+            for loan in Loan.objects.select_for_update(of=('self',))
+            .select_related('user')
+            .filter(pk__in=set(loan_ids))
+            .order_by('pk')
+        }
+        
+        outcomes = []
+        returning = {}
+        for loan_id in loan_ids:
+            loan = loans.get(loan_id)
+            if loan is None:
+                outcomes.append(_return_failed(loan_id, 'Loan not found'))
+            elif loan_id in returning:
+                outcomes.append(_return_failed(loan_id, 'This loan is listed more than once'))
+            elif loan.returned_at:
+                outcomes.append(_return_failed(loan_id, 'This book has already been returned'))
+            else:
+                returning[loan_id] = loan
+                outcomes.append({'id': loan_id, 'status': 'returned', 'loan': loan, 'fine': None, 'error': None})
+        
+        if not returning:
+            return outcomes
+        
+        overdue_ids = {loan.pk for loan in returning.values() if loan.due_date < now}
+        on_time_ids = [loan.pk for loan in returning.values() if loan.due_date >= now]
+        # The loans are locked, so their loaded state is the stored one
+        changes = SummaryChanges()
+        for loan in returning.values():
+            changes.remove(loan_state(loan))
+            changes.add({
+                **loan_state(loan),
+                'returned_at': now,
+                'status': 'overdue' if loan.pk in overdue_ids else 'returned',
+                'fine_amount': (now - loan.due_date).days * daily_rate if loan.pk in overdue_ids else loan.fine_amount,
+            })
+        changes.commit()
+        changes = {'returned_at': now, 'updated_at': now}
+        if notes:
+            changes['notes'] = notes
+        if on_time_ids:
+            Loan.objects.filter(pk__in=on_time_ids).update(status='returned', **changes)
+        if overdue_ids:
+            Loan.objects.filter(pk__in=list(overdue_ids)).update(
+                status='overdue',
+                fine_amount=DaysOverdue('due_date', now) * Value(daily_rate),
+                **changes
+            )
+        
+        # One UPDATE per distinct number of copies returned to a book, never exceeding the total
+        returned_copies = Counter(loan.book_id for loan in returning.values())
+        books = {
+            book.pk: book
+            for book in Book.objects.select_for_update().filter(pk__in=list(returned_copies)).order_by('pk')
+        }
+        books_by_copies = defaultdict(list)
+        for book_id, copies in returned_copies.items():
+            books_by_copies[copies].append(book_id)
+        for copies, book_ids in books_by_copies.items():
+            Book.objects.filter(pk__in=book_ids).update(
+                available_copies=Least(F('available_copies') + copies, F('total_copies')),
+                updated_at=now,
+            )
+    
+    for book_id, copies in returned_copies.items():
+        book = books[book_id]
+        previous = book.available_copies
+        book.available_copies = min(previous + copies, book.total_copies)
+        book.updated_at = now
+        apply_copies_change(previous, book.available_copies)
+        book._remember_counts()
+    
+    active_counts = dict(
+        Loan.objects.active()
+        .filter(user_id__in={loan.user_id for loan in returning.values()})
+        .order_by()
+        .values_list('user')
+        .annotate(count=Count('id'))
+    )
+    for outcome in outcomes:
+        loan = outcome['loan']
+        if loan is None:
+            continue
+        if loan.pk in overdue_ids:
+            loan.status = 'overdue'
+            loan.fine_amount = (now - loan.due_date).days * daily_rate
+        else:
+            loan.status = 'returned'
+        loan.returned_at = now
+        loan.updated_at = now
+        if notes:
+            loan.notes = notes
+        loan.book = books[loan.book_id]
+        loan.user_active_loans_count = active_counts.get(loan.user_id, 0)
+        outcome['fine'] = loan.fine_amount
+    
+    # Queryset updates send no post_save signals
+    invalidate_catalog(list(returned_copies))
+    return outcomes
@@ -0,0 +1,69 @@
+"""
+Set-based overdue fine calculation.
+
+Fines are computed from due_date inside the database and written with chunked
+bulk UPDATEs, instead of loading and saving every open loan one by one.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import DateTimeField, Func, IntegerField, Value
+from django.utils import timezone
+from .models import Loan
+from .stats import summaries_follow
+
+DEFAULT_DAILY_RATE = Decimal('0.50')
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class DaysOverdue(Func):
+    """Whole days elapsed from a datetime column until a reference time"""
+    template = 'FLOOR(EXTRACT(EPOCH FROM (%(expressions)s)) / 86400)'
+    arg_joiner = ' - '
+    output_field = IntegerField()
+    
+    def __init__(self, expression, now, **extra):
+        super().__init__(Value(now, output_field=DateTimeField()), expression, **extra)
+    
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+
+def overdue_loans(now=None):
+    """Open loans whose due date has passed"""
+    now = now or timezone.now()
+    return Loan.objects.filter(returned_at__isnull=True, due_date__lt=now)
+
+
+def calculate_overdue_fines(daily_rate=DEFAULT_DAILY_RATE, chunk_size=DEFAULT_CHUNK_SIZE, now=None):
+    """
+    Set fine_amount and status for all overdue loans.
+    Loans are updated in primary key order, one UPDATE per chunk.
+    Returns the number of loans updated.
+    """
+    now = now or timezone.now()
+    fine = DaysOverdue('due_date', now) * Value(Decimal(str(daily_rate)))
+    queryset = overdue_loans(now)
+    
+    updated_count = 0
+    last_pk = 0
+    while True:
+        loan_ids = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not loan_ids:
+            break
+        with transaction.atomic(), summaries_follow(loan_ids):
+            # Re-apply the overdue filter so loans returned meanwhile are left alone
+            updated_count += queryset.filter(pk__in=loan_ids).update(
+                fine_amount=fine,
+                status='overdue',
+                updated_at=now,
+            )
+        last_pk = loan_ids[-1]
+    
+    return updated_count
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from loans.archive import archive_cutoff, archive_returned_loans
+
+
+class Command(BaseCommand):
+    help = 'Move returned loans older than LOAN_ARCHIVE_AFTER_DAYS to the archive table'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Number of loans moved per transaction'
+        )
+    
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff()
+        archived_count = archive_returned_loans(cutoff, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived_count} loans returned before {cutoff:%Y-%m-%d %H:%M}'
+        ))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from loans.benchmark import analyze, drop_open_loan_indexes, seed_loans, time_queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the open-loan queries with and without the partial indexes on seeded data. '
+        'Everything is rolled back afterwards.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loans',
+            type=int,
+            default=300000,
+            help='Number of loans to seed (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--returned-ratio',
+            type=float,
+            default=0.95,
+            help='Share of seeded loans that are returned (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Runs per query; the median is reported (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the data and the sampled users and books'
+        )
+    
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['loans']} loans...")
+            user_ids, book_ids = seed_loans(options['loans'], options['returned_ratio'], seed=options['seed'])
+            analyze()
+            indexed = time_queries(user_ids, book_ids, options['repeat'], seed=options['seed'])
+            
+            drop_open_loan_indexes()
+            analyze()
+            unindexed = time_queries(user_ids, book_ids, options['repeat'], seed=options['seed'])
+            
+            # Leave the database as it was, indexes included
+            transaction.set_rollback(True)
+        
+        self.stdout.write('Median time without -> with the partial indexes:')
+        for name, seconds in indexed.items():
+            self.stdout.write(f'  {name:<20} {_format(unindexed[name])} -> {_format(seconds)}')
+
+
+def _format(seconds):
+    if seconds >= 0.01:
+        return f'{seconds * 1000:7.1f} ms'
+    return f'{seconds * 1000000:7.0f} us'
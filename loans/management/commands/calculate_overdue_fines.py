@@ -0,0 +1,30 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from loans.fines import DEFAULT_CHUNK_SIZE, DEFAULT_DAILY_RATE, calculate_overdue_fines
+
+
+class Command(BaseCommand):
+    help = 'Calculate fines for all overdue loans using chunked bulk updates'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daily-rate',
+            type=Decimal,
+            default=DEFAULT_DAILY_RATE,
+            help='Fine charged per day overdue (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of loans updated per UPDATE statement (default: %(default)s)'
+        )
+    
+    def handle(self, *args, **options):
+        updated_count = calculate_overdue_fines(
+            daily_rate=options['daily_rate'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Calculated fines for {updated_count} overdue loans'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from loans.stats import DEFAULT_REBUILD_CHUNK_SIZE, rebuild_user_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user loan summaries from the full loan history (repair only)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild the summary of this user id (repeatable)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_REBUILD_CHUNK_SIZE,
+            help='Number of users aggregated per query (default: %(default)s)'
+        )
+    
+    def handle(self, *args, **options):
+        rebuilt_count = rebuild_user_summaries(options['user_ids'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt_count} loan summaries'))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import loans.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('loans', '0003_loan_open_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('borrowed_at', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('returned_at', models.DateTimeField(null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('returned', 'Returned'), ('overdue', 'Overdue')], max_length=10)),
+                ('notes', models.TextField(null=True)),
+                ('fine_amount', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('fine_paid', models.BooleanField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'loans_history',
+                'ordering': ['-borrowed_at'],
+                'managed': False,
+            },
+            bases=(loans.models.OverdueMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrowed_at', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('returned_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('active', 'Active'), ('returned', 'Returned'), ('overdue', 'Overdue')], max_length=10)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('fine_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=6)),
+                ('fine_paid', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='books.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'loans_archive',
+                'ordering': ['-borrowed_at'],
+                'indexes': [models.Index(fields=['user', 'borrowed_at'], name='loans_archi_user_id_a349bf_idx'), models.Index(fields=['borrowed_at'], name='loans_archi_borrowe_02504b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('loans', '0004_loan_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_loans', models.PositiveIntegerField(default=0)),
+                ('active_loans', models.PositiveIntegerField(default=0)),
+                ('returned_loans', models.PositiveIntegerField(default=0)),
+                ('overdue_loans', models.PositiveIntegerField(default=0)),
+                ('total_fines', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('unpaid_fines', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'loan_summaries',
+            },
+        ),
+    ]
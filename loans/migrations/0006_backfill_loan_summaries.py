@@ -0,0 +1,63 @@
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+STAT_FIELDS = (
+    'total_loans', 'active_loans', 'returned_loans', 'overdue_loans',
+    'total_fines', 'unpaid_fines',
+)
+
+
+def _fines(**filters):
+    return Coalesce(
+        Sum('fine_amount', filter=Q(fine_amount__gt=0, **filters)),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def backfill_summaries(apps, schema_editor):
+    """
+    Summaries are now only adjusted by the change each write makes, so every
+    user with loans needs a complete one to start from.
+    """
+    LoanSummary = apps.get_model('loans', 'LoanSummary')
+    totals = {}
+    for model_name in ('Loan', 'ArchivedLoan'):
+        model = apps.get_model('loans', model_name)
+        rows = (
+            model.objects.order_by()
+            .values('user')
+            .annotate(
+                total_loans=Count('id'),
+                active_loans=Count('id', filter=Q(returned_at__isnull=True)),
+                returned_loans=Count('id', filter=Q(returned_at__isnull=False, status='returned')),
+                overdue_loans=Count('id', filter=Q(status='overdue')),
+                total_fines=_fines(),
+                unpaid_fines=_fines(fine_paid=False),
+            )
+        )
+        for row in rows:
+            total = totals.setdefault(row['user'], dict.fromkeys(STAT_FIELDS, 0))
+            for field in STAT_FIELDS:
+                total[field] += row[field]
+    
+    LoanSummary.objects.bulk_create(
+        [LoanSummary(user_id=user_id, **total) for user_id, total in totals.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=[*STAT_FIELDS, 'updated_at'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_loan_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
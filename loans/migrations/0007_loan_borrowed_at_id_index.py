@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_backfill_loan_summaries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['borrowed_at', 'id'], name='loans_borrowe_fe43b0_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+"""
+The loans_history view over live and archived loans, read by LoanHistory.
+
+Migrations that later change the columns of loans or loans_archive have to
+drop the view first and create it again afterwards.
+"""
+from django.db import migrations
+
+# Columns shared by loans and loans_archive, in the order of the view
+COLUMNS = ', '.join((
+    'id', 'user_id', 'book_id', 'borrowed_at', 'due_date', 'returned_at',
+    'status', 'notes', 'fine_amount', 'fine_paid', 'updated_at',
+))
+
+DROP_VIEW = 'DROP VIEW IF EXISTS loans_history'
+CREATE_VIEW = (
+    f'CREATE VIEW loans_history AS '
+    f'SELECT {COLUMNS} FROM loans UNION ALL SELECT {COLUMNS} FROM loans_archive'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_loan_borrowed_at_id_index'),
+    ]
+
+    operations = [
+        # The view may already exist, created outside migrations by earlier releases
+        migrations.RunSQL([DROP_VIEW, CREATE_VIEW], reverse_sql=[DROP_VIEW]),
+    ]
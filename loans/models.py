@@ -1,10 +1,65 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 
 
-class Loan(models.Model):
+class LoanQuerySet(models.QuerySet):
+    """
+    QuerySet helpers for Loan.
+    """
+    def active(self):
+        """Loans that have not been returned yet"""
+        return self.filter(returned_at__isnull=True)
+    
+    def with_details(self, user=True, book=True):
+        """
+        Load the user and book in the same query and annotate the user's
+        active loan count, as needed by LoanDetailSerializer.
+        Pass user=False or book=False when that part is not rendered.
+        """
+        related = [name for name, wanted in (('user', user), ('book', book)) if wanted]
+        # select_related() without arguments would follow every relation
+        queryset = self.select_related(*related) if related else self
+        if not user:
+            return queryset
+        
+        active_counts = (
+            Loan.objects.active()
+            .filter(user=OuterRef('user'))
+            .order_by()
+            .values('user')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return queryset.annotate(
+            user_active_loans_count=Coalesce(Subquery(active_counts), 0)
+        )
+
+
+class OverdueMixin:
+    """
+    Overdue state of a loan record, computed from due_date and returned_at.
+    """
+    
+    @property
+    def is_overdue(self):
+        """Check if loan is overdue"""
+        if self.returned_at or not self.due_date:
+            return False
+        return timezone.now() > self.due_date
+    
+    @property
+    def days_overdue(self):
+        """Calculate number of days overdue"""
+        if not self.is_overdue:
+            return 0
+        return (timezone.now() - self.due_date).days
+
+
+class Loan(OverdueMixin, models.Model):
     """
     Loan model to track book borrowing.
     """
@@ -49,56 +104,170 @@ class Loan(models.Model):
     )
     fine_paid = models.BooleanField(default=False)
     
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = LoanQuerySet.as_manager()
+    
     class Meta:
         db_table = 'loans'
         ordering = ['-borrowed_at']
         indexes = [
+            models.Index(fields=['borrowed_at', 'id']),
             models.Index(fields=['user', 'status']),
             models.Index(fields=['book', 'status']),
             models.Index(fields=['due_date']),
+            # Partial indexes over open loans only, which stay small as returned loans pile up
+            models.Index(
+                fields=['user', 'book'],
+                condition=Q(returned_at__isnull=True),
+                name='loans_open_user_book_idx',
+            ),
+            models.Index(
+                fields=['book'],
+                condition=Q(returned_at__isnull=True),
+                name='loans_open_book_idx',
+            ),
+            models.Index(
+                fields=['due_date'],
+                condition=Q(returned_at__isnull=True),
+                name='loans_open_due_date_idx',
+            ),
         ]
         
     def __str__(self):
         return f"{self.user.username} borrowed {self.book.title}"
     
     def save(self, *args, **kwargs):
-        """Set due date automatically if not provided (14 days from borrow)"""
+        """
+        Set due date automatically if not provided (14 days from borrow).
+        Saves in a transaction: the loan summary signals lock the stored row.
+        """
         if not self.pk and not self.due_date:
             self.due_date = timezone.now() + timedelta(days=14)
-        super().save(*args, **kwargs)
-    
-    @property
-    def is_overdue(self):
-        """Check if loan is overdue"""
-        if self.returned_at or not self.due_date:
-            return False
-        return timezone.now() > self.due_date
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
     
-    @property
-    def days_overdue(self):
-        """Calculate number of days overdue"""
-        if not self.is_overdue:
-            return 0
-        return (timezone.now() - self.due_date).days
-    
-    def calculate_fine(self, daily_rate=0.50):
+    def calculate_fine(self, daily_rate=0.50, save=True):
         """Calculate fine for overdue books"""
         if self.is_overdue:
             self.fine_amount = self.days_overdue * daily_rate
             self.status = 'overdue'
-            self.save()
+            if save:
+                self.save()
         return self.fine_amount
     
     def return_loan(self):
-        """Mark loan as returned"""
+        """Mark loan as returned and release the copy in one transaction"""
         if not self.returned_at:
-            self.returned_at = timezone.now()
+            # Charge the fine first: a loan with returned_at set is never overdue
             if self.is_overdue:
-                self.calculate_fine()
-                self.status = 'overdue'
+                self.calculate_fine(save=False)
             else:
                 self.status = 'returned'
-            self.save()
-            self.book.return_book()
+            self.returned_at = timezone.now()
+            with transaction.atomic():
+                self.save()
+                self.book.return_book()
             return True
         return False
+
+
+class ArchivedLoan(models.Model):
+    """
+    A returned loan moved out of the loans table, see loans.archive.
+    Keeps the id it had as a Loan.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_loans'
+    )
+    book = models.ForeignKey(
+        'books.Book',
+        on_delete=models.CASCADE,
+        related_name='archived_loans'
+    )
+    borrowed_at = models.DateTimeField()
+    due_date = models.DateTimeField()
+    returned_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Loan.STATUS_CHOICES)
+    notes = models.TextField(blank=True, null=True)
+    fine_amount = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
+    fine_paid = models.BooleanField(default=False)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'loans_archive'
+        ordering = ['-borrowed_at']
+        indexes = [
+            models.Index(fields=['user', 'borrowed_at']),
+            models.Index(fields=['borrowed_at']),
+        ]
+    
+    def __str__(self):
+        return f"Archived loan {self.pk}"
+
+
+class LoanHistory(OverdueMixin, models.Model):
+    """
+    Live and archived loans together, read from the loans_history view
+    (created by migration 0008_loans_history_view).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    book = models.ForeignKey(
+        'books.Book',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    borrowed_at = models.DateTimeField()
+    due_date = models.DateTimeField()
+    returned_at = models.DateTimeField(null=True)
+    status = models.CharField(max_length=10, choices=Loan.STATUS_CHOICES)
+    notes = models.TextField(null=True)
+    fine_amount = models.DecimalField(max_digits=6, decimal_places=2)
+    fine_paid = models.BooleanField()
+    updated_at = models.DateTimeField()
+    
+    objects = LoanQuerySet.as_manager()
+    
+    class Meta:
+        managed = False
+        db_table = 'loans_history'
+        ordering = ['-borrowed_at']
+    
+    def __str__(self):
+        return f"Loan {self.pk}"
+
+
+class LoanSummary(models.Model):
+    """
+    Running loan statistics of one user, live and archived loans included.
+    Kept up to date incrementally by loans.stats whenever the user's loans change.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='loan_summary'
+    )
+    total_loans = models.PositiveIntegerField(default=0)
+    active_loans = models.PositiveIntegerField(default=0)
+    returned_loans = models.PositiveIntegerField(default=0)
+    overdue_loans = models.PositiveIntegerField(default=0)
+    total_fines = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    unpaid_fines = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'loan_summaries'
+    
+    def __str__(self):
+        return f"Loan summary of user {self.user_id}"
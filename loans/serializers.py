@@ -1,7 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Loan
-from books.serializers import BookListSerializer
-from accounts.serializers import UserListSerializer
+from books.serializers import BookListSerializer, BookListValuesSerializer
+from accounts.serializers import UserListSerializer, UserListValuesSerializer
+from library_management.fastpath import ValuesSerializer
+from library_management.sparse import SparseFieldsetMixin
+
+
+def borrow_copy(book):
+    """
+    Take a copy of the book, failing validation if another request got the
+    last one after validation passed.
+    """
+    if not book.borrow():
+        raise serializers.ValidationError(
+            {"book": "This book is not available for borrowing"}
+        )
 
 
 class LoanSerializer(serializers.ModelSerializer):
@@ -45,19 +61,22 @@ class LoanSerializer(serializers.ModelSerializer):
         return attrs
     
     def create(self, validated_data):
-        """Create loan and update book availability"""
-        book = validated_data['book']
-        loan = super().create(validated_data)
-        book.borrow()
-        return loan
+        """Create loan and update book availability in one transaction"""
+        with transaction.atomic():
+            borrow_copy(validated_data['book'])
+            return super().create(validated_data)
 
 
-class LoanDetailSerializer(serializers.ModelSerializer):
+class LoanDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Detailed serializer for loan with nested user and book info"""
     user = UserListSerializer(read_only=True)
     book = BookListSerializer(read_only=True)
     is_overdue = serializers.ReadOnlyField()
     days_overdue = serializers.ReadOnlyField()
+    computed_field_sources = {
+        'is_overdue': ('returned_at', 'due_date'),
+        'days_overdue': ('returned_at', 'due_date'),
+    }
     
     class Meta:
         model = Loan
@@ -67,6 +86,46 @@ class LoanDetailSerializer(serializers.ModelSerializer):
             'is_overdue', 'days_overdue'
         )
         read_only_fields = fields
+    
+    def to_representation(self, instance):
+        """Hand the precomputed active loan count (see LoanQuerySet.with_details) to the user"""
+        active_loans_count = getattr(instance, 'user_active_loans_count', None)
+        if active_loans_count is not None and 'user' in self.fields:
+            instance.user.active_loans_count = active_loans_count
+        return super().to_representation(instance)
+
+
+def _is_overdue(value):
+    """Loan.is_overdue for a values() row"""
+    if value('returned_at') or not value('due_date'):
+        return False
+    return timezone.now() > value('due_date')
+
+
+def _days_overdue(value):
+    """Loan.days_overdue for a values() row"""
+    if not _is_overdue(value):
+        return 0
+    return (timezone.now() - value('due_date')).days
+
+
+class LoanDetailValuesSerializer(ValuesSerializer):
+    """
+    Renders values() rows of Loan.objects.with_details() exactly like
+    LoanDetailSerializer.
+    """
+    serializer_class = LoanDetailSerializer
+    nested_fields = {
+        'user': UserListValuesSerializer,
+        'book': BookListValuesSerializer,
+    }
+    computed_fields = {
+        'is_overdue': _is_overdue,
+        'days_overdue': _days_overdue,
+    }
+    column_aliases = {
+        'user.active_loans_count': 'user_active_loans_count',
+    }
 
 
 class LoanCreateSerializer(serializers.ModelSerializer):
@@ -103,12 +162,49 @@ class LoanCreateSerializer(serializers.ModelSerializer):
         return attrs
     
     def create(self, validated_data):
-        """Create loan with authenticated user and update book availability"""
+        """Create loan with authenticated user and update book availability in one transaction"""
         validated_data['user'] = self.context['request'].user
-        book = validated_data['book']
-        loan = super().create(validated_data)
-        book.borrow()
-        return loan
+        with transaction.atomic():
+            borrow_copy(validated_data['book'])
+            return super().create(validated_data)
+
+
+class LoanBatchCreateSerializer(serializers.Serializer):
+    """Serializer for borrowing several books at once"""
+    books = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=getattr(settings, 'LOAN_BATCH_MAX_SIZE', 100)
+    )
+    due_date = serializers.DateTimeField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class LoanBatchResultSerializer(serializers.Serializer):
+    """Outcome of one book in a batch checkout"""
+    book = serializers.IntegerField()
+    status = serializers.CharField()
+    loan = LoanDetailSerializer(allow_null=True)
+    error = serializers.CharField(allow_null=True)
+
+
+class LoanBatchReturnSerializer(serializers.Serializer):
+    """Serializer for returning several loans at once"""
+    loans = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=getattr(settings, 'LOAN_BATCH_RETURN_MAX_SIZE', 500)
+    )
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class LoanBatchReturnResultSerializer(serializers.Serializer):
+    """Outcome of one loan in a batch return"""
+    id = serializers.IntegerField()
+    status = serializers.CharField()
+    loan = LoanDetailSerializer(allow_null=True)
+    fine = serializers.DecimalField(max_digits=6, decimal_places=2, allow_null=True)
+    error = serializers.CharField(allow_null=True)
 
 
 class LoanReturnSerializer(serializers.Serializer):
@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from books.response_cache import invalidate_catalog
+from .models import ArchivedLoan, Loan
+from .stats import SUMMARY_SOURCE_FIELDS, SummaryChanges, loan_state
+
+
+@receiver(post_save, sender=Loan)
+@receiver(post_delete, sender=Loan)
+def invalidate_book_responses(sender, instance, **kwargs):
+    """A book's detail response includes its active loan count"""
+    invalidate_catalog([instance.book_id])
+
+
+@receiver(pre_save, sender=Loan)
+def lock_summary_state(sender, instance, using=None, **kwargs):
+    """Read the stored loan under a row lock, so concurrent saves cannot both count the same change"""
+    instance._summary_state = None
+    if not instance._state.adding:
+        instance._summary_state = (
+            Loan.objects.using(using).select_for_update()
+            .filter(pk=instance.pk)
+            .values(*SUMMARY_SOURCE_FIELDS)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Loan)
+def update_summary_on_save(sender, instance, using=None, update_fields=None, **kwargs):
+    """Move the loan's figures from its stored state to the saved one, for both borrowers if it changed hands"""
+    before = getattr(instance, '_summary_state', None)
+    after = loan_state(instance)
+    if before is not None and update_fields is not None:
+        saved = {Loan._meta.get_field(name).attname for name in update_fields}
+        after = {field: after[field] if field in saved else before[field] for field in SUMMARY_SOURCE_FIELDS}
+    
+    changes = SummaryChanges()
+    changes.remove(before)
+    changes.add(after)
+    changes.commit(using)
+
+
+@receiver(post_delete, sender=Loan)
+@receiver(post_delete, sender=ArchivedLoan)
+def update_summary_on_delete(sender, instance, using=None, origin=None, **kwargs):
+    """Deleting a user deletes their loans and their summary together"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(model, get_user_model()):
+        return
+    changes = SummaryChanges()
+    changes.remove(loan_state(instance))
+    changes.commit(using)
@@ -0,0 +1,195 @@
+"""
+Loan statistics computed in the database.
+
+Every statistic is a filtered COUNT or SUM of one aggregate query. Per-user
+figures are also kept in LoanSummary rows so user_stats is a primary key
+lookup however many loans the user has. Writers work out how each loan they
+change moves its borrower's figures and apply the difference with F()
+updates once their transaction commits; only rebuild_user_summaries, the
+repair path, aggregates a user's whole history.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Loan, LoanHistory, LoanSummary
+
+STAT_FIELDS = (
+    'total_loans', 'active_loans', 'returned_loans', 'overdue_loans',
+    'total_fines', 'unpaid_fines',
+)
+
+
+def _fines(**filters):
+    return Coalesce(
+        Sum('fine_amount', filter=Q(fine_amount__gt=0, **filters)),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def user_aggregates():
+    """Aggregates of a user's loans, as reported by user_stats"""
+    return {
+        'total_loans': Count('id'),
+        'active_loans': Count('id', filter=Q(returned_at__isnull=True)),
+        'returned_loans': Count('id', filter=Q(returned_at__isnull=False, status='returned')),
+        'overdue_loans': Count('id', filter=Q(status='overdue')),
+        'total_fines': _fines(),
+        'unpaid_fines': _fines(fine_paid=False),
+    }
+
+
+def loan_stats():
+    """Library-wide loan statistics in one query"""
+    aggregates = user_aggregates()
+    # Unlike per user figures, loans marked overdue are not counted as active
+    aggregates['active_loans'] = Count('id', filter=Q(returned_at__isnull=True, status='active'))
+    return LoanHistory.objects.aggregate(**aggregates)
+
+
+# Loan fields the summary figures depend on
+SUMMARY_SOURCE_FIELDS = ('user_id', 'returned_at', 'status', 'fine_amount', 'fine_paid')
+DEFAULT_REBUILD_CHUNK_SIZE = 1000
+
+
+def loan_contribution(returned_at, status, fine_amount, fine_paid):
+    """What one loan adds to its borrower's summary, matching user_aggregates()"""
+    fine = Decimal(str(fine_amount or 0)).quantize(Decimal('0.01'))
+    fine = max(fine, Decimal('0.00'))
+    return {
+        'total_loans': 1,
+        'active_loans': int(returned_at is None),
+        'returned_loans': int(returned_at is not None and status == 'returned'),
+        'overdue_loans': int(status == 'overdue'),
+        'total_fines': fine,
+        'unpaid_fines': Decimal('0.00') if fine_paid else fine,
+    }
+
+
+def loan_state(loan):
+    """The summary source fields of a loan instance"""
+    return {field: getattr(loan, field) for field in SUMMARY_SOURCE_FIELDS}
+
+
+class SummaryChanges:
+    """
+    Differences to apply to LoanSummary rows, accumulated per user.
+    add() a loan's state after a change and remove() its state before it.
+    """
+    
+    def __init__(self):
+        self.deltas = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    
+    def _apply_state(self, state, sign):
+        if state is None or state['user_id'] is None:
+            return
+        delta = self.deltas[state['user_id']]
+        contribution = loan_contribution(
+            state['returned_at'], state['status'], state['fine_amount'], state['fine_paid']
+        )
+        for field, value in contribution.items():
+            delta[field] += sign * value
+    
+    def add(self, state):
+        self._apply_state(state, 1)
+    
+    def remove(self, state):
+        self._apply_state(state, -1)
+    
+    def add_new_loans(self, user_id, count):
+        """`count` new active loans without fines"""
+        self.deltas[user_id]['total_loans'] += count
+        self.deltas[user_id]['active_loans'] += count
+    
+    def commit(self, using=None):
+        """Apply the changes when the current transaction commits (at once outside a transaction)"""
+        deltas = {user_id: delta for user_id, delta in self.deltas.items() if any(delta.values())}
+        if deltas:
+            transaction.on_commit(lambda: apply_summary_deltas(deltas), using=using)
+
+
+@contextmanager
+def summaries_follow(loan_ids):
+    """
+    Apply the change in the summary figures of the given loans, made by
+    queryset updates in the block, when the transaction commits. Must be used
+    inside that transaction: the loans are locked on entry.
+    """
+    changes = SummaryChanges()
+    for state in Loan.objects.select_for_update().filter(pk__in=loan_ids).values(*SUMMARY_SOURCE_FIELDS):
+        changes.remove(state)
+    yield
+    for state in Loan.objects.filter(pk__in=loan_ids).values(*SUMMARY_SOURCE_FIELDS):
+        changes.add(state)
+    changes.commit()
+
+
+def apply_summary_deltas(deltas):
+    """
+    Add the per-user differences to the summaries with one UPDATE per
+    distinct difference. A user without a summary has no loans counted yet,
+    so the summary starts from zero.
+    """
+    now = timezone.now()
+    groups = defaultdict(list)
+    for user_id, delta in deltas.items():
+        groups[tuple((field, value) for field, value in delta.items() if value)].append(user_id)
+    
+    for items, user_ids in groups.items():
+        if not items:
+            continue
+        try:
+            with transaction.atomic():
+                LoanSummary.objects.bulk_create(
+                    [LoanSummary(user_id=user_id) for user_id in user_ids],
+                    ignore_conflicts=True,
+                )
+        except IntegrityError:
+            # A user was deleted meanwhile, and their summary with them
+            continue
+        LoanSummary.objects.filter(user_id__in=user_ids).update(
+            updated_at=now,
+            **{field: F(field) + value for field, value in items}
+        )
+
+
+def rebuild_user_summaries(user_ids=None, chunk_size=DEFAULT_REBUILD_CHUNK_SIZE):
+    """
+    Recompute summaries from every live and archived loan, for the given users
+    or everyone with loans or a summary. Repairs summaries that drifted; run it
+    while loans are not being changed. Returns the number of summaries written.
+    """
+    if user_ids is None:
+        user_ids = set(LoanHistory.objects.values_list('user_id', flat=True).distinct())
+        user_ids |= set(LoanSummary.objects.values_list('user_id', flat=True))
+    user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        rows = {
+            row.pop('user'): row
+            for row in LoanHistory.objects.filter(user__in=chunk)
+            .order_by()
+            .values('user')
+            .annotate(**user_aggregates())
+        }
+        LoanSummary.objects.bulk_create(
+            [LoanSummary(user_id=user_id, **rows.get(user_id, {})) for user_id in chunk],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[*STAT_FIELDS, 'updated_at'],
+        )
+    return len(user_ids)
+
+
+def user_stats(user):
+    """Loan statistics of the user, from the summary row; a user without one has no loans"""
+    summary = LoanSummary.objects.filter(user=user).values(*STAT_FIELDS).first()
+    if summary is None:
+        summary = {field: 0 for field in STAT_FIELDS}
+        summary.update(total_fines=Decimal('0.00'), unpaid_fines=Decimal('0.00'))
+    return summary
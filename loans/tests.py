@@ -1,12 +1,23 @@
+import json
+import msgpack
 import pytest
+from decimal import Decimal
+from io import StringIO
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from .models import Loan
+from .models import ArchivedLoan, Loan, LoanHistory, LoanSummary
+from .serializers import LoanDetailSerializer, LoanDetailValuesSerializer
+from . import archive, benchmark, fines, stats
 from books.models import Book
+from library_management.pagination import KeysetPagination
 
 User = get_user_model()
 
@@ -137,6 +148,16 @@ class TestLoanList:
         
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
     
+    def test_list_loans_as_msgpack(self, api_client, regular_user, active_loan):
+        """Test that the loan list can be requested as MessagePack"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_list')
+        response = api_client.get(url, HTTP_ACCEPT='application/msgpack')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/msgpack'
+        assert msgpack.unpackb(response.content) == json.loads(api_client.get(url).content)
+    
     def test_user_sees_only_own_loans(self, api_client, regular_user, another_user, active_loan):
         """Test that users only see their own loans"""
         api_client.force_authenticate(user=another_user)
@@ -149,6 +170,198 @@ class TestLoanList:
             assert loan['user']['id'] == another_user.id
 
 
+    def test_list_loans_cursor_pagination(self, api_client, admin_user, regular_user, sample_book):
+        """Test walking the loan list with keyset pagination"""
+        for days in range(12):
+            Loan.objects.create(
+                user=regular_user,
+                book=sample_book,
+                due_date=timezone.now() + timedelta(days=days),
+                returned_at=timezone.now() if days % 3 == 0 else None
+            )
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('loans:loan_list')
+        
+        for ordering in ['-borrowed_at', 'due_date', 'returned_at']:
+            response = api_client.get(url, {'pagination': 'cursor', 'ordering': ordering})
+            ids = []
+            while True:
+                ids.extend(loan['id'] for loan in response.data['results'])
+                if not response.data['next']:
+                    break
+                response = api_client.get(response.data['next'])
+            assert sorted(ids) == sorted(Loan.objects.values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+class TestLoanQueryCount:
+    """Query-count regression tests for nested loan serialization"""
+    
+    @pytest.fixture
+    def many_loans(self, regular_user, another_user):
+        """Loans spread over several books and two users"""
+        loans = []
+        for i in range(15):
+            book = Book.objects.create(
+                title=f'Book {i}',
+                author='Author',
+                isbn=f'97811111111{i:02d}',
+                page_count=100,
+                total_copies=2,
+                available_copies=1
+            )
+            loans.append(Loan.objects.create(
+                user=regular_user if i % 2 else another_user,
+                book=book,
+                returned_at=timezone.now() if i % 3 == 0 else None
+            ))
+        return loans
+    
+    def test_loan_list_constant_queries(self, api_client, admin_user, many_loans, django_assert_num_queries):
+        """Test that a loan list page costs one COUNT and one SELECT"""
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('loans:loan_list')
+        with django_assert_num_queries(2):
+            response = api_client.get(url, {'page_size': 100})
+        
+        counts = {
+            loan['user']['id']: loan['user']['active_loans_count']
+            for loan in response.data['results']
+        }
+        for user_id, count in counts.items():
+            assert count == User.objects.get(pk=user_id).active_loans_count
+    
+    def test_user_loans_constant_queries(self, api_client, regular_user, many_loans, django_assert_num_queries):
+        """Test that my-loans does not query per loan"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:user_loans')
+        with django_assert_num_queries(3):
+            response = api_client.get(url)
+        
+        assert response.data['total_loans'] == 7
+        for loan in response.data['active_loans'] + response.data['returned_loans']:
+            assert loan['user']['active_loans_count'] == regular_user.active_loans_count
+    
+    def test_loan_detail_single_query(self, api_client, admin_user, many_loans, django_assert_num_queries):
+        """Test that loan detail renders nested objects from one query"""
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': many_loans[0].id})
+        with django_assert_num_queries(1):
+            api_client.get(url)
+
+
+@pytest.mark.django_db
+class TestLoanSparseFieldsets:
+    """Tests for ?fields= and ?exclude= on the loan endpoints"""
+    
+    def test_list_ids_and_status(self, api_client, regular_user, active_loan, django_assert_num_queries):
+        """Test that a pruned loan list neither joins nor counts the user's loans"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_list')
+        with django_assert_num_queries(2) as queries:
+            response = api_client.get(url, {'fields': 'id,status,book.id'})
+        
+        assert response.data['results'] == [
+            {'id': active_loan.id, 'status': 'active', 'book': {'id': active_loan.book_id}}
+        ]
+        page_sql = queries.captured_queries[-1]['sql']
+        assert '"users"' not in page_sql
+        assert 'COUNT' not in page_sql
+    
+    def test_list_without_fast_path(self, api_client, regular_user, active_loan, settings):
+        """Test that the model serializer path prunes the same way"""
+        settings.USE_VALUES_SERIALIZERS = False
+        api_client.force_authenticate(user=regular_user)
+        response = api_client.get(reverse('loans:loan_list'), {'fields': 'id,user.username,days_overdue'})
+        
+        assert response.data['results'] == [
+            {'id': active_loan.id, 'user': {'username': 'user'}, 'days_overdue': 0}
+        ]
+    
+    def test_detail_fields(self, api_client, regular_user, active_loan, django_assert_num_queries):
+        """Test a pruned loan detail is one narrow query and still supports ETags"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': active_loan.id})
+        with django_assert_num_queries(1) as queries:
+            response = api_client.get(url, {'fields': 'id,status,is_overdue'})
+        
+        assert response.data == {'id': active_loan.id, 'status': 'active', 'is_overdue': False}
+        sql = queries.captured_queries[0]['sql']
+        assert '"users"' not in sql
+        assert '"notes"' not in sql
+        
+        response = api_client.get(url, {'fields': 'id,status,is_overdue'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    
+    def test_detail_exclude_nested(self, api_client, regular_user, active_loan):
+        """Test excluding fields of a nested object"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': active_loan.id})
+        response = api_client.get(url, {'exclude': 'book.isbn,user.email'})
+        
+        assert 'isbn' not in response.data['book']
+        assert 'email' not in response.data['user']
+        assert response.data['user']['active_loans_count'] == 1
+
+
+@pytest.mark.django_db
+class TestLoanDetailValuesSerializer:
+    """Parity tests for the values() rendering path of the loan list"""
+    
+    @pytest.fixture
+    def varied_loans(self, active_loan, overdue_loan, another_user, unavailable_book):
+        """Active, overdue, returned and fined loans across two users"""
+        returned = Loan.objects.create(
+            user=another_user,
+            book=unavailable_book,
+            due_date=timezone.now() - timedelta(days=3),
+            notes='Returned late ✓',
+        )
+        returned.return_loan()
+        Loan.objects.filter(pk=overdue_loan.pk).update(fine_amount=Decimal('12.5'), fine_paid=True)
+    
+    def test_rows_render_identically(self, varied_loans):
+        """Test that values() rows render to the same bytes as LoanDetailSerializer"""
+        queryset = Loan.objects.with_details().order_by('id')
+        slow = LoanDetailSerializer(queryset, many=True).data
+        fast = LoanDetailValuesSerializer().render(LoanDetailValuesSerializer().values(queryset))
+        
+        assert JSONRenderer().render(fast) == JSONRenderer().render(slow)
+    
+    @pytest.mark.parametrize('params', [
+        {},
+        {'ordering': 'returned_at'},
+        {'status': 'active'},
+        {'pagination': 'cursor', 'ordering': '-due_date'},
+        {'fields': 'id,status,book.id,book.title,is_overdue'},
+        {'exclude': 'user,book.isbn'},
+    ])
+    def test_list_endpoint_parity(self, api_client, admin_user, regular_user, varied_loans, settings, monkeypatch, params):
+        """Test that the loan list returns the same bytes with and without the fast path"""
+        monkeypatch.setattr(KeysetPagination, 'page_size', 2)
+        url = reverse('loans:loan_list')
+        for user in (admin_user, regular_user):
+            api_client.force_authenticate(user=user)
+            settings.USE_VALUES_SERIALIZERS = False
+            slow = api_client.get(url, params)
+            settings.USE_VALUES_SERIALIZERS = True
+            fast = api_client.get(url, params)
+            
+            assert fast.status_code == status.HTTP_200_OK
+            assert fast.content == slow.content
+    
+    def test_fast_path_skips_model_serializer(self, api_client, admin_user, varied_loans, monkeypatch, django_assert_num_queries):
+        """Test that a cursor page of loans is one query and never runs LoanDetailSerializer"""
+        def fail(self, instance):
+            raise AssertionError('LoanDetailSerializer used on the fast path')
+        monkeypatch.setattr(LoanDetailSerializer, 'to_representation', fail)
+        
+        api_client.force_authenticate(user=admin_user)
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse('loans:loan_list'), {'pagination': 'cursor'})
+        assert len(response.data['results']) == 3
+
+
 @pytest.mark.django_db
 class TestLoanDetail:
     """Tests for loan detail view"""
@@ -177,6 +390,58 @@ class TestLoanDetail:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
+    
+    def test_loan_detail_not_modified(self, api_client, regular_user, active_loan, django_assert_num_queries):
+        """Test that a matching If-None-Match returns 304 from a single query"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': active_loan.id})
+        response = api_client.get(url)
+        assert response['ETag'].startswith('"')
+        # is_overdue and days_overdue follow the clock, not updated_at
+        assert 'Last-Modified' not in response
+        
+        with django_assert_num_queries(1):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b''
+    
+    def test_loan_detail_etag_changes(self, api_client, regular_user, active_loan, sample_book):
+        """Test that returning the loan or borrowing another book changes the ETag"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': active_loan.id})
+        etag = api_client.get(url)['ETag']
+        
+        Loan.objects.create(user=regular_user, book=sample_book, due_date=timezone.now() + timedelta(days=14))
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['user']['active_loans_count'] == 2
+        
+        active_loan.return_loan()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'returned'
+    
+    def test_loan_detail_ignores_if_modified_since(self, api_client, regular_user, active_loan):
+        """Test that a loan turning overdue is not hidden behind If-Modified-Since"""
+        from django.utils.http import http_date
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': active_loan.id})
+        since = http_date((timezone.now() + timedelta(days=1)).timestamp())
+        
+        Loan.objects.filter(pk=active_loan.pk).update(due_date=timezone.now() - timedelta(days=2))
+        response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['is_overdue'] is True
+    
+    def test_other_user_loan_detail_has_no_etag(self, api_client, another_user, active_loan):
+        """Test that conditional requests do not reveal other users' loans"""
+        api_client.force_authenticate(user=another_user)
+        url = reverse('loans:loan_detail', kwargs={'pk': active_loan.id})
+        response = api_client.get(url, HTTP_IF_NONE_MATCH='*')
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert 'ETag' not in response
 
 
 @pytest.mark.django_db
@@ -223,6 +488,23 @@ class TestLoanCreate:
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
     
+    def test_borrow_last_copy_taken_after_validation(self, regular_user, sample_book):
+        """Test that no loan is created if the last copy goes between validation and save"""
+        from rest_framework.exceptions import ValidationError
+        from rest_framework.test import APIRequestFactory
+        from .serializers import LoanCreateSerializer
+        
+        request = APIRequestFactory().post('/')
+        request.user = regular_user
+        data = {'book': sample_book.id, 'due_date': timezone.now() + timedelta(days=14)}
+        serializer = LoanCreateSerializer(data=data, context={'request': request})
+        assert serializer.is_valid()
+        
+        Book.objects.filter(pk=sample_book.pk).update(available_copies=0)
+        with pytest.raises(ValidationError):
+            serializer.save()
+        assert not Loan.objects.filter(book=sample_book).exists()
+    
     def test_borrow_book_unauthenticated(self, api_client, sample_book):
         """Test borrowing without authentication (should fail)"""
         url = reverse('loans:loan_create')
@@ -235,6 +517,104 @@ class TestLoanCreate:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+@pytest.mark.django_db
+class TestLoanBatchCreate:
+    """Tests for borrowing several books in one request"""
+    
+    def test_batch_borrow_reports_each_book(self, api_client, regular_user, sample_book, unavailable_book, active_loan):
+        """Test that each book gets its own outcome, in request order"""
+        other_book = Book.objects.create(
+            title='Other Book', author='Other Author', isbn='9783333333333',
+            page_count=120, total_copies=1, available_copies=1
+        )
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_batch_create')
+        data = {'books': [other_book.id, unavailable_book.id, sample_book.id, 999999, other_book.id]}
+        response = api_client.post(url, data, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['borrowed_count'] == 1
+        assert response.data['failed_count'] == 4
+        results = response.data['results']
+        assert [result['book'] for result in results] == data['books']
+        assert [result['status'] for result in results] == ['borrowed', 'failed', 'failed', 'failed', 'failed']
+        assert results[0]['loan']['book']['id'] == other_book.id
+        assert results[0]['loan']['user']['active_loans_count'] == 2
+        assert results[1]['error'] == 'This book is not available for borrowing'
+        assert results[2]['error'] == 'You already have this book on loan'
+        assert results[3]['error'] == 'Book not found'
+        assert results[4]['error'] == 'This book is listed more than once'
+        
+        other_book.refresh_from_db()
+        assert other_book.available_copies == 0
+        assert Loan.objects.filter(user=regular_user, book=other_book, returned_at__isnull=True).count() == 1
+    
+    def test_batch_borrow_sets_due_date(self, api_client, regular_user, sample_book):
+        """Test that loans get the requested due date, or the default loan period"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_batch_create')
+        due_date = timezone.now() + timedelta(days=7)
+        response = api_client.post(url, {'books': [sample_book.id], 'due_date': due_date.isoformat()}, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        loan = Loan.objects.get(pk=response.data['results'][0]['loan']['id'])
+        assert loan.due_date == due_date
+        assert loan.status == 'active'
+        assert loan.borrowed_at is not None
+    
+    def test_batch_borrow_nothing_borrowed(self, api_client, regular_user, unavailable_book):
+        """Test that a batch where every book fails is rejected"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_batch_create')
+        response = api_client.post(url, {'books': [unavailable_book.id]}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['borrowed_count'] == 0
+        assert not Loan.objects.exists()
+    
+    def test_batch_borrow_invalid_payload(self, api_client, regular_user):
+        """Test that empty and oversized batches are rejected"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_batch_create')
+        
+        assert api_client.post(url, {'books': []}, format='json').status_code == status.HTTP_400_BAD_REQUEST
+        response = api_client.post(url, {'books': list(range(1, 102))}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_batch_borrow_unauthenticated(self, api_client, sample_book):
+        """Test batch borrowing without authentication (should fail)"""
+        url = reverse('loans:loan_batch_create')
+        response = api_client.post(url, {'books': [sample_book.id]}, format='json')
+        
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_batch_borrow_constant_queries(self, api_client, regular_user, django_assert_max_num_queries):
+        """Test that the number of queries does not grow with the batch size"""
+        books = Book.objects.bulk_create([
+            Book(title=f'Batch {i}', author='Author', isbn=f'97890000000{i:02d}', page_count=100)
+            for i in range(20)
+        ])
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_batch_create')
+        
+        with django_assert_max_num_queries(10):
+            response = api_client.post(url, {'books': [book.id for book in books]}, format='json')
+        
+        assert response.data['borrowed_count'] == 20
+        assert not Book.objects.filter(available_copies__gt=0).exists()
+    
+    def test_batch_borrow_invalidates_catalog(self, api_client, regular_user, sample_book, django_capture_on_commit_callbacks):
+        """Test that cached book details show the new availability"""
+        detail_url = reverse('books:book_detail', kwargs={'pk': sample_book.pk})
+        assert api_client.get(detail_url).data['available_copies'] == 3
+        
+        api_client.force_authenticate(user=regular_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(reverse('loans:loan_batch_create'), {'books': [sample_book.id]}, format='json')
+        
+        assert api_client.get(detail_url).data['available_copies'] == 2
+
+
 @pytest.mark.django_db
 class TestLoanReturn:
     """Tests for loan return"""
@@ -280,6 +660,109 @@ class TestLoanReturn:
         assert overdue_loan.fine_amount > 0
 
 
+@pytest.mark.django_db
+class TestLoanBatchReturn:
+    """Tests for returning several loans in one request"""
+    
+    def test_batch_return_reports_each_loan(self, api_client, admin_user, regular_user, active_loan, overdue_loan):
+        """Test that each loan gets its own outcome and overdue loans are fined"""
+        returned_loan = Loan.objects.create(
+            user=regular_user, book=active_loan.book, due_date=timezone.now() + timedelta(days=3)
+        )
+        returned_loan.return_loan()
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('loans:loan_batch_return')
+        data = {'loans': [active_loan.id, overdue_loan.id, returned_loan.id, 999999, active_loan.id]}
+        response = api_client.post(url, data, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['returned_count'] == 2
+        assert response.data['failed_count'] == 3
+        results = response.data['results']
+        assert [result['id'] for result in results] == data['loans']
+        assert [result['status'] for result in results] == ['returned', 'returned', 'failed', 'failed', 'failed']
+        assert results[0]['fine'] == '0.00'
+        assert results[1]['fine'] == '2.50'
+        assert results[1]['loan']['status'] == 'overdue'
+        assert results[1]['loan']['user']['active_loans_count'] == 0
+        assert results[2]['error'] == 'This book has already been returned'
+        assert results[3]['error'] == 'Loan not found'
+        assert results[4]['error'] == 'This loan is listed more than once'
+        
+        active_loan.refresh_from_db()
+        overdue_loan.refresh_from_db()
+        assert active_loan.returned_at is not None
+        assert active_loan.status == 'returned'
+        assert overdue_loan.fine_amount == Decimal('2.50')
+        assert overdue_loan.book.available_copies == 1
+        assert active_loan.book.available_copies == 3
+    
+    def test_batch_return_several_copies_of_a_book(self, api_client, admin_user, regular_user, another_user, sample_book):
+        """Test that copies of the same book are all given back, up to the total"""
+        loans = [
+            Loan.objects.create(user=user, book=sample_book, due_date=timezone.now() + timedelta(days=14))
+            for user in (regular_user, another_user)
+        ]
+        Book.objects.filter(pk=sample_book.pk).update(available_copies=0)
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post(reverse('loans:loan_batch_return'), {'loans': [loan.id for loan in loans]}, format='json')
+        
+        assert response.data['returned_count'] == 2
+        sample_book.refresh_from_db()
+        assert sample_book.available_copies == 2
+    
+    def test_batch_return_matches_single_return(self, api_client, admin_user, regular_user, another_user):
+        """Test that fines match the ones charged by Loan.return_loan()"""
+        loans = []
+        for user in (regular_user, another_user):
+            book = Book.objects.create(
+                title=f'Late {user.username}', author='Author', isbn=f'978444444{user.pk:04d}',
+                page_count=100, total_copies=1, available_copies=0
+            )
+            loans.append(Loan.objects.create(user=user, book=book, due_date=timezone.now() - timedelta(days=9, hours=5)))
+        loans[0].return_loan()
+        api_client.force_authenticate(user=admin_user)
+        api_client.post(reverse('loans:loan_batch_return'), {'loans': [loans[1].id]}, format='json')
+        
+        single, batch = (Loan.objects.get(pk=loan.pk) for loan in loans)
+        assert batch.fine_amount == single.fine_amount == Decimal('4.50')
+        assert batch.status == single.status == 'overdue'
+    
+    def test_batch_return_as_regular_user(self, api_client, regular_user, active_loan):
+        """Test that only admins can batch return (should fail)"""
+        api_client.force_authenticate(user=regular_user)
+        response = api_client.post(reverse('loans:loan_batch_return'), {'loans': [active_loan.id]}, format='json')
+        
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_batch_return_nothing_returned(self, api_client, admin_user):
+        """Test that a batch where every loan fails is rejected"""
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post(reverse('loans:loan_batch_return'), {'loans': [999999]}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['returned_count'] == 0
+    
+    def test_batch_return_constant_queries(self, api_client, admin_user, regular_user, django_assert_max_num_queries):
+        """Test that the number of queries does not grow with the batch size"""
+        books = Book.objects.bulk_create([
+            Book(title=f'Drop {i}', author='Author', isbn=f'97891000000{i:02d}', page_count=100, available_copies=0)
+            for i in range(20)
+        ])
+        loans = Loan.objects.bulk_create([
+            Loan(user=regular_user, book=book, due_date=timezone.now() + timedelta(days=i - 10))
+            for i, book in enumerate(books)
+        ])
+        api_client.force_authenticate(user=admin_user)
+        
+        with django_assert_max_num_queries(12):
+            response = api_client.post(reverse('loans:loan_batch_return'), {'loans': [loan.id for loan in loans]}, format='json')
+        
+        assert response.data['returned_count'] == 20
+        assert not Book.objects.filter(available_copies=0).exists()
+        assert not Loan.objects.filter(returned_at__isnull=True).exists()
+
+
 @pytest.mark.django_db
 class TestLoanUpdate:
     """Tests for loan update (admin only)"""
@@ -341,6 +824,168 @@ class TestLoanStats:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_loan_stats_values_in_one_query(self, admin_user, active_loan, overdue_loan, old_returned_loan, django_assert_num_queries):
+        """Test that the statistics are computed by a single aggregate, archive included"""
+        overdue_loan.return_loan()
+        Loan.objects.filter(pk=old_returned_loan.pk).update(fine_amount=Decimal('1.25'), fine_paid=True)
+        archive.archive_returned_loans()
+        
+        with django_assert_num_queries(1):
+            result = stats.loan_stats()
+        
+        assert result == {
+            'total_loans': 3,
+            'active_loans': 1,
+            'returned_loans': 1,
+            'overdue_loans': 1,
+            'total_fines': Decimal('3.75'),
+            'unpaid_fines': Decimal('2.50'),
+        }
+
+
+@pytest.mark.django_db
+class TestLoanSummary:
+    """Tests for the per-user running loan summary"""
+    
+    def summary(self, user):
+        return stats.user_stats(user)
+    
+    def rebuilt(self, user):
+        stats.rebuild_user_summaries([user.pk])
+        return self.summary(user)
+    
+    def test_summary_follows_borrow_and_return(self, api_client, regular_user, sample_book, overdue_loan, django_capture_on_commit_callbacks):
+        """Test that borrowing and returning update the borrower's summary"""
+        stats.rebuild_user_summaries()
+        api_client.force_authenticate(user=regular_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(reverse('loans:loan_create'), {
+                'book': sample_book.id,
+                'due_date': (timezone.now() + timedelta(days=14)).isoformat()
+            }, format='json')
+        assert self.summary(regular_user)['active_loans'] == 2
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(reverse('loans:loan_return', kwargs={'pk': overdue_loan.id}), {}, format='json')
+        
+        assert self.summary(regular_user) == {
+            'total_loans': 2,
+            'active_loans': 1,
+            'returned_loans': 0,
+            'overdue_loans': 1,
+            'total_fines': Decimal('2.50'),
+            'unpaid_fines': Decimal('2.50'),
+        }
+    
+    def test_summary_follows_bulk_changes(self, api_client, admin_user, regular_user, sample_book, overdue_loan, django_capture_on_commit_callbacks):
+        """Test that batch checkout, batch return and fine calculation update summaries"""
+        stats.rebuild_user_summaries()
+        api_client.force_authenticate(user=regular_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(reverse('loans:loan_batch_create'), {'books': [sample_book.id]}, format='json')
+        assert self.summary(regular_user)['total_loans'] == 2
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            fines.calculate_overdue_fines()
+        assert self.summary(regular_user)['overdue_loans'] == 1
+        assert self.summary(regular_user)['unpaid_fines'] == Decimal('2.50')
+        
+        api_client.force_authenticate(user=admin_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post(reverse('loans:loan_batch_return'), {'loans': [overdue_loan.id]}, format='json')
+        assert self.summary(regular_user)['active_loans'] == 1
+        assert self.summary(regular_user) == self.rebuilt(regular_user)
+    
+    def test_summary_follows_reassigned_loan(self, regular_user, another_user, active_loan, django_capture_on_commit_callbacks):
+        """Test that moving a loan to another user updates both summaries"""
+        stats.rebuild_user_summaries()
+        loan = Loan.objects.get(pk=active_loan.pk)
+        loan.user = another_user
+        with django_capture_on_commit_callbacks(execute=True):
+            loan.save()
+        
+        assert self.summary(regular_user)['total_loans'] == 0
+        assert self.summary(another_user)['total_loans'] == 1
+    
+    def test_summary_applies_deltas_without_aggregating(self, regular_user, active_loan, django_capture_on_commit_callbacks):
+        """Test that a loan write updates the summary without reading the user's history"""
+        stats.rebuild_user_summaries()
+        
+        with django_capture_on_commit_callbacks() as callbacks:
+            active_loan.return_loan()
+        with CaptureQueriesContext(connection) as context:
+            for callback in callbacks:
+                callback()
+        # One INSERT ... ON CONFLICT DO NOTHING and one UPDATE, besides savepoints
+        queries = [query['sql'] for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+        assert len(queries) == 2
+        assert not any('loans_history' in sql or 'loans_archive' in sql for sql in queries)
+        assert self.summary(regular_user)['active_loans'] == 0
+        assert self.summary(regular_user) == self.rebuilt(regular_user)
+    
+    def test_summary_changes_rolled_back_with_write(self, regular_user, active_loan, django_capture_on_commit_callbacks):
+        """Test that a rolled back write leaves the summary alone"""
+        stats.rebuild_user_summaries()
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            with pytest.raises(RuntimeError):
+                with transaction.atomic():
+                    active_loan.return_loan()
+                    raise RuntimeError
+        
+        assert self.summary(regular_user)['active_loans'] == 1
+    
+    def test_summary_deleted_with_user(self, regular_user, active_loan, django_capture_on_commit_callbacks):
+        """Test that deleting a user with loans removes the summary"""
+        stats.rebuild_user_summaries()
+        user_id = regular_user.pk
+        with django_capture_on_commit_callbacks(execute=True):
+            regular_user.delete()
+        
+        assert not LoanSummary.objects.filter(user_id=user_id).exists()
+    
+    def test_missing_summary_means_no_loans(self, regular_user, sample_book, django_capture_on_commit_callbacks):
+        """Test that a user's first loan creates their summary"""
+        assert self.summary(regular_user)['total_loans'] == 0
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            Loan.objects.create(user=regular_user, book=sample_book, due_date=timezone.now() + timedelta(days=14))
+        
+        assert self.summary(regular_user)['total_loans'] == 1
+    
+    def test_rebuild_command_repairs_summaries(self, regular_user, active_loan):
+        """Test that the repair command recomputes drifted summaries"""
+        LoanSummary.objects.update_or_create(user=regular_user, defaults={'total_loans': 7})
+        
+        call_command('rebuild_loan_summaries', user_ids=[regular_user.pk])
+        
+        assert self.summary(regular_user)['total_loans'] == 1
+
+
+@pytest.mark.django_db
+class TestLoanExport:
+    """Tests for streaming loan history export (admin only)"""
+    
+    def test_export_loans_as_admin(self, api_client, admin_user, active_loan, overdue_loan):
+        """Test exporting filtered loans as CSV"""
+        import csv
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('loans:loan_export', kwargs={'export_format': 'csv'})
+        response = api_client.get(url, {'book': active_loan.book.id})
+        
+        assert response.status_code == status.HTTP_200_OK
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        assert [int(row['id']) for row in rows] == [active_loan.id]
+        assert rows[0]['fine_amount'] == '0.00'
+    
+    def test_export_loans_as_regular_user(self, api_client, regular_user, active_loan):
+        """Test exporting loans as regular user (should fail)"""
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_export', kwargs={'export_format': 'ndjson'})
+        response = api_client.get(url)
+        
+        assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
 @pytest.mark.django_db
@@ -358,6 +1003,43 @@ class TestCalculateOverdueFines:
         overdue_loan.refresh_from_db()
         assert overdue_loan.fine_amount > 0
     
+    def test_calculate_fines_matches_model_calculation(self, api_client, admin_user, overdue_loan, active_loan):
+        """Test that bulk fines match Loan.calculate_fine and skip loans not yet due"""
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('loans:calculate_fines')
+        response = api_client.post(url, {}, format='json')
+        
+        assert response.data['updated_count'] == 1
+        overdue_loan.refresh_from_db()
+        active_loan.refresh_from_db()
+        assert overdue_loan.status == 'overdue'
+        assert overdue_loan.fine_amount == Decimal(overdue_loan.days_overdue) * Decimal('0.50')
+        assert active_loan.status == 'active'
+        assert active_loan.fine_amount == 0
+    
+    def test_calculate_fines_in_chunks(self, regular_user, sample_book):
+        """Test that chunked updates cover every overdue loan"""
+        for days in range(1, 6):
+            Loan.objects.create(
+                user=regular_user,
+                book=sample_book,
+                due_date=timezone.now() - timedelta(days=days, hours=1)
+            )
+        
+        assert fines.calculate_overdue_fines(chunk_size=2) == 5
+        for loan in Loan.objects.all():
+            assert loan.status == 'overdue'
+            assert loan.fine_amount == Decimal(loan.days_overdue) * Decimal('0.50')
+    
+    def test_calculate_fines_command(self, overdue_loan):
+        """Test the calculate_overdue_fines management command"""
+        out = StringIO()
+        call_command('calculate_overdue_fines', '--daily-rate', '1.00', stdout=out)
+        
+        assert 'Calculated fines for 1 overdue loans' in out.getvalue()
+        overdue_loan.refresh_from_db()
+        assert overdue_loan.fine_amount == Decimal(overdue_loan.days_overdue)
+    
     def test_calculate_fines_as_regular_user(self, api_client, regular_user):
         """Test calculating fines as regular user (should fail)"""
         api_client.force_authenticate(user=regular_user)
@@ -367,6 +1049,156 @@ class TestCalculateOverdueFines:
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'sqlite', reason='Query plans are checked on SQLite')
+class TestOpenLoanIndexes:
+    """Tests that open-loan queries use the partial indexes on a realistic loan history"""
+    
+    @pytest.fixture
+    def history(self, db):
+        """5000 loans, 95% of them returned, with fresh planner statistics"""
+        user_ids, book_ids = benchmark.seed_loans(5000)
+        benchmark.analyze()
+        return user_ids, book_ids
+    
+    @pytest.mark.parametrize('name', list(benchmark.OPEN_LOAN_QUERIES))
+    def test_query_uses_partial_index(self, history, name):
+        """Test that the planner picks the partial index for the query"""
+        build, method, index = benchmark.OPEN_LOAN_QUERIES[name]
+        user_ids, book_ids = history
+        
+        assert index in build(user_ids[0], book_ids[0]).explain()
+    
+    def test_cursor_page_uses_borrowed_at_index(self, history):
+        """Test that a cursor page of the default loan ordering is read from the (borrowed_at, id) index"""
+        plan = Loan.objects.filter(borrowed_at__lt=timezone.now()).order_by('-borrowed_at', '-id')[:20].explain()
+        
+        assert 'loans_borrowe_fe43b0_idx' in plan
+        assert 'TEMP B-TREE' not in plan
+    
+    def test_benchmark_command(self):
+        """Test that the benchmark reports every query and leaves nothing behind"""
+        out = StringIO()
+        call_command('benchmark_loan_indexes', '--loans', '500', '--repeat', '1', stdout=out)
+        
+        for name in benchmark.OPEN_LOAN_QUERIES:
+            assert name in out.getvalue()
+        assert not Loan.objects.exists()
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Loan._meta.db_table)
+        assert set(benchmark.OPEN_LOAN_INDEXES) <= set(constraints)
+
+
+@pytest.fixture
+def old_returned_loan(db, regular_user, sample_book):
+    """Fixture for a loan returned two years ago"""
+    loan = Loan.objects.create(user=regular_user, book=sample_book, due_date=timezone.now() - timedelta(days=716))
+    long_ago = timezone.now() - timedelta(days=730)
+    Loan.objects.filter(pk=loan.pk).update(
+        borrowed_at=long_ago, returned_at=long_ago + timedelta(days=10), status='returned'
+    )
+    return Loan.objects.get(pk=loan.pk)
+
+
+@pytest.mark.django_db
+class TestLoanArchive:
+    """Tests for moving old returned loans to the archive"""
+    
+    def test_archive_moves_old_returned_loans(self, regular_user, sample_book, active_loan, old_returned_loan):
+        """Test that only loans returned before the cutoff are archived, keeping their ids"""
+        recent = Loan.objects.create(user=regular_user, book=sample_book, due_date=timezone.now())
+        recent.return_loan()
+        
+        assert archive.archive_returned_loans() == 1
+        
+        assert set(Loan.objects.values_list('pk', flat=True)) == {active_loan.pk, recent.pk}
+        archived = ArchivedLoan.objects.get()
+        assert archived.pk == old_returned_loan.pk
+        assert archived.borrowed_at == old_returned_loan.borrowed_at
+        assert archived.updated_at == old_returned_loan.updated_at
+        assert archived.status == 'returned'
+    
+    def test_archive_in_chunks(self, regular_user, sample_book):
+        """Test that archiving walks the loans in chunks"""
+        long_ago = timezone.now() - timedelta(days=800)
+        Loan.objects.bulk_create([
+            Loan(user=regular_user, book=sample_book, due_date=long_ago, returned_at=long_ago, status='returned')
+            for _ in range(7)
+        ])
+        
+        assert archive.archive_returned_loans(chunk_size=3) == 7
+        assert not Loan.objects.exists()
+        assert ArchivedLoan.objects.count() == 7
+    
+    def test_archive_command(self, old_returned_loan):
+        """Test the archive_loans management command"""
+        out = StringIO()
+        call_command('archive_loans', '--chunk-size', '10', stdout=out)
+        
+        assert 'Archived 1 loans' in out.getvalue()
+        assert ArchivedLoan.objects.filter(pk=old_returned_loan.pk).exists()
+    
+    def test_history_includes_live_and_archived_loans(self, active_loan, old_returned_loan):
+        """Test that the history view reads both tables"""
+        archive.archive_returned_loans()
+        
+        assert set(LoanHistory.objects.values_list('pk', flat=True)) == {active_loan.pk, old_returned_loan.pk}
+        history = LoanHistory.objects.with_details().get(pk=old_returned_loan.pk)
+        assert history.book == old_returned_loan.book
+        assert not history.is_overdue
+    
+    @pytest.mark.parametrize('params, archived', [
+        ({}, False),
+        ({'status': 'active'}, False),
+        ({'status': 'returned'}, True),
+        ({'borrowed_at__lt': (timezone.now() - timedelta(days=400)).date().isoformat()}, True),
+        ({'borrowed_at__gte': '2000-01-01'}, True),
+        ({'status': 'returned', 'borrowed_at__gte': timezone.now().date().isoformat()}, False),
+    ])
+    def test_loan_list_reads_archive_when_asked(self, api_client, regular_user, active_loan, old_returned_loan, params, archived):
+        """Test that the loan list only includes archived loans when the filters reach them"""
+        archive.archive_returned_loans()
+        api_client.force_authenticate(user=regular_user)
+        response = api_client.get(reverse('loans:loan_list'), params)
+        
+        assert response.status_code == status.HTTP_200_OK
+        ids = {loan['id'] for loan in response.data['results']}
+        assert (old_returned_loan.pk in ids) is archived
+    
+    def test_loan_list_archive_with_cursor(self, api_client, regular_user, active_loan, old_returned_loan, monkeypatch):
+        """Test walking live and archived loans with keyset pagination"""
+        monkeypatch.setattr(KeysetPagination, 'page_size', 1)
+        archive.archive_returned_loans()
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:loan_list')
+        response = api_client.get(url, {'pagination': 'cursor', 'borrowed_at__lt': timezone.now().isoformat()})
+        
+        first = response.data['results'][0]
+        second = api_client.get(response.data['next']).data['results'][0]
+        assert [first['id'], second['id']] == [active_loan.pk, old_returned_loan.pk]
+        assert second['book']['id'] == old_returned_loan.book_id
+        assert second['user']['active_loans_count'] == 1
+    
+    def test_loan_list_invalid_range(self, api_client, regular_user):
+        """Test that an invalid date range is rejected"""
+        api_client.force_authenticate(user=regular_user)
+        response = api_client.get(reverse('loans:loan_list'), {'borrowed_at__lt': 'yesterday'})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_user_loans_with_range(self, api_client, regular_user, active_loan, old_returned_loan):
+        """Test that my-loans includes archived loans only for a range reaching them"""
+        archive.archive_returned_loans()
+        api_client.force_authenticate(user=regular_user)
+        url = reverse('loans:user_loans')
+        
+        assert api_client.get(url).data['returned_count'] == 0
+        response = api_client.get(url, {'borrowed_at__gte': '2000-01-01'})
+        assert response.data['returned_count'] == 1
+        assert response.data['returned_loans'][0]['id'] == old_returned_loan.pk
+        assert response.data['active_count'] == 1
+
+
 @pytest.mark.django_db
 class TestLoanModel:
     """Tests for Loan model"""
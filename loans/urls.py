@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
-    LoanListView, LoanDetailView, LoanCreateView,
-    LoanReturnView, LoanUpdateView, LoanDeleteView,
+    LoanListView, LoanExportView, LoanDetailView, LoanCreateView, LoanBatchCreateView,
+    LoanReturnView, LoanBatchReturnView, LoanUpdateView, LoanDeleteView,
     user_loans, loan_stats, calculate_overdue_fines
 )
 
@@ -12,6 +12,7 @@ urlpatterns = [
     path('', LoanListView.as_view(), name='loan_list'),
     path('<int:pk>/', LoanDetailView.as_view(), name='loan_detail'),
     path('borrow/', LoanCreateView.as_view(), name='loan_create'),
+    path('borrow/batch/', LoanBatchCreateView.as_view(), name='loan_batch_create'),
     path('<int:pk>/return/', LoanReturnView.as_view(), name='loan_return'),
     path('my-loans/', user_loans, name='user_loans'),
     
@@ -19,7 +20,9 @@ urlpatterns = [
     path('<int:pk>/update/', LoanUpdateView.as_view(), name='loan_update'),
     path('<int:pk>/delete/', LoanDeleteView.as_view(), name='loan_delete'),
     path('stats/', loan_stats, name='loan_stats'),
+    path('return/batch/', LoanBatchReturnView.as_view(), name='loan_batch_return'),
     path('calculate-fines/', calculate_overdue_fines, name='calculate_fines'),
+    path('export/<str:export_format>/', LoanExportView.as_view(), name='loan_export'),
 ]
 
 
@@ -5,21 +5,41 @@ from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
 from .models import Loan
+from . import fines, stats
+from .archive import borrowed_range, loan_source
+from .circulation import checkout_books, return_loans
 from .serializers import (
-    LoanSerializer, LoanDetailSerializer, LoanCreateSerializer, LoanReturnSerializer
+    LoanSerializer, LoanDetailSerializer, LoanDetailValuesSerializer, LoanCreateSerializer,
+    LoanBatchCreateSerializer, LoanBatchResultSerializer, LoanBatchReturnSerializer,
+    LoanBatchReturnResultSerializer, LoanReturnSerializer
 )
 from accounts.permissions import IsAdminUser
+from library_management.conditional import ConditionalGetMixin
+from library_management.export import StreamingExportMixin
+from library_management.fastpath import ValuesListMixin
+from library_management.sparse import SparseFieldsetViewMixin
+from library_management.pagination import KeysetPagination
 
 
-class LoanListView(generics.ListAPIView):
+class LoanListView(SparseFieldsetViewMixin, ValuesListMixin, generics.ListAPIView):
     """
     API endpoint to list loans.
     Users can see their own loans, admins can see all.
+    Pass ?pagination=cursor for keyset pagination and ?fields= or ?exclude= to prune fields.
+    Archived loans are included when ?status= or ?borrowed_at__gte= / ?borrowed_at__lt=
+    can match them.
     """
     serializer_class = LoanDetailSerializer
+    values_serializer_class = LoanDetailValuesSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['status', 'book', 'user']
+    filterset_fields = {
+        'status': ['exact'],
+        'book': ['exact'],
+        'user': ['exact'],
+        'borrowed_at': ['gte', 'lt'],
+    }
     ordering_fields = ['borrowed_at', 'due_date', 'returned_at']
     ordering = ['-borrowed_at']
     
@@ -28,27 +48,69 @@ class LoanListView(generics.ListAPIView):
         Users see their own loans, admins see all.
         """
         user = self.request.user
+        source = loan_source(self.request.query_params)
+        queryset = self.sparse_queryset(
+            source.objects.with_details(user=self.selects('user'), book=self.selects('book'))
+        )
         if user.is_staff or user.role == 'admin':
-            return Loan.objects.all()
-        return Loan.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
+
+
+class LoanExportView(StreamingExportMixin, LoanListView):
+    """
+    API endpoint to export the full loan history as CSV or NDJSON.
+    Accepts the same filter and ordering parameters as the loan list.
+    Only admins can export.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    export_serializer_class = LoanSerializer
+    export_filename = 'loans'
+    
+    def get_queryset(self):
+        return loan_source(self.request.query_params).objects.all()
 
 
-class LoanDetailView(generics.RetrieveAPIView):
+class LoanDetailView(ConditionalGetMixin, SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """
     API endpoint to retrieve a single loan's details.
     Users can only see their own loans.
+    Supports conditional requests with If-None-Match, and ?fields= or
+    ?exclude= to prune fields. The overdue fields follow the clock, so there
+    is no Last-Modified and If-Modified-Since is ignored.
     """
     serializer_class = LoanDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
+    sparse_always_load = ('updated_at', 'due_date', 'returned_at')
+    clock_dependent_fields = ('is_overdue', 'days_overdue')
+    
+    def get_conditional_fields(self):
+        fields = ['updated_at', 'is_overdue', 'days_overdue']
+        if self.selects('user'):
+            fields += ['user.updated_at', 'user_active_loans_count']
+        if self.selects('book'):
+            fields += ['book.updated_at']
+        return fields
+    
+    def get_sparse_always_load(self):
+        columns = list(self.sparse_always_load)
+        if self.selects('user'):
+            columns.append('user__updated_at')
+        if self.selects('book'):
+            columns.append('book__updated_at')
+        return columns
     
     def get_queryset(self):
         """
         Users see their own loans, admins see all.
         """
         user = self.request.user
+        queryset = self.sparse_queryset(
+            Loan.objects.with_details(user=self.selects('user'), book=self.selects('book'))
+        )
         if user.is_staff or user.role == 'admin':
-            return Loan.objects.all()
-        return Loan.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
 
 
 class LoanCreateView(generics.CreateAPIView):
@@ -71,6 +133,37 @@ class LoanCreateView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class LoanBatchCreateView(APIView):
+    """
+    API endpoint to borrow several books in one request.
+    Each book is reported as borrowed or failed with the reason; the request
+    succeeds if at least one book was borrowed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = LoanBatchCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        outcomes = checkout_books(
+            user,
+            serializer.validated_data['books'],
+            due_date=serializer.validated_data.get('due_date'),
+            notes=serializer.validated_data.get('notes'),
+        )
+        
+        borrowed_count = sum(1 for outcome in outcomes if outcome['loan'] is not None)
+        if borrowed_count:
+            # Count once instead of once per rendered loan
+            user.active_loans_count = Loan.objects.active().filter(user=user).count()
+        
+        return Response({
+            'results': LoanBatchResultSerializer(outcomes, many=True).data,
+            'borrowed_count': borrowed_count,
+            'failed_count': len(outcomes) - borrowed_count,
+        }, status=status.HTTP_201_CREATED if borrowed_count else status.HTTP_400_BAD_REQUEST)
+
+
 class LoanReturnView(APIView):
     """
     API endpoint to return a borrowed book.
@@ -108,6 +201,29 @@ class LoanReturnView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class LoanBatchReturnView(APIView):
+    """
+    API endpoint to check in many returned books at once, e.g. a drop box.
+    Overdue loans are charged their fine. Only admins can batch return.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    
+    def post(self, request):
+        serializer = LoanBatchReturnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        outcomes = return_loans(
+            serializer.validated_data['loans'],
+            notes=serializer.validated_data.get('notes'),
+        )
+        
+        returned_count = sum(1 for outcome in outcomes if outcome['loan'] is not None)
+        return Response({
+            'results': LoanBatchReturnResultSerializer(outcomes, many=True).data,
+            'returned_count': returned_count,
+            'failed_count': len(outcomes) - returned_count,
+        }, status=status.HTTP_200_OK if returned_count else status.HTTP_400_BAD_REQUEST)
+
+
 class LoanUpdateView(generics.UpdateAPIView):
     """
     API endpoint to update a loan.
@@ -133,9 +249,12 @@ class LoanDeleteView(generics.DestroyAPIView):
 def user_loans(request):
     """
     Get all loans for the authenticated user.
+    Returned loans come from the archive too when ?borrowed_at__gte= or
+    ?borrowed_at__lt= reaches back into it.
     """
     user = request.user
-    loans = Loan.objects.filter(user=user)
+    params = request.query_params
+    loans = loan_source(params).objects.filter(user=user, **borrowed_range(params)).with_details()
     
     active_loans = loans.filter(returned_at__isnull=True)
     returned_loans = loans.filter(returned_at__isnull=False)
@@ -156,16 +275,7 @@ def loan_stats(request):
     Get overall statistics about loans.
     Only admins can access.
     """
-    stats = {
-        'total_loans': Loan.objects.count(),
-        'active_loans': Loan.objects.filter(returned_at__isnull=True, status='active').count(),
-        'returned_loans': Loan.objects.filter(status='returned').count(),
-        'overdue_loans': Loan.objects.filter(status='overdue').count(),
-        'total_fines': sum(loan.fine_amount for loan in Loan.objects.filter(fine_amount__gt=0)),
-        'unpaid_fines': sum(loan.fine_amount for loan in Loan.objects.filter(fine_paid=False, fine_amount__gt=0)),
-    }
-    
-    return Response(stats, status=status.HTTP_200_OK)
+    return Response(stats.loan_stats(), status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -175,13 +285,7 @@ def calculate_overdue_fines(request):
     Calculate fines for all overdue loans.
     Only admins can access.
     """
-    overdue_loans = Loan.objects.filter(returned_at__isnull=True)
-    updated_count = 0
-    
-    for loan in overdue_loans:
-        if loan.is_overdue:
-            loan.calculate_fine()
-            updated_count += 1
+    updated_count = fines.calculate_overdue_fines()
     
     return Response({
         'message': f'Calculated fines for {updated_count} overdue loans',